@@ -1,6 +1,8 @@
 import logging
-import yaml
+from collections.abc import Mapping
 from pathlib import Path
+from typing import Any, Dict, List
+from backend.utils.config_registry import get_config_registry, thaw
 
 logger = logging.getLogger(__name__)
 
@@ -11,76 +13,46 @@ class Config:
     PORT = 12398
     CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000']
     OUTPUT_DIR = 'output'
+    # 是否额外生成 AVIF 缩略图（需要 Pillow 支持 AVIF，编码较慢）
+    THUMBNAIL_AVIF = False
 
-    _image_providers_config = None
-    _text_providers_config = None
+    # 服务商 HTTP 连接池：每个 base_url 保持的 keep-alive 连接数（与图片生成全局并发上限一致）
+    HTTP_POOL_SIZE = 15
+    HTTP_CONNECT_TIMEOUT = 10
+    HTTP_READ_TIMEOUT = 300
+
+    # 历史记录存储后端：sqlite（history/history.db，默认）或 json（旧版 index.json）
+    HISTORY_BACKEND = 'sqlite'
+
+    # 服务商配置文件（经由 ConfigRegistry 缓存，文件修改后自动重新加载）
+    IMAGE_PROVIDERS_PATH = Path(__file__).parent.parent / 'image_providers.yaml'
+    TEXT_PROVIDERS_PATH = Path(__file__).parent.parent / 'text_providers.yaml'
 
     @classmethod
     def load_image_providers_config(cls):
-        if cls._image_providers_config is not None:
-            return cls._image_providers_config
-
-        config_path = Path(__file__).parent.parent / 'image_providers.yaml'
-        logger.debug(f"加载图片服务商配置: {config_path}")
-
-        if not config_path.exists():
-            logger.warning(f"图片配置文件不存在: {config_path}，使用默认配置")
-            cls._image_providers_config = {
-                'active_provider': 'google_genai',
-                'providers': {}
-            }
-            return cls._image_providers_config
-
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                cls._image_providers_config = yaml.safe_load(f) or {}
-            logger.debug(f"图片配置加载成功: {list(cls._image_providers_config.get('providers', {}).keys())}")
-        except yaml.YAMLError as e:
-            logger.error(f"图片配置文件 YAML 格式错误: {e}")
-            raise ValueError(
-                f"配置文件格式错误: image_providers.yaml\n"
-                f"YAML 解析错误: {e}\n"
-                "解决方案：\n"
-                "1. 检查 YAML 缩进是否正确（使用空格，不要用Tab）\n"
-                "2. 检查引号是否配对\n"
-                "3. 使用在线 YAML 验证器检查格式"
-            )
+        """
+        加载图片生成服务商配置
 
-        return cls._image_providers_config
+        Returns:
+            只读配置快照，文件未变化时返回同一个对象
+        """
+        return get_config_registry().load_yaml(str(cls.IMAGE_PROVIDERS_PATH), {
+            'active_provider': 'google_genai',
+            'providers': {}
+        })
 
     @classmethod
     def load_text_providers_config(cls):
-        """加载文本生成服务商配置"""
-        if cls._text_providers_config is not None:
-            return cls._text_providers_config
-
-        config_path = Path(__file__).parent.parent / 'text_providers.yaml'
-        logger.debug(f"加载文本服务商配置: {config_path}")
-
-        if not config_path.exists():
-            logger.warning(f"文本配置文件不存在: {config_path}，使用默认配置")
-            cls._text_providers_config = {
-                'active_provider': 'google_gemini',
-                'providers': {}
-            }
-            return cls._text_providers_config
-
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                cls._text_providers_config = yaml.safe_load(f) or {}
-            logger.debug(f"文本配置加载成功: {list(cls._text_providers_config.get('providers', {}).keys())}")
-        except yaml.YAMLError as e:
-            logger.error(f"文本配置文件 YAML 格式错误: {e}")
-            raise ValueError(
-                f"配置文件格式错误: text_providers.yaml\n"
-                f"YAML 解析错误: {e}\n"
-                "解决方案：\n"
-                "1. 检查 YAML 缩进是否正确（使用空格，不要用Tab）\n"
-                "2. 检查引号是否配对\n"
-                "3. 使用在线 YAML 验证器检查格式"
-            )
+        """
+        加载文本生成服务商配置
 
-        return cls._text_providers_config
+        Returns:
+            只读配置快照，文件未变化时返回同一个对象
+        """
+        return get_config_registry().load_yaml(str(cls.TEXT_PROVIDERS_PATH), {
+            'active_provider': 'google_gemini',
+            'providers': {}
+        })
 
     @classmethod
     def get_active_image_provider(cls):
@@ -120,7 +92,13 @@ class Config:
                 "3. 检查 image_providers.yaml 文件"
             )
 
-        provider_config = providers[provider_name].copy()
+        # 返回可修改的普通 dict（包括 extra_headers 等嵌套字段），调用方可以修改或 JSON 序列化
+        provider_config = thaw(providers[provider_name])
+
+        # 只配置了 api_keys（多 Key 负载均衡）时，以第一个 Key 作为默认 Key
+        if not provider_config.get('api_key') and provider_config.get('api_keys'):
+            first_key = provider_config['api_keys'][0]
+            provider_config['api_key'] = first_key.get('api_key') if isinstance(first_key, Mapping) else first_key
 
         # 验证必要字段
         if not provider_config.get('api_key'):
@@ -145,9 +123,56 @@ class Config:
         logger.info(f"图片服务商配置验证通过: {provider_name} (type={provider_type})")
         return provider_config
 
+    @classmethod
+    def get_image_provider_pool(cls, provider_name: str = None) -> List[Dict[str, Any]]:
+        """
+        获取图片生成的服务商 / API Key 池
+
+        未指定 provider_name 且配置了 provider_pool 时，由其中的服务商按权重组成池，否则只包含该（激活）服务商；
+        服务商配置了 api_keys 时每个 Key 各为池中的一个成员，成员权重 = 服务商权重 × Key 权重。
+
+        Args:
+            provider_name: 服务商名称，None 表示按配置文件
+
+        Returns:
+            [{"provider": 服务商名称, "weight": 权重, "config": 只含单个 api_key 的服务商配置}]
+        """
+        if provider_name is None:
+            entries = cls.load_image_providers_config().get('provider_pool') or [cls.get_active_image_provider()]
+        else:
+            entries = [provider_name]
+
+        members = []
+        for entry in entries:
+            if isinstance(entry, Mapping):
+                name, weight = entry.get('provider'), float(entry.get('weight', 1))
+            else:
+                name, weight = entry, 1.0
+            provider_config = cls.get_image_provider_config(name)
+
+            for key_entry in provider_config.pop('api_keys', None) or [provider_config['api_key']]:
+                if isinstance(key_entry, Mapping):
+                    api_key, key_weight = key_entry.get('api_key'), float(key_entry.get('weight', 1))
+                else:
+                    api_key, key_weight = key_entry, 1.0
+                # 权重为 0 的成员暂时停用
+                if not api_key or weight * key_weight <= 0:
+                    continue
+                members.append({
+                    "provider": name,
+                    "weight": weight * key_weight,
+                    "config": dict(provider_config, api_key=api_key)
+                })
+
+        if not members:
+            raise ValueError(
+                "图片服务商池中没有可用的 API Key\n"
+                "解决方案：检查 image_providers.yaml 中 provider_pool 与 api_keys 的权重配置"
+            )
+        return members
+
     @classmethod
     def reload_config(cls):
         """重新加载配置（清除缓存）"""
         logger.info("重新加载所有配置...")
-        cls._image_providers_config = None
-        cls._text_providers_config = None
+        get_config_registry().invalidate()
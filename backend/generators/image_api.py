@@ -6,6 +6,9 @@ import re
 from typing import Dict, Any, Optional, List, Union
 from .base import ImageGeneratorBase
 from ..utils.image_compressor import compress_image
+from ..utils.http_client import get_http_pool
+from ..utils.rate_limiter import RateLimitError, parse_retry_after
+from ..utils.image_stream import read_body, read_image_or_json
 
 logger = logging.getLogger(__name__)
 
@@ -157,11 +160,17 @@ class ImageApiGenerator(ImageGeneratorBase):
 
         api_url = f"{self.base_url}{self.endpoint_type}"
         logger.debug(f"  发送请求到: {api_url}")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
+        response = get_http_pool().post(api_url, headers=headers, json=payload, timeout=300, stream=True)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
             logger.error(f"Image API 请求失败: status={response.status_code}, error={error_detail}")
+            if response.status_code == 429:
+                raise RateLimitError(
+                    "⏳ API 配额或速率限制\n\n"
+                    f"【错误详情】\n{error_detail[:300]}",
+                    retry_after=parse_retry_after(response.headers)
+                )
             raise Exception(
                 f"Image API 请求失败 (状态码: {response.status_code})\n"
                 f"错误详情: {error_detail}\n"
@@ -174,7 +183,12 @@ class ImageApiGenerator(ImageGeneratorBase):
                 "建议：检查API密钥和base_url配置"
             )
 
-        result = response.json()
+        # 内嵌 base64 图片时边读边解码，不再整体解析 JSON
+        image_data, result = read_image_or_json(response)
+        if image_data is not None:
+            logger.info(f"✅ Image API 图片生成成功: {len(image_data)} bytes")
+            return image_data
+
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
         if "data" in result and len(result["data"]) > 0:
@@ -260,7 +274,7 @@ class ImageApiGenerator(ImageGeneratorBase):
         api_url = f"{self.base_url}{self.endpoint_type}"
         logger.info(f"Chat API 生成图片: {api_url}, model={model}")
 
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
+        response = get_http_pool().post(api_url, headers=headers, json=payload, timeout=300, stream=True)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -276,11 +290,12 @@ class ImageApiGenerator(ImageGeneratorBase):
                     "在系统设置页面检查 API Key 是否正确"
                 )
             elif status_code == 429:
-                raise Exception(
+                raise RateLimitError(
                     "⏳ API 配额或速率限制\n\n"
                     "【解决方案】\n"
                     "1. 稍后再试\n"
-                    "2. 检查 API 配额使用情况"
+                    "2. 检查 API 配额使用情况",
+                    retry_after=parse_retry_after(response.headers)
                 )
             else:
                 raise Exception(
@@ -290,7 +305,12 @@ class ImageApiGenerator(ImageGeneratorBase):
                     f"【模型】{model}"
                 )
 
-        result = response.json()
+        # 内嵌 base64 图片（message.images / Markdown data URL）时边读边解码
+        image_bytes, result = read_image_or_json(response)
+        if image_bytes is not None:
+            logger.info(f"检测到 Base64 图片数据: {len(image_bytes)} bytes")
+            return image_bytes
+
         logger.debug(f"Chat API 响应: {str(result)[:500]}")
 
         # 动态解析：根据 message 字段结构自动选择解析方式
@@ -400,10 +420,11 @@ class ImageApiGenerator(ImageGeneratorBase):
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
+            response = get_http_pool().get(url, timeout=60, stream=True)
             if response.status_code == 200:
-                logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
-                return response.content
+                image_data = read_body(response)
+                logger.info(f"✅ 图片下载成功: {len(image_data)} bytes")
+                return image_data
             else:
                 raise Exception(f"下载图片失败: HTTP {response.status_code}")
         except requests.exceptions.Timeout:
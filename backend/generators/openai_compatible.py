@@ -5,6 +5,9 @@ from typing import Dict, Any, Optional, List
 import requests
 from .base import ImageGeneratorBase
 from ..utils.image_compressor import compress_image
+from ..utils.http_client import get_http_pool
+from ..utils.rate_limiter import RateLimitError, parse_retry_after
+from ..utils.image_stream import read_body, read_image_or_json
 
 logger = logging.getLogger(__name__)
 
@@ -121,11 +124,17 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         if quality and model.startswith('dall-e'):
             payload["quality"] = quality
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
+        response = get_http_pool().post(url, headers=headers, json=payload, timeout=300, stream=True)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
             logger.error(f"OpenAI Images API 请求失败: status={response.status_code}, error={error_detail}")
+            if response.status_code == 429:
+                raise RateLimitError(
+                    "⏳ API 配额或速率限制\n\n"
+                    f"【错误详情】\n{error_detail[:300]}",
+                    retry_after=parse_retry_after(response.headers)
+                )
             raise Exception(
                 f"OpenAI Images API 请求失败 (状态码: {response.status_code})\n"
                 f"错误详情: {error_detail}\n"
@@ -140,7 +149,12 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                 "建议：检查API密钥、base_url和模型名称配置"
             )
 
-        result = response.json()
+        # 内嵌 base64 图片时边读边解码，不再整体解析 JSON
+        img_bytes, result = read_image_or_json(response)
+        if img_bytes is not None:
+            logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_bytes)} bytes")
+            return img_bytes
+
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
         if "data" not in result or len(result["data"]) == 0:
@@ -166,10 +180,11 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         # 处理URL格式
         elif "url" in image_data:
             logger.debug(f"  下载图片 URL...")
-            img_response = requests.get(image_data["url"], timeout=60)
+            img_response = get_http_pool().get(image_data["url"], timeout=60, stream=True)
             if img_response.status_code == 200:
-                logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_response.content)} bytes")
-                return img_response.content
+                img_bytes = read_body(img_response)
+                logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_bytes)} bytes")
+                return img_bytes
             else:
                 logger.error(f"下载图片失败: {img_response.status_code}")
                 raise Exception(f"下载图片失败: {img_response.status_code}")
@@ -250,7 +265,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         if use_modalities:
             payload["modalities"] = ["image", "text"]
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
+        response = get_http_pool().post(url, headers=headers, json=payload, timeout=300, stream=True)
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -267,11 +282,12 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                     "在系统设置页面检查 API Key 是否正确"
                 )
             elif status_code == 429:
-                raise Exception(
+                raise RateLimitError(
                     "⏳ API 配额或速率限制\n\n"
                     "【解决方案】\n"
                     "1. 稍后再试\n"
-                    "2. 检查 API 配额使用情况"
+                    "2. 检查 API 配额使用情况",
+                    retry_after=parse_retry_after(response.headers)
                 )
             else:
                 raise Exception(
@@ -281,7 +297,12 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                     f"【模型】{model}"
                 )
 
-        result = response.json()
+        # 内嵌 base64 图片（modalities / Markdown data URL）时边读边解码
+        image_bytes, result = read_image_or_json(response)
+        if image_bytes is not None:
+            logger.info(f"检测到 Base64 图片数据: {len(image_bytes)} bytes")
+            return image_bytes
+
         logger.debug(f"Chat API 响应: {str(result)[:500]}")
 
         # 解析响应
@@ -366,10 +387,11 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
+            response = get_http_pool().get(url, timeout=60, stream=True)
             if response.status_code == 200:
-                logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
-                return response.content
+                image_data = read_body(response)
+                logger.info(f"✅ 图片下载成功: {len(image_data)} bytes")
+                return image_data
             else:
                 raise Exception(f"下载图片失败: HTTP {response.status_code}")
         except requests.exceptions.Timeout:
@@ -12,6 +12,7 @@ from pathlib import Path
 import yaml
 from flask import Blueprint, request, jsonify
 from .utils import prepare_providers_for_response
+from backend.utils.atomic_file import atomic_write_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -181,9 +182,9 @@ def _read_config(path: Path, default: dict) -> dict:
 
 
 def _write_config(path: Path, config: dict):
-    """写入配置文件"""
-    with open(path, 'w', encoding='utf-8') as f:
-        yaml.dump(config, f, allow_unicode=True, default_flow_style=False)
+    """写入配置文件（原子替换，热加载不会读到写了一半的文件）"""
+    data = yaml.dump(config, allow_unicode=True, default_flow_style=False)
+    atomic_write_bytes(str(path), data.encode('utf-8'))
 
 
 def _update_provider_config(config_path: Path, new_data: dict):
@@ -214,9 +215,14 @@ def _update_provider_config(config_path: Path, new_data: dict):
                 else:
                     new_provider_config.pop('api_key', None)
 
+            # 设置页不编辑 api_keys（多 Key 负载均衡），保留文件中的原值
+            if 'api_keys' not in new_provider_config and existing_providers.get(name, {}).get('api_keys'):
+                new_provider_config['api_keys'] = existing_providers[name]['api_keys']
+
             # 移除不需要保存的字段
             new_provider_config.pop('api_key_env', None)
             new_provider_config.pop('api_key_masked', None)
+            new_provider_config.pop('api_keys_masked', None)
 
             # 图片服务商端点白名单校验（仅 image_api 类型）
             if config_path == IMAGE_CONFIG_PATH and new_provider_config.get('type') == 'image_api':
@@ -239,16 +245,10 @@ def _update_provider_config(config_path: Path, new_data: dict):
 
 
 def _clear_config_cache():
-    """清除配置缓存"""
+    """清除配置缓存，各服务下次获取实例时按新配置重建"""
     try:
         from backend.config import Config
-        Config._image_providers_config = None
-    except Exception:
-        pass
-
-    try:
-        from backend.services.image import reset_image_service
-        reset_image_service()
+        Config.reload_config()
     except Exception:
         pass
 
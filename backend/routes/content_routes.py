@@ -32,6 +32,7 @@ def create_content_blueprint():
         - titles: 标题列表（3个备选）
         - copywriting: 文案正文
         - tags: 标签列表
+        - from_cache: 是否命中响应缓存
         """
         start_time = time.time()
 
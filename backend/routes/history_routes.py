@@ -6,18 +6,28 @@
 - 搜索历史记录
 - 获取统计信息
 - 扫描和同步任务图片
-- 打包下载图片
+- 打包下载图片（单条 / 批量导出）
 """
 
 import os
-import io
-import zipfile
+import json
 import logging
-from flask import Blueprint, request, jsonify, send_file
+import unicodedata
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+from urllib.parse import quote
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from backend.services.history import get_history_service
+from backend.utils.zip_stream import close_pinned, pin_files, stored_zip_size, stream_zip
 
 logger = logging.getLogger(__name__)
 
+# 批量导出时并发预读的文件数
+EXPORT_READ_AHEAD = 4
+
+# 分页查询每页最多返回的记录数
+MAX_PAGE_SIZE = 100
+
 
 def create_history_blueprint():
     """创建历史记录路由蓝图（工厂函数，支持多次调用）"""
@@ -106,30 +116,52 @@ def create_history_blueprint():
         """
         获取历史记录列表（分页）
 
+        支持两种分页方式：传 cursor 参数（第一页传空字符串）时使用游标分页，否则按页码分页。
+
         查询参数：
         - page: 页码（默认 1）
-        - page_size: 每页数量（默认 20）
+        - page_size: 每页数量（默认 20，最大 100）
+        - cursor: 游标分页时上一页返回的 next_cursor
         - status: 状态过滤（可选：all/completed/draft）
+        - sort: 排序字段（可选：created/updated/title，默认 created）
+        - order: 排序方向（可选：asc/desc，默认时间倒序、标题正序）
+        - fields: 只返回的字段，逗号分隔（如 id,title,thumbnail,status）
 
         返回：
         - success: 是否成功
         - records: 记录列表
         - total: 总数
-        - total_pages: 总页数
+        - total_pages: 总页数（页码分页）
+        - next_cursor / has_more: 下一页游标、是否还有更多（游标分页）
         """
         try:
-            page = int(request.args.get('page', 1))
-            page_size = int(request.args.get('page_size', 20))
+            page_size = _parse_page_arg('page_size', 20, MAX_PAGE_SIZE)
             status = request.args.get('status')
+            sort = request.args.get('sort', 'created')
+            order = request.args.get('order')
+            fields_param = request.args.get('fields', '')
+            fields = [f.strip() for f in fields_param.split(',') if f.strip()] or None
 
             history_service = get_history_service()
-            result = history_service.list_records(page, page_size, status)
+            if 'cursor' in request.args:
+                result = history_service.list_records_after(
+                    request.args.get('cursor'), page_size, status, sort, order, fields
+                )
+            else:
+                page = _parse_page_arg('page', 1)
+                result = history_service.list_records(page, page_size, status, sort, order, fields)
 
             return jsonify({
                 "success": True,
                 **result
             }), 200
 
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": f"参数错误：{str(e)}"
+            }), 400
+
         except Exception as e:
             error_msg = str(e)
             return jsonify({
@@ -316,14 +348,21 @@ def create_history_blueprint():
     @history_bp.route('/history/search', methods=['GET'])
     def search_history():
         """
-        搜索历史记录
+        全文搜索历史记录（标题、大纲、文案、标签）
 
         查询参数：
         - keyword: 搜索关键词（必填）
+        - page: 页码（默认 1）
+        - page_size: 每页数量（默认 20，最大 100）
+        - status: 状态过滤（可选）
 
         返回：
         - success: 是否成功
-        - records: 匹配的记录列表
+        - records: 当前页的匹配记录（按相关度排序）
+        - total: 匹配总数
+        - page: 当前页码
+        - page_size: 每页数量
+        - total_pages: 总页数
         """
         try:
             keyword = request.args.get('keyword', '')
@@ -334,14 +373,24 @@ def create_history_blueprint():
                     "error": "参数错误：keyword 不能为空。\n请提供搜索关键词。"
                 }), 400
 
+            page = _parse_page_arg('page', 1)
+            page_size = _parse_page_arg('page_size', 20, MAX_PAGE_SIZE)
+            status = request.args.get('status')
+
             history_service = get_history_service()
-            results = history_service.search_records(keyword)
+            result = history_service.search_records(keyword, page, page_size, status)
 
             return jsonify({
                 "success": True,
-                "records": results
+                **result
             }), 200
 
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": f"参数错误：{str(e)}"
+            }), 400
+
         except Exception as e:
             error_msg = str(e)
             return jsonify({
@@ -408,18 +457,50 @@ def create_history_blueprint():
     @history_bp.route('/history/scan-all', methods=['POST'])
     def scan_all_tasks():
         """
-        扫描所有任务并同步图片列表
+        扫描所有任务并同步图片列表（增量，未变化的任务目录直接跳过）
 
-        返回：
+        查询参数：
+        - force: 是否忽略上次扫描的指纹，全量同步（默认 false）
+
+        请求头 Accept 包含 text/event-stream 时以 SSE 流式返回：
+        - start: total_tasks / changed / skipped
+        - task: 单个任务的同步结果
+        - finish: 汇总统计
+        - error: 扫描异常
+
+        否则返回 JSON：
         - success: 是否成功
         - total_tasks: 扫描的任务总数
         - synced: 成功同步的任务数
+        - skipped: 未变化而跳过的任务数
         - failed: 失败的任务数
         - orphan_tasks: 孤立任务列表（有图片但无记录）
         """
         try:
             history_service = get_history_service()
-            result = history_service.scan_all_tasks()
+            force = request.args.get('force', 'false').lower() == 'true'
+
+            if 'text/event-stream' in request.headers.get('Accept', ''):
+                def generate():
+                    try:
+                        for event in history_service.iter_scan_all_tasks(force):
+                            yield f"event: {event['event']}\n"
+                            yield f"data: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+                    except Exception as e:
+                        error_data = {"success": False, "error": f"扫描所有任务失败: {str(e)}"}
+                        yield "event: error\n"
+                        yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+
+                return Response(
+                    generate(),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no',
+                    }
+                )
+
+            result = history_service.scan_all_tasks(force)
 
             if not result.get("success"):
                 return jsonify(result), 500
@@ -433,6 +514,31 @@ def create_history_blueprint():
                 "error": f"扫描所有任务失败。\n错误详情: {error_msg}"
             }), 500
 
+    @history_bp.route('/history/task-index/rebuild', methods=['POST'])
+    def rebuild_task_index():
+        """
+        重建任务 ID 到记录 ID 的反向索引
+
+        返回：
+        - success: 是否成功
+        - tasks: 重建后的索引条数
+        """
+        try:
+            history_service = get_history_service()
+            count = history_service.rebuild_task_index()
+
+            return jsonify({
+                "success": True,
+                "tasks": count
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"重建任务索引失败。\n错误详情: {error_msg}"
+            }), 500
+
     # ==================== 下载功能 ====================
 
     @history_bp.route('/history/<record_id>/download', methods=['GET'])
@@ -472,19 +578,29 @@ def create_history_blueprint():
                     "error": f"任务目录不存在：{task_id}"
                 }), 404
 
-            # 创建内存中的 ZIP 文件
-            zip_buffer = _create_images_zip(task_dir)
-
             # 生成安全的下载文件名
             title = record.get('title', 'images')
             safe_title = _sanitize_filename(title)
             filename = f"{safe_title}.zip"
 
-            return send_file(
-                zip_buffer,
+            # 边读图片边输出 ZIP，不在内存中构建整个归档；
+            # 文件提前打开，Content-Length 与输出内容来自同一版本（打包期间重新生成图片不影响）
+            entries = pin_files(_collect_task_images(task_dir))
+            headers = {'Content-Disposition': _attachment_disposition(filename)}
+            content_length = stored_zip_size(entries)
+            if content_length is not None:
+                headers['Content-Length'] = str(content_length)
+
+            def generate():
+                try:
+                    yield from stream_zip(entries)
+                finally:
+                    close_pinned(entries)
+
+            return Response(
+                stream_with_context(generate()),
                 mimetype='application/zip',
-                as_attachment=True,
-                download_name=filename
+                headers=headers
             )
 
         except Exception as e:
@@ -494,43 +610,188 @@ def create_history_blueprint():
                 "error": f"下载失败。\n错误详情: {error_msg}"
             }), 500
 
+    @history_bp.route('/history/export', methods=['GET', 'POST'])
+    def export_history_zip():
+        """
+        批量导出多条历史记录为一个 ZIP 文件（流式输出）
+
+        指定记录 ID 列表，或按状态、创建日期范围过滤（二选一，指定 ID 时忽略过滤条件）。
+        POST 时参数放在 JSON 请求体中，GET 时放在查询参数中（record_ids 以逗号分隔）。
+
+        参数：
+        - record_ids: 记录 ID 列表
+        - status: 状态过滤（可选）
+        - start_date / end_date: 创建日期范围 YYYY-MM-DD（含，可选）
+
+        归档内容：
+        - manifest.json: 每条记录的标题、文案、标签和图片在归档中的路径
+        - 001_标题/page_N.png: 各记录的图片，按导出顺序编号
+
+        返回：
+        - 成功：ZIP 文件下载
+        - 失败：JSON 错误信息
+        """
+        try:
+            if request.method == 'POST':
+                params = request.get_json(silent=True) or {}
+                record_ids = params.get('record_ids')
+                if record_ids is not None and not (
+                    isinstance(record_ids, list) and all(isinstance(i, str) for i in record_ids)
+                ):
+                    raise ValueError("record_ids 必须是字符串数组")
+            else:
+                params = request.args
+                record_ids = [i.strip() for i in params.get('record_ids', '').split(',') if i.strip()]
+
+            history_service = get_history_service()
+            records = history_service.select_export_records(
+                record_ids=record_ids or None,
+                status=params.get('status') or None,
+                start_date=params.get('start_date') or None,
+                end_date=params.get('end_date') or None
+            )
+            if not records:
+                return jsonify({
+                    "success": False,
+                    "error": "没有符合条件的历史记录"
+                }), 404
+
+            entries = _collect_export_entries(history_service.history_dir, records)
+            filename = f"history_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+
+            # 多个文件并发预读，每个文件只缓存少量数据块，整体不在内存中构建归档
+            return Response(
+                stream_with_context(stream_zip(entries, read_ahead=EXPORT_READ_AHEAD)),
+                mimetype='application/zip',
+                headers={'Content-Disposition': _attachment_disposition(filename)}
+            )
+
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": f"参数错误：{str(e)}"
+            }), 400
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"批量导出失败。\n错误详情: {error_msg}"
+            }), 500
+
     return history_bp
 
 
-def _create_images_zip(task_dir: str) -> io.BytesIO:
+def _parse_page_arg(name: str, default: int, maximum: int = None) -> int:
     """
-    创建包含所有图片的 ZIP 文件
+    解析分页查询参数
 
     Args:
-        task_dir: 任务目录路径
+        name: 参数名
+        default: 缺省值
+        maximum: 上限（可选）
 
     Returns:
-        io.BytesIO: 内存中的 ZIP 文件
-    """
-    memory_file = io.BytesIO()
+        int: 参数值
 
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        # 遍历任务目录中的所有图片（排除缩略图）
-        for filename in os.listdir(task_dir):
-            # 跳过缩略图文件
-            if filename.startswith('thumb_'):
-                continue
+    Raises:
+        ValueError: 不是整数或超出范围
+    """
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{name} 必须是整数")
+    if value < 1 or (maximum is not None and value > maximum):
+        bounds = f"在 1 到 {maximum} 之间" if maximum is not None else "不小于 1"
+        raise ValueError(f"{name} 必须{bounds}")
+    return value
+
+
+def _collect_export_entries(history_dir: str, records: List[Dict]) -> List[Tuple[str, Union[str, bytes]]]:
+    """
+    生成批量导出归档的条目：manifest.json 在前，随后是各记录的图片
 
-            if filename.endswith(('.png', '.jpg', '.jpeg')):
-                file_path = os.path.join(task_dir, filename)
+    Args:
+        history_dir: 历史记录目录
+        records: 要导出的完整记录
 
-                # 生成归档文件名（page_N.png 格式）
-                try:
-                    index = int(filename.split('.')[0])
-                    archive_name = f"page_{index + 1}.png"
-                except ValueError:
-                    archive_name = filename
+    Returns:
+        List[Tuple[str, Union[str, bytes]]]: (归档文件名, 文件路径或数据) 列表
+    """
+    manifest = []
+    image_entries: List[Tuple[str, Union[str, bytes]]] = []
+    for number, record in enumerate(records, start=1):
+        folder = f"{number:03d}_{_sanitize_filename(record.get('title', ''))}"
+        task_id = (record.get('images') or {}).get('task_id')
+        task_dir = os.path.join(history_dir, task_id) if task_id else None
+
+        images = []
+        if task_dir and os.path.isdir(task_dir):
+            for archive_name, file_path in _collect_task_images(task_dir):
+                images.append(f"{folder}/{archive_name}")
+                image_entries.append((images[-1], file_path))
+
+        content = record.get('content') or {}
+        manifest.append({
+            "id": record.get('id'),
+            "title": record.get('title', ''),
+            "status": record.get('status'),
+            "created_at": record.get('created_at'),
+            "copywriting": content.get('copywriting', ''),
+            "tags": content.get('tags', []),
+            "images": images
+        })
+
+    manifest_data = json.dumps({"records": manifest}, ensure_ascii=False, indent=2).encode('utf-8')
+    return [("manifest.json", manifest_data)] + image_entries
+
+
+def _collect_task_images(task_dir: str) -> List[Tuple[str, str]]:
+    """
+    列出任务目录中要打包的图片（排除缩略图），按页码排序
 
-                zf.write(file_path, archive_name)
+    Args:
+        task_dir: 任务目录路径
 
-    # 将指针移到开始位置
-    memory_file.seek(0)
-    return memory_file
+    Returns:
+        List[Tuple[str, str]]: (归档文件名 page_N.ext, 文件路径) 列表
+    """
+    pages = []
+    others = []
+    for filename in os.listdir(task_dir):
+        # 跳过缩略图文件
+        if filename.startswith('thumb_'):
+            continue
+
+        if filename.endswith(('.png', '.jpg', '.jpeg')):
+            file_path = os.path.join(task_dir, filename)
+            stem, ext = os.path.splitext(filename)
+
+            # 生成归档文件名（page_N.png 格式），按数字而不是字符串排序（page_10 在 page_9 之后）
+            try:
+                index = int(stem)
+                pages.append((index, f"page_{index + 1}{ext}", file_path))
+            except ValueError:
+                others.append((filename, file_path))
+
+    pages.sort(key=lambda item: item[0])
+    others.sort()
+    return [(archive_name, file_path) for _, archive_name, file_path in pages] + others
+
+
+def _attachment_disposition(filename: str) -> str:
+    """构造下载文件名的 Content-Disposition（中文文件名使用 RFC 5987 编码）"""
+    try:
+        filename.encode('latin-1')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        stem, ext = os.path.splitext(filename)
+        simple_stem = unicodedata.normalize('NFKD', stem).encode('ascii', 'ignore').decode('ascii').strip()
+        simple = f"{simple_stem or 'images'}{ext}"
+        return f'attachment; filename="{simple}"; filename*=UTF-8\'\'{quote(filename)}'
 
 
 def _sanitize_filename(title: str) -> str:
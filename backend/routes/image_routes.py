@@ -7,20 +7,37 @@
 - 重试/重新生成单张图片
 - 批量重试失败图片
 - 获取任务状态
+- 获取生成调度器状态
 """
 
 import os
 import json
 import base64
 import logging
+from typing import Optional, Tuple
 from flask import Blueprint, request, jsonify, Response, send_file
-from backend.services.image import get_image_service
+from backend.services.image import get_image_service, get_generation_scheduler, get_image_version, submit_encode
+from backend.services.provider_pool import get_provider_pool_stats
 from backend.generators.factory import ImageGeneratorFactory
 from backend.config import Config
+from backend.utils.atomic_file import atomic_write_bytes
+from backend.utils.http_client import get_http_pool
+from backend.utils.rate_limiter import get_rate_limit_stats
+from backend.utils.image_compressor import (
+    THUMBNAIL_FORMATS,
+    THUMBNAIL_WIDTHS,
+    detect_mimetype,
+    encode_thumbnails,
+    get_thumbnail_filename,
+    get_thumbnail_formats,
+)
 from .utils import log_request, log_error
 
 logger = logging.getLogger(__name__)
 
+# 即时生成缩略图的最长等待时间（秒），超时回退到兼容缩略图
+THUMBNAIL_ENCODE_TIMEOUT = 20
+
 
 def create_image_blueprint():
     """创建图片路由蓝图（工厂函数，支持多次调用）"""
@@ -39,6 +56,7 @@ def create_image_blueprint():
         - full_outline: 完整大纲文本
         - user_topic: 用户原始输入主题
         - user_images: base64 编码的用户参考图片列表
+        - pipeline: 是否启用封面流水线模式（可选，默认使用服务商配置 pipeline_cover）
 
         返回：
         SSE 事件流，包含以下事件类型：
@@ -52,6 +70,7 @@ def create_image_blueprint():
             task_id = data.get('task_id')
             full_outline = data.get('full_outline', '')
             user_topic = data.get('user_topic', '')
+            pipeline = data.get('pipeline')
 
             # 解析 base64 格式的用户参考图片
             user_images = _parse_base64_images(data.get('user_images', []))
@@ -78,7 +97,8 @@ def create_image_blueprint():
                 for event in image_service.generate_images(
                     pages, task_id, full_outline,
                     user_images=user_images if user_images else None,
-                    user_topic=user_topic
+                    user_topic=user_topic,
+                    pipeline=pipeline
                 ):
                     event_type = event["event"]
                     event_data = event["data"]
@@ -117,6 +137,14 @@ def create_image_blueprint():
 
         查询参数：
         - thumbnail: 是否返回缩略图（默认 true）
+        - w: 缩略图目标宽度（可选，按 grid/preview 尺寸向上取最近的一档）
+        - v: 图片版本号（生成接口返回的 image_url 自带）
+
+        缩略图格式按 Accept 头协商：客户端声明支持 image/avif、image/webp 时
+        返回对应格式，否则返回兼容的 JPEG 缩略图。
+
+        缓存策略：所有响应带 ETag，支持 If-None-Match 条件请求；
+        v 与当前文件版本一致时返回 Cache-Control: immutable，否则每次协商。
 
         返回：
         - 成功：图片文件
@@ -127,31 +155,39 @@ def create_image_blueprint():
 
             # 检查是否请求缩略图
             thumbnail = request.args.get('thumbnail', 'true').lower() == 'true'
+            width = request.args.get('w', type=int)
 
             # 构建 history 目录路径
             history_root = os.path.join(
                 os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
                 "history"
             )
+            task_dir = os.path.join(history_root, task_id)
+            filepath = os.path.join(task_dir, filename)
+
+            # URL 中的版本号与当前原图一致时，内容不会再变化
+            version = request.args.get('v')
+            immutable = bool(version) and os.path.exists(filepath) and version == get_image_version(filepath)
 
             if thumbnail:
                 # 尝试返回缩略图
-                thumb_filename = f"thumb_{filename}"
-                thumb_filepath = os.path.join(history_root, task_id, thumb_filename)
-
-                if os.path.exists(thumb_filepath):
-                    return send_file(thumb_filepath, mimetype='image/png')
+                thumb_filepath, mimetype = _resolve_thumbnail(task_dir, filename, width)
+                if thumb_filepath:
+                    # 缩略图异步生成，落后于原图时说明还是旧版本，不能长期缓存
+                    thumb_fresh = not os.path.exists(filepath) or \
+                        os.path.getmtime(thumb_filepath) >= os.path.getmtime(filepath)
+                    response = _send_image(thumb_filepath, mimetype, immutable and thumb_fresh)
+                    response.vary.add('Accept')
+                    return response
 
             # 返回原图
-            filepath = os.path.join(history_root, task_id, filename)
-
             if not os.path.exists(filepath):
                 return jsonify({
                     "success": False,
                     "error": f"图片不存在：{task_id}/{filename}"
                 }), 404
 
-            return send_file(filepath, mimetype='image/png')
+            return _send_image(filepath, _detect_file_mimetype(filepath), immutable)
 
         except Exception as e:
             log_error('/images', e)
@@ -359,11 +395,7 @@ def create_image_blueprint():
                 }), 404
 
             # 不返回封面图片数据（太大）
-            safe_state = {
-                "generated": state.get("generated", {}),
-                "failed": state.get("failed", {}),
-                "has_cover": state.get("cover_image") is not None
-            }
+            safe_state = state.get_state()
 
             return jsonify({
                 "success": True,
@@ -377,6 +409,43 @@ def create_image_blueprint():
                 "error": f"获取任务状态失败。\n错误详情: {error_msg}"
             }), 500
 
+    @image_bp.route('/generate/stats', methods=['GET'])
+    def get_generation_stats():
+        """
+        获取全局图片生成调度器状态
+
+        返回：
+        - success: 是否成功
+        - stats: 调度器状态
+          - max_concurrent: 全局并发上限
+          - queue_depth: 排队中的请求数
+          - in_flight: 在途的请求数
+          - provider_limits / queued_by_provider / in_flight_by_provider: 按服务商统计
+          - queued_by_task / in_flight_by_task: 按任务统计
+        - http: 服务商连接池复用统计（按 base_url）
+          - requests / connections / reused / reuse_ratio
+        - rate_limits: 服务商限流器状态（按服务商与 API Key 哈希）
+          - rate_per_minute: 当前派发速率（null 表示未节流）
+          - max_per_minute / queued / cooldown_seconds / requests / rate_limited / avg_wait_seconds
+        - providers: 图片服务商池各成员（服务商#API Key 哈希）的健康状态与用量
+          - healthy / unhealthy_seconds / in_flight / requests / successes / failures / last_error
+        """
+        try:
+            return jsonify({
+                "success": True,
+                "stats": get_generation_scheduler().get_stats(),
+                "http": get_http_pool().get_stats(),
+                "rate_limits": get_rate_limit_stats(),
+                "providers": get_provider_pool_stats()
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"获取调度器状态失败。\n错误详情: {error_msg}"
+            }), 500
+
     # ==================== 健康检查 ====================
 
     @image_bp.route('/health', methods=['GET'])
@@ -498,6 +567,87 @@ def _parse_base64_images(images_base64: list) -> list:
     return images
 
 
+# 带版本号的图片 URL 缓存一年
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _send_image(filepath: str, mimetype: str, immutable: bool) -> Response:
+    """
+    发送图片并设置缓存头
+
+    ETag 取文件版本号，命中 If-None-Match 时返回 304。
+    immutable 为 True 时允许浏览器和反向代理长期缓存，否则要求每次协商。
+    """
+    response = send_file(filepath, mimetype=mimetype, etag=get_image_version(filepath), conditional=True)
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _detect_file_mimetype(filepath: str) -> str:
+    """根据文件头识别图片 MIME 类型（缩略图扩展名与实际格式可能不一致）"""
+    with open(filepath, 'rb') as f:
+        return detect_mimetype(f.read(16))
+
+
+def _select_thumbnail_width(width: Optional[int]) -> int:
+    """选择不小于目标宽度的最小一档缩略图尺寸（未指定时使用最大一档）"""
+    widths = sorted(THUMBNAIL_WIDTHS.values())
+    if width:
+        for candidate in widths:
+            if candidate >= width:
+                return candidate
+    return widths[-1]
+
+
+def _resolve_thumbnail(task_dir: str, filename: str, width: Optional[int]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    根据 Accept 头和目标宽度选择缩略图文件
+
+    优先 AVIF，其次 WebP；历史任务缺少对应版本时在编码进程池中从原图即时生成并缓存，
+    编码失败或超时则跳过该格式。
+    客户端未显式声明支持时回退到兼容的 thumb_<filename>。
+
+    Returns:
+        (文件路径, MIME 类型)，没有可用缩略图时为 (None, None)
+    """
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    original_path = os.path.join(task_dir, filename)
+
+    for fmt in ('avif', 'webp'):
+        mimetype = THUMBNAIL_FORMATS[fmt][1]
+        if fmt not in get_thumbnail_formats(Config.THUMBNAIL_AVIF) or mimetype not in accepted:
+            continue
+
+        thumb_width = _select_thumbnail_width(width)
+        thumb_path = os.path.join(task_dir, get_thumbnail_filename(filename, thumb_width, fmt))
+        if not os.path.exists(thumb_path):
+            if not os.path.exists(original_path):
+                continue
+            try:
+                with open(original_path, 'rb') as f:
+                    future = submit_encode(encode_thumbnails, f.read(), [thumb_width], [fmt])
+                variants = future.result(timeout=THUMBNAIL_ENCODE_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"即时生成缩略图失败，回退到兼容缩略图: {original_path} ({fmt}), {e}")
+                continue
+            data = next(iter(variants.values()), None)
+            if data is None:
+                continue
+            atomic_write_bytes(thumb_path, data)
+        return thumb_path, mimetype
+
+    legacy_path = os.path.join(task_dir, f"thumb_{filename}")
+    if os.path.exists(legacy_path):
+        return legacy_path, _detect_file_mimetype(legacy_path)
+    return None, None
+
+
 def _parse_debug_image_request():
     """
     解析调试生图请求，返回 system/user 文本与 user 图片列表（二进制）
@@ -2,14 +2,17 @@
 大纲生成相关 API 路由
 
 包含功能：
-- 生成大纲（支持图片上传）
+- 生成大纲（支持图片上传，支持 SSE 流式返回）
+- 大纲与图片流水线生成（每写完一页立即开始生成该页图片）
 """
 
 import time
+import json
 import base64
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from backend.services.outline import get_outline_service
+from backend.services.image import get_image_service
 from .utils import log_request, log_error
 
 logger = logging.getLogger(__name__)
@@ -37,6 +40,13 @@ def create_outline_blueprint():
         - success: 是否成功
         - outline: 原始大纲文本
         - pages: 解析后的页面列表
+        - from_cache: 是否命中响应缓存
+
+        请求头 Accept 包含 text/event-stream 时以 SSE 流式返回：
+        - token: 新生成的文本片段 { text }
+        - page: 某一页写完后立即发送的页面 { index, type, content }
+        - done: 完整结果（结构同上方 JSON 返回）
+        - error: 生成失败 { success: false, error }
         """
         start_time = time.time()
 
@@ -63,6 +73,33 @@ def create_outline_blueprint():
             # 调用大纲生成服务
             logger.info(f"🔄 开始生成大纲，模式={input_mode}, 输入: {topic[:50]}...")
             outline_service = get_outline_service()
+
+            if 'text/event-stream' in request.headers.get('Accept', ''):
+                def generate():
+                    """SSE 事件生成器"""
+                    for event in outline_service.generate_outline_stream(
+                        topic,
+                        images if images else None,
+                        input_mode=input_mode
+                    ):
+                        if event["event"] == "done":
+                            elapsed = time.time() - start_time
+                            logger.info(f"✅ 大纲流式生成完成，耗时 {elapsed:.2f}s，共 {len(event['data'].get('pages', []))} 页")
+                        elif event["event"] == "error":
+                            logger.error(f"❌ 大纲流式生成失败: {event['data'].get('error', '未知错误')}")
+
+                        yield f"event: {event['event']}\n"
+                        yield f"data: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+                return Response(
+                    stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no',
+                    }
+                )
+
             result = outline_service.generate_outline(
                 topic,
                 images if images else None,
@@ -86,6 +123,93 @@ def create_outline_blueprint():
                 "error": f"大纲生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
             }), 500
 
+    @outline_bp.route('/outline/pipeline', methods=['POST'])
+    def generate_outline_pipeline():
+        """
+        从主题直接生成大纲和图片（SSE 流式返回）
+
+        大纲按页流式生成，每写完一页立即交给图片生成调度器，
+        封面在大模型撰写后续页面时就开始渲染，两个阶段重叠执行。
+
+        请求格式同 /outline，另外支持：
+        - task_id: 图片任务 ID（可选，默认自动生成）
+
+        上传的图片既作为大纲的参考，也作为图片生成的用户参考图。
+
+        返回：
+        SSE 事件流：
+        - outline_token / outline_page / outline_done / outline_error: 大纲事件（同 /outline 流式返回）
+        - progress / complete / error / finish: 图片事件（同 /generate）
+        """
+        try:
+            topic, images, input_mode = _parse_outline_request()
+            if request.content_type and 'multipart/form-data' in request.content_type:
+                task_id = request.form.get('task_id')
+            else:
+                task_id = (request.get_json(silent=True) or {}).get('task_id')
+
+            log_request('/outline/pipeline', {
+                'topic': topic, 'images': images, 'input_mode': input_mode, 'task_id': task_id
+            })
+
+            if not topic:
+                logger.warning("流水线生成请求缺少 topic 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
+                }), 400
+
+            if input_mode not in ('topic', 'free_text'):
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：input_mode 仅支持 topic 或 free_text"
+                }), 400
+
+            logger.info(f"🔄 开始流水线生成，模式={input_mode}, 输入: {topic[:50]}...")
+            outline_service = get_outline_service()
+            image_service = get_image_service()
+
+            def generate():
+                """SSE 事件生成器"""
+                outline_events = outline_service.generate_outline_stream(
+                    topic,
+                    images if images else None,
+                    input_mode=input_mode
+                )
+                for event in image_service.generate_images_streaming(
+                    outline_events,
+                    task_id,
+                    user_images=images if images else None,
+                    user_topic=topic
+                ):
+                    if event["event"] == "finish":
+                        elapsed = time.time() - start_time
+                        logger.info(
+                            f"✅ 流水线生成完成，耗时 {elapsed:.2f}s，"
+                            f"{event['data']['completed']}/{event['data']['total']} 张图片"
+                        )
+
+                    yield f"event: {event['event']}\n"
+                    yield f"data: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+            start_time = time.time()
+            return Response(
+                stream_with_context(generate()),
+                mimetype='text/event-stream',
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no',
+                }
+            )
+
+        except Exception as e:
+            log_error('/outline/pipeline', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"流水线生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
+            }), 500
+
     return outline_bp
 
 
@@ -6,6 +6,7 @@ API 路由工具函数
 
 import logging
 import traceback
+from collections.abc import Mapping
 
 logger = logging.getLogger(__name__)
 
@@ -92,6 +93,13 @@ def prepare_providers_for_response(providers: dict) -> dict:
             provider_copy['api_key_masked'] = ''
             provider_copy['api_key'] = ''
 
+        # 多 Key 负载均衡的 api_keys 同样只返回脱敏版本
+        if provider_copy.get('api_keys'):
+            provider_copy['api_keys_masked'] = [
+                mask_api_key(key.get('api_key', '') if isinstance(key, Mapping) else key)
+                for key in provider_copy.pop('api_keys')
+            ]
+
         result[name] = provider_copy
 
     return result
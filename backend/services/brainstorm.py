@@ -9,11 +9,9 @@
 import json
 import logging
 import re
-from pathlib import Path
-from typing import Any, Dict, List
-
-import yaml
+from typing import Any, Dict, List, Optional
 
+from backend.config import Config
 from backend.services.content import get_content_service
 from backend.services.outline import get_outline_service
 from backend.utils.text_client import get_text_chat_client
@@ -25,26 +23,9 @@ class BrainstormService:
     """创意风暴服务"""
 
     def __init__(self):
-        self.text_config = self._load_text_config()
+        self.text_config = Config.load_text_providers_config()
         self.client = self._get_client()
 
-    def _load_text_config(self) -> dict:
-        config_path = Path(__file__).parent.parent.parent / "text_providers.yaml"
-        if config_path.exists():
-            with open(config_path, "r", encoding="utf-8") as f:
-                return yaml.safe_load(f) or {}
-        return {
-            "active_provider": "google_gemini",
-            "providers": {
-                "google_gemini": {
-                    "type": "google_gemini",
-                    "model": "gemini-2.0-flash-exp",
-                    "temperature": 0.9,
-                    "max_output_tokens": 4000,
-                }
-            },
-        }
-
     def _get_client(self):
         active_provider = self.text_config.get("active_provider", "google_gemini")
         providers = self.text_config.get("providers", {})
@@ -184,5 +165,18 @@ class BrainstormService:
         }
 
 
+_service_instance: Optional[BrainstormService] = None
+
+
 def get_brainstorm_service() -> BrainstormService:
-    return BrainstormService()
+    """
+    获取创意风暴服务实例
+
+    复用同一实例（及其文本客户端），text_providers.yaml 变化后按新配置重建
+    """
+    global _service_instance
+    service = _service_instance
+    if service is None or service.text_config is not Config.load_text_providers_config():
+        service = BrainstormService()
+        _service_instance = service
+    return service
@@ -8,9 +8,10 @@ import json
 import logging
 import os
 import re
-import yaml
-from pathlib import Path
 from typing import Dict, List, Any, Optional
+from backend.config import Config
+from backend.utils.config_registry import get_config_registry
+from backend.utils.response_cache import get_response_cache, hash_bytes
 from backend.utils.text_client import get_text_chat_client
 from backend.utils.title_utils import truncate_title, truncate_titles
 
@@ -22,43 +23,10 @@ class ContentService:
 
     def __init__(self):
         logger.debug("初始化 ContentService...")
-        self.text_config = self._load_text_config()
+        self.text_config = Config.load_text_providers_config()
         self.client = self._get_client()
-        self.prompt_template = self._load_prompt_template()
         logger.info(f"ContentService 初始化完成，使用服务商: {self.text_config.get('active_provider')}")
 
-    def _load_text_config(self) -> dict:
-        """加载文本生成配置"""
-        config_path = Path(__file__).parent.parent.parent / 'text_providers.yaml'
-        logger.debug(f"加载文本配置: {config_path}")
-
-        if config_path.exists():
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f) or {}
-                logger.debug(f"文本配置加载成功: active={config.get('active_provider')}")
-                return config
-            except yaml.YAMLError as e:
-                logger.error(f"文本配置 YAML 解析失败: {e}")
-                raise ValueError(
-                    f"文本配置文件格式错误: text_providers.yaml\n"
-                    f"YAML 解析错误: {e}\n"
-                    "解决方案：检查 YAML 缩进和语法"
-                )
-
-        logger.warning("text_providers.yaml 不存在，使用默认配置")
-        return {
-            'active_provider': 'google_gemini',
-            'providers': {
-                'google_gemini': {
-                    'type': 'google_gemini',
-                    'model': 'gemini-2.0-flash-exp',
-                    'temperature': 1.0,
-                    'max_output_tokens': 8000
-                }
-            }
-        }
-
     def _get_client(self):
         """根据配置获取客户端"""
         active_provider = self.text_config.get('active_provider', 'google_gemini')
@@ -94,15 +62,15 @@ class ContentService:
         logger.info(f"使用文本服务商: {active_provider} (type={provider_config.get('type')})")
         return get_text_chat_client(provider_config)
 
-    def _load_prompt_template(self) -> str:
-        """加载提示词模板"""
+    @property
+    def prompt_template(self) -> str:
+        """文案提示词模板（注册表缓存，文件修改后自动重新读取）"""
         prompt_path = os.path.join(
             os.path.dirname(os.path.dirname(__file__)),
             "prompts",
             "content_prompt.txt"
         )
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return get_config_registry().read_text(prompt_path)
 
     def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
         """解析 AI 返回的 JSON 响应"""
@@ -165,6 +133,25 @@ class ContentService:
             temperature = provider_config.get('temperature', 1.0)
             max_output_tokens = provider_config.get('max_output_tokens', 4000)
 
+            # 相同服务商、参数和输入直接返回缓存结果
+            cache = get_response_cache(self.text_config)
+            cache_key = None
+            if cache:
+                cache_key = cache.make_key(
+                    kind='content',
+                    provider=active_provider,
+                    model=model,
+                    temperature=temperature,
+                    max_output_tokens=max_output_tokens,
+                    template=hash_bytes(self.prompt_template.encode('utf-8')),
+                    topic=topic,
+                    outline=outline
+                )
+                cached = cache.get(cache_key)
+                if cached:
+                    logger.info("内容命中缓存")
+                    return {**cached, "from_cache": True}
+
             logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
             response_text = self.client.generate_text(
                 prompt=prompt,
@@ -196,12 +183,20 @@ class ContentService:
 
             logger.info(f"内容生成完成: {len(titles)} 个标题, {len(tags)} 个标签")
 
-            return {
+            result = {
                 "success": True,
                 "titles": titles,
                 "copywriting": copywriting,
                 "tags": tags
             }
+            if cache:
+                try:
+                    cache.set(cache_key, result)
+                except Exception as e:
+                    # 缓存写入失败不影响本次结果
+                    logger.warning(f"写入响应缓存失败: {e}")
+
+            return {**result, "from_cache": False}
 
         except Exception as e:
             error_msg = str(e)
@@ -246,9 +241,18 @@ class ContentService:
             }
 
 
+_service_instance: Optional[ContentService] = None
+
+
 def get_content_service() -> ContentService:
     """
     获取内容生成服务实例
-    每次调用都创建新实例以确保配置是最新的
+
+    复用同一实例（及其文本客户端），text_providers.yaml 变化后按新配置重建
     """
-    return ContentService()
+    global _service_instance
+    service = _service_instance
+    if service is None or service.text_config is not Config.load_text_providers_config():
+        service = ContentService()
+        _service_instance = service
+    return service
@@ -5,13 +5,19 @@
 支持草稿、生成中、完成等多种状态流转。
 """
 
-import os
+import base64
+import binascii
 import json
+import os
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Generator, List, Optional
 from pathlib import Path
 from enum import Enum
+from backend.config import Config
+from backend.services.history_cache import DEFAULT_ORDERS, SORT_KEYS, HistoryIndexCache
+from backend.services.history_store import INDEX_FIELDS, create_history_store
 from backend.utils.title_utils import truncate_title, truncate_titles
 
 
@@ -24,68 +30,60 @@ class RecordStatus:
     ERROR = "error"          # 错误：生成过程中出现错误
 
 
-class HistoryService:
-    def __init__(self):
-        """
-        初始化历史记录服务
+def _encode_cursor(state: Dict) -> str:
+    """把分页状态编码为不透明的游标字符串"""
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
-        创建历史记录存储目录和索引文件
-        """
-        # 历史记录存储目录（项目根目录/history）
-        self.history_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "history"
-        )
-        os.makedirs(self.history_dir, exist_ok=True)
 
-        # 索引文件路径
-        self.index_file = os.path.join(self.history_dir, "index.json")
-        self._init_index()
-
-    def _init_index(self) -> None:
-        """
-        初始化索引文件
+def _decode_cursor(cursor: str) -> Dict:
+    """解码游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw.decode("utf-8"))
+        key = state["key"]
+        if not (isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)):
+            raise ValueError
+        if state.get("status") is not None and not isinstance(state["status"], str):
+            raise ValueError
+        return {
+            "sort": str(state["sort"]),
+            "order": str(state["order"]),
+            "status": state.get("status"),
+            "key": tuple(key)
+        }
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError):
+        raise ValueError("分页游标无效，请从第一页重新加载")
 
-        如果索引文件不存在，则创建一个空索引
-        """
-        if not os.path.exists(self.index_file):
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump({"records": []}, f, ensure_ascii=False, indent=2)
 
-    def _load_index(self) -> Dict:
-        """
-        加载索引文件
+class HistoryService:
+    # 批量扫描任务目录的并发线程数
+    SCAN_WORKERS = 8
+    # 单次批量导出的最大记录数
+    MAX_EXPORT_RECORDS = 500
 
-        Returns:
-            Dict: 索引数据，包含 records 列表
+    def __init__(self, history_dir: Optional[str] = None, backend: Optional[str] = None):
         """
-        try:
-            with open(self.index_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {"records": []}
+        初始化历史记录服务
 
-    def _save_index(self, index: Dict) -> None:
-        """
-        保存索引文件
+        创建历史记录存储目录和存储后端（默认 SQLite，见 Config.HISTORY_BACKEND），
+        列表、统计等读取走内存中的索引快照（见 HistoryIndexCache）。
+        多个 worker 进程可以共享同一目录，写入由存储后端做跨进程互斥。
 
         Args:
-            index: 索引数据
-        """
-        with open(self.index_file, "w", encoding="utf-8") as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
-
-    def _get_record_path(self, record_id: str) -> str:
+            history_dir: 历史记录目录，默认为项目根目录/history
+            backend: 存储后端，默认为 Config.HISTORY_BACKEND
         """
-        获取历史记录文件路径
+        # 历史记录存储目录（项目根目录/history）
+        self.history_dir = history_dir or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "history"
+        )
+        os.makedirs(self.history_dir, exist_ok=True)
 
-        Args:
-            record_id: 记录 ID
-
-        Returns:
-            str: 记录文件的完整路径
-        """
-        return os.path.join(self.history_dir, f"{record_id}.json")
+        self.store = create_history_store(backend or Config.HISTORY_BACKEND, self.history_dir)
+        # 记录的写入都经由索引缓存，保证快照与存储一致
+        self.index = HistoryIndexCache(self.store)
 
     def create_record(
         self,
@@ -146,24 +144,8 @@ class HistoryService:
             "thumbnail": None  # 初始无缩略图
         }
 
-        # 保存完整记录到独立文件
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
-
-        # 更新索引（用于快速列表查询）
-        index = self._load_index()
-        index["records"].insert(0, {
-            "id": record_id,
-            "title": display_title,
-            "created_at": now,
-            "updated_at": now,
-            "status": RecordStatus.DRAFT,  # 索引中也记录状态
-            "thumbnail": None,
-            "page_count": len(outline.get("pages", [])),  # 预期页数
-            "task_id": task_id
-        })
-        self._save_index(index)
+        # 保存完整记录，存储后端同步维护索引（用于快速列表查询）
+        self.index.save(record)
 
         return record_id
 
@@ -187,16 +169,7 @@ class HistoryService:
             - status: 当前状态
             - thumbnail: 缩略图文件名
         """
-        record_path = self._get_record_path(record_id)
-
-        if not os.path.exists(record_path):
-            return None
-
-        try:
-            with open(record_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return None
+        return self.store.get(record_id)
 
     def record_exists(self, record_id: str) -> bool:
         """
@@ -208,8 +181,7 @@ class HistoryService:
         Returns:
             bool: 记录是否存在
         """
-        record_path = self._get_record_path(record_id)
-        return os.path.exists(record_path)
+        return self.index.snapshot().contains(record_id)
 
     def update_record(
         self,
@@ -245,80 +217,44 @@ class HistoryService:
             partial -> generating: 继续生成剩余图片
             partial -> completed: 剩余图片生成完成
         """
-        # 获取现有记录
-        record = self.get_record(record_id)
-        if not record:
-            return False
-
-        # 更新时间戳
-        now = datetime.now().isoformat()
-        record["updated_at"] = now
-
-        # 更新标题
-        if title is not None:
-            record["title"] = truncate_title(title)
-
-        # 更新文案内容（标题备选、正文、标签）
-        if content is not None:
-            if isinstance(content, dict):
-                content_titles = truncate_titles(content.get("titles", []))
-                if content_titles:
-                    content["titles"] = content_titles
-                    if title is None:
-                        record["title"] = content_titles[0]
-            record["content"] = content
-
-        # 更新大纲内容（支持修改大纲）
-        if outline is not None:
-            record["outline"] = outline
-
-        # 更新图片信息
-        if images is not None:
-            record["images"] = images
-
-        # 更新状态（状态流转）
-        if status is not None:
-            record["status"] = status
-
-        # 更新缩略图
-        if thumbnail is not None:
-            record["thumbnail"] = thumbnail
-
-        # 保存完整记录
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
-
-        # 同步更新索引
-        index = self._load_index()
-        for idx_record in index["records"]:
-            if idx_record["id"] == record_id:
-                idx_record["updated_at"] = now
-
-                # 更新状态
-                if status:
-                    idx_record["status"] = status
-
-                # 更新标题（用于历史列表展示）
-                if title is not None or content is not None:
-                    idx_record["title"] = record.get("title", idx_record.get("title"))
-
-                # 更新缩略图
-                if thumbnail:
-                    idx_record["thumbnail"] = thumbnail
-
-                # 更新页数（如果大纲被修改）
-                if outline:
-                    idx_record["page_count"] = len(outline.get("pages", []))
-
-                # 更新任务 ID
-                if images is not None and images.get("task_id"):
-                    idx_record["task_id"] = images.get("task_id")
-
-                break
-
-        self._save_index(index)
-        return True
+        def apply(record: Dict) -> None:
+            # 更新时间戳
+            now = datetime.now().isoformat()
+            record["updated_at"] = now
+
+            # 更新标题
+            if title is not None:
+                record["title"] = truncate_title(title)
+
+            # 更新文案内容（标题备选、正文、标签）
+            if content is not None:
+                if isinstance(content, dict):
+                    content_titles = truncate_titles(content.get("titles", []))
+                    if content_titles:
+                        content["titles"] = content_titles
+                        if title is None:
+                            record["title"] = content_titles[0]
+                record["content"] = content
+
+            # 更新大纲内容（支持修改大纲）
+            if outline is not None:
+                record["outline"] = outline
+
+            # 更新图片信息
+            if images is not None:
+                record["images"] = images
+
+            # 更新状态（状态流转）
+            if status is not None:
+                record["status"] = status
+
+            # 更新缩略图
+            if thumbnail is not None:
+                record["thumbnail"] = thumbnail
+
+        # 在写会话内读取、修改并保存完整记录：多个 worker 同时更新同一记录时不会丢失修改，
+        # 索引行（状态、标题、缩略图、页数、任务 ID）随之更新
+        return self.index.update(record_id, apply) is not None
 
     def delete_record(self, record_id: str) -> bool:
         """
@@ -351,25 +287,37 @@ class HistoryService:
                 except Exception as e:
                     print(f"删除任务目录失败: {task_dir}, {e}")
 
-        # 删除记录 JSON 文件
-        record_path = self._get_record_path(record_id)
-        try:
-            os.remove(record_path)
-        except Exception:
-            return False
-
-        # 从索引中移除
-        index = self._load_index()
-        index["records"] = [r for r in index["records"] if r["id"] != record_id]
-        self._save_index(index)
-
-        return True
+        # 删除记录及其索引
+        return self.index.delete(record_id)
+
+    @staticmethod
+    def _resolve_sort(sort: str, order: Optional[str]) -> bool:
+        """校验排序参数，返回是否倒序"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}（可选 {' / '.join(SORT_KEYS)}）")
+        order = order or DEFAULT_ORDERS[sort]
+        if order not in ("asc", "desc"):
+            raise ValueError(f"不支持的排序方向: {order}（可选 asc / desc）")
+        return order == "desc"
+
+    @staticmethod
+    def _resolve_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+        """校验要返回的字段，id 总是返回"""
+        if not fields:
+            return None
+        unknown = [field for field in fields if field not in INDEX_FIELDS]
+        if unknown:
+            raise ValueError(f"不支持的字段: {', '.join(unknown)}（可选 {', '.join(INDEX_FIELDS)}）")
+        return ["id"] + [field for field in dict.fromkeys(fields) if field != "id"]
 
     def list_records(
         self,
         page: int = 1,
         page_size: int = 20,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        sort: str = "created",
+        order: Optional[str] = None,
+        fields: Optional[List[str]] = None
     ) -> Dict:
         """
         分页获取历史记录列表
@@ -378,6 +326,9 @@ class HistoryService:
             page: 页码，从 1 开始
             page_size: 每页记录数
             status: 状态过滤（可选），支持：draft/generating/partial/completed/error
+            sort: 排序字段，支持：created/updated/title
+            order: 排序方向 asc/desc，默认时间倒序、标题正序
+            fields: 只返回的索引字段（可选），id 总是返回
 
         Returns:
             Dict: 分页结果
@@ -386,19 +337,17 @@ class HistoryService:
                 - page: 当前页码
                 - page_size: 每页大小
                 - total_pages: 总页数
-        """
-        index = self._load_index()
-        records = index.get("records", [])
 
-        # 按状态过滤
-        if status:
-            records = [r for r in records if r.get("status") == status]
+        Raises:
+            ValueError: 排序或字段参数不合法
+        """
+        descending = self._resolve_sort(sort, order)
+        fields = self._resolve_fields(fields)
 
-        # 分页计算
-        total = len(records)
-        start = (page - 1) * page_size
-        end = start + page_size
-        page_records = records[start:end]
+        # 按状态过滤并分页（快照已按各排序字段排好序，直接切片）
+        page_records, total = self.index.snapshot().page(
+            (page - 1) * page_size, page_size, status, sort, descending, fields
+        )
 
         return {
             "records": page_records,
@@ -408,27 +357,93 @@ class HistoryService:
             "total_pages": (total + page_size - 1) // page_size
         }
 
-    def search_records(self, keyword: str) -> List[Dict]:
+    def list_records_after(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+        status: Optional[str] = None,
+        sort: str = "created",
+        order: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Dict:
         """
-        根据关键词搜索历史记录
+        游标（键集）分页获取历史记录列表，用于无限滚动
+
+        游标记录了上一页最后一条记录的排序键以及排序、状态过滤条件，
+        翻页时只需传回 next_cursor；后续页的 status/sort/order 以游标为准。
+        与偏移分页不同，翻到多深的位置耗时都一样，翻页期间新增的记录也不会导致重复或遗漏。
 
         Args:
-            keyword: 搜索关键词（不区分大小写）
+            cursor: 上一次返回的 next_cursor，为空表示第一页
+            limit: 每页记录数
+            status: 状态过滤（可选）
+            sort: 排序字段，支持：created/updated/title
+            order: 排序方向 asc/desc
+            fields: 只返回的索引字段（可选），id 总是返回
 
         Returns:
-            List[Dict]: 匹配的记录列表（按创建时间倒序）
+            Dict: 分页结果
+                - records: 当前页的记录列表
+                - total: 符合过滤条件的总记录数
+                - next_cursor: 下一页游标，没有更多记录时为 None
+                - has_more: 是否还有更多记录
+
+        Raises:
+            ValueError: 游标无效，或排序、字段参数不合法
         """
-        index = self._load_index()
-        records = index.get("records", [])
+        key = None
+        if cursor:
+            state = _decode_cursor(cursor)
+            sort, order, status, key = state["sort"], state["order"], state["status"], state["key"]
+
+        descending = self._resolve_sort(sort, order)
+        order = "desc" if descending else "asc"
+        fields = self._resolve_fields(fields)
+
+        page_records, next_key, total = self.index.snapshot().page_after(
+            key, limit, status, sort, descending, fields
+        )
+        next_cursor = None
+        if next_key is not None:
+            next_cursor = _encode_cursor({"sort": sort, "order": order, "status": status, "key": list(next_key)})
+
+        return {
+            "records": page_records,
+            "total": total,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
 
-        # 不区分大小写的标题搜索
-        keyword_lower = keyword.lower()
-        results = [
-            r for r in records
-            if keyword_lower in r.get("title", "").lower()
-        ]
+    def search_records(
+        self,
+        keyword: str,
+        page: int = 1,
+        page_size: int = 20,
+        status: Optional[str] = None
+    ) -> Dict:
+        """
+        根据关键词全文检索历史记录
 
-        return results
+        检索范围包括标题、大纲页面、文案和标签，中文按二元组匹配短语，英文不区分大小写。
+
+        Args:
+            keyword: 搜索关键词
+            page: 页码，从 1 开始
+            page_size: 每页记录数
+            status: 状态过滤（可选）
+
+        Returns:
+            Dict: 分页结果（按相关度排序），结构同 list_records
+        """
+        page_records, total = self.store.search(keyword, (page - 1) * page_size, page_size, status)
+
+        return {
+            "records": page_records,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size
+        }
 
     def get_statistics(self) -> Dict:
         """
@@ -444,23 +459,68 @@ class HistoryService:
                     - completed: 已完成数
                     - error: 错误数
         """
-        index = self._load_index()
-        records = index.get("records", [])
-
-        total = len(records)
-        status_count = {}
-
-        # 统计各状态的记录数
-        for record in records:
-            status = record.get("status", RecordStatus.DRAFT)
-            status_count[status] = status_count.get(status, 0) + 1
+        # 各状态的记录数由快照增量维护
+        status_count = self.index.snapshot().status_count()
+        total = sum(status_count.values())
 
         return {
             "total": total,
             "by_status": status_count
         }
 
-    def scan_and_sync_task_images(self, task_id: str) -> Dict[str, Any]:
+    def select_export_records(
+        self,
+        record_ids: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        选择要批量导出的记录
+
+        指定 record_ids 时按给定顺序导出（忽略不存在的记录），
+        否则按状态和创建日期范围过滤（在索引快照上二分定位），按创建时间正序。
+
+        Args:
+            record_ids: 记录 ID 列表（可选）
+            status: 状态过滤（可选）
+            start_date: 起始日期 YYYY-MM-DD（含，可选）
+            end_date: 结束日期 YYYY-MM-DD（含，可选）
+
+        Returns:
+            List[Dict]: 完整记录列表
+
+        Raises:
+            ValueError: 日期格式不正确，或记录数超过 MAX_EXPORT_RECORDS
+        """
+        if record_ids:
+            ids = list(dict.fromkeys(record_ids))
+        else:
+            try:
+                start = date.fromisoformat(start_date).isoformat() if start_date else None
+                # 结束日期包含当天：取次日零点作为不含的上界
+                end = (date.fromisoformat(end_date) + timedelta(days=1)).isoformat() if end_date else None
+            except ValueError:
+                raise ValueError("日期格式应为 YYYY-MM-DD")
+            if start and end and start >= end:
+                raise ValueError("起始日期不能晚于结束日期")
+            ids = [row["id"] for row in self.index.snapshot().created_between(start, end, status)]
+
+        if len(ids) > self.MAX_EXPORT_RECORDS:
+            raise ValueError(f"一次最多导出 {self.MAX_EXPORT_RECORDS} 条记录，当前 {len(ids)} 条，请缩小范围")
+
+        records = []
+        for record_id in ids:
+            record = self.store.get(record_id)
+            if record:
+                records.append(record)
+        return records
+
+    def scan_and_sync_task_images(
+        self,
+        task_id: str,
+        task_index: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
         """
         扫描任务文件夹，同步图片列表
 
@@ -471,6 +531,8 @@ class HistoryService:
 
         Args:
             task_id: 任务 ID
+            task_index: 预先加载的 task_id -> record_id 反向索引（批量扫描时传入，
+                避免逐个任务查询存储）
 
         Returns:
             Dict[str, Any]: 扫描结果
@@ -509,15 +571,11 @@ class HistoryService:
 
             image_files.sort(key=get_index)
 
-            # 查找关联的历史记录
-            index = self._load_index()
-            record_id = None
-            for rec in index.get("records", []):
-                # 通过遍历所有记录，找到 task_id 匹配的记录
-                record_detail = self.get_record(rec["id"])
-                if record_detail and record_detail.get("images", {}).get("task_id") == task_id:
-                    record_id = rec["id"]
-                    break
+            # 通过反向索引查找关联的历史记录
+            if task_index is not None:
+                record_id = task_index.get(task_id)
+            else:
+                record_id = self.store.find_by_task_id(task_id)
 
             if record_id:
                 # 更新历史记录
@@ -569,21 +627,119 @@ class HistoryService:
                 "error": f"扫描任务失败: {str(e)}"
             }
 
-    def scan_all_tasks(self) -> Dict[str, Any]:
+    def _task_fingerprint(self, task_dir: str, record_id: Optional[str], page_count: int) -> str:
+        """
+        任务目录指纹：目录修改时间 + 文件数 + 关联记录 + 记录的大纲页数
+
+        增删图片会改变目录修改时间和文件数；关联记录变化（如孤立任务后来补建了记录）
+        或大纲增删页面（决定任务是否完成）也需要重新同步。
+        不使用 updated_at：同步本身会刷新它，导致每次扫描都判定为已变化。
+        """
+        stat = os.stat(task_dir)
+        file_count = sum(1 for _ in os.scandir(task_dir))
+        return f"{stat.st_mtime_ns}:{file_count}:{record_id or ''}:{page_count}"
+
+    def iter_scan_all_tasks(self, force: bool = False) -> Generator[Dict[str, Any], None, None]:
+        """
+        增量扫描所有任务文件夹，逐个返回同步结果
+
+        与上次扫描相比指纹未变化的任务目录直接跳过，其余目录交给线程池并发同步。
+
+        Args:
+            force: 忽略指纹，全量重新同步
+
+        Yields:
+            Dict[str, Any]: 扫描事件
+                - start: total_tasks / changed / skipped
+                - task: 单个任务的同步结果（同 scan_and_sync_task_images）
+                - finish: 汇总统计（同 scan_all_tasks，不含 results）
+        """
+        task_index = self.store.get_task_index()
+        page_counts = {row["id"]: row.get("page_count", 0) for row in self.store.iter_index()}
+        previous = {} if force else self.store.get_scan_checkpoints()
+        checkpoints: Dict[str, str] = {}
+        pending: Dict[str, str] = {}
+
+        # 遍历 history 目录，任务文件夹名就是 task_id
+        for entry in os.scandir(self.history_dir):
+            if not entry.is_dir():
+                continue
+            record_id = task_index.get(entry.name)
+            fingerprint = self._task_fingerprint(entry.path, record_id, page_counts.get(record_id, 0))
+            if previous.get(entry.name) == fingerprint:
+                checkpoints[entry.name] = fingerprint
+            else:
+                pending[entry.name] = fingerprint
+
+        # 跳过的任务中没有关联记录的仍计为孤立任务
+        orphan_tasks = [task_id for task_id in checkpoints if task_id not in task_index]
+        total_count = len(checkpoints) + len(pending)
+        skipped_count = len(checkpoints)
+        synced_count = 0
+        failed_count = 0
+
+        yield {
+            "event": "start",
+            "data": {
+                "total_tasks": total_count,
+                "changed": len(pending),
+                "skipped": skipped_count
+            }
+        }
+
+        with ThreadPoolExecutor(max_workers=self.SCAN_WORKERS, thread_name_prefix="history-scan") as executor:
+            futures = {
+                executor.submit(self.scan_and_sync_task_images, task_id, task_index): task_id
+                for task_id in pending
+            }
+            for future in as_completed(futures):
+                task_id = futures[future]
+                result = future.result()
+
+                if result.get("success"):
+                    checkpoints[task_id] = pending[task_id]
+                    if result.get("no_record"):
+                        orphan_tasks.append(task_id)
+                    else:
+                        synced_count += 1
+                else:
+                    failed_count += 1
+
+                yield {"event": "task", "data": result}
+
+        self.store.save_scan_checkpoints(checkpoints)
+
+        yield {
+            "event": "finish",
+            "data": {
+                "success": True,
+                "total_tasks": total_count,
+                "synced": synced_count,
+                "skipped": skipped_count,
+                "failed": failed_count,
+                "orphan_tasks": orphan_tasks
+            }
+        }
+
+    def scan_all_tasks(self, force: bool = False) -> Dict[str, Any]:
         """
         扫描所有任务文件夹，同步图片列表
 
         批量扫描 history 目录下的所有任务文件夹，
-        同步图片列表并更新记录状态。
+        同步图片列表并更新记录状态（增量，见 iter_scan_all_tasks）。
+
+        Args:
+            force: 忽略指纹，全量重新同步
 
         Returns:
             Dict[str, Any]: 扫描结果统计
                 - success: 是否成功
                 - total_tasks: 扫描的任务总数
                 - synced: 成功同步的任务数
+                - skipped: 未变化而跳过的任务数
                 - failed: 失败的任务数
                 - orphan_tasks: 孤立任务列表（有图片但无记录）
-                - results: 详细结果列表
+                - results: 本次实际同步的任务结果列表
                 - error: 错误信息（失败时）
         """
         if not os.path.exists(self.history_dir):
@@ -593,42 +749,15 @@ class HistoryService:
             }
 
         try:
-            synced_count = 0
-            failed_count = 0
-            orphan_tasks = []  # 没有关联记录的任务
             results = []
+            summary: Dict[str, Any] = {}
+            for event in self.iter_scan_all_tasks(force):
+                if event["event"] == "task":
+                    results.append(event["data"])
+                elif event["event"] == "finish":
+                    summary = event["data"]
 
-            # 遍历 history 目录
-            for item in os.listdir(self.history_dir):
-                item_path = os.path.join(self.history_dir, item)
-
-                # 只处理目录（任务文件夹）
-                if not os.path.isdir(item_path):
-                    continue
-
-                # 假设任务文件夹名就是 task_id
-                task_id = item
-
-                # 扫描并同步
-                result = self.scan_and_sync_task_images(task_id)
-                results.append(result)
-
-                if result.get("success"):
-                    if result.get("no_record"):
-                        orphan_tasks.append(task_id)
-                    else:
-                        synced_count += 1
-                else:
-                    failed_count += 1
-
-            return {
-                "success": True,
-                "total_tasks": len(results),
-                "synced": synced_count,
-                "failed": failed_count,
-                "orphan_tasks": orphan_tasks,
-                "results": results
-            }
+            return {**summary, "results": results}
 
         except Exception as e:
             return {
@@ -636,6 +765,21 @@ class HistoryService:
                 "error": f"扫描所有任务失败: {str(e)}"
             }
 
+    def rebuild_task_index(self) -> int:
+        """
+        重建 task_id -> record_id 反向索引
+
+        正常情况下索引随记录的创建、更新、删除自动维护；
+        手动修改过记录文件或索引损坏时可调用此方法重建。
+
+        Returns:
+            int: 重建后的索引条数
+        """
+        count = self.store.rebuild_task_index()
+        # 重建直接修改了存储中的索引行
+        self.index.invalidate()
+        return count
+
 
 _service_instance = None
 
@@ -0,0 +1,319 @@
+"""
+历史记录索引的内存快照
+
+历史页面会轮询列表、统计等接口，每次都读存储（解析整个 index.json 或查询 SQLite）并不划算。
+HistoryIndexCache 在内存中保存一份不可变的索引快照：
+- 快照中的索引行按创建时间、更新时间、标题分别预先排好序，并按状态分组，
+  分页直接切片，键集分页（游标）用二分查找定位，深页与第一页耗时相同
+- 各状态的计数随快照增量维护，统计接口不再遍历全部记录
+- 本进程的写入经由缓存完成，写入后在新快照上增量更新（写时复制），读取方无需加锁
+- 其他进程修改了存储（存储的 change_token 变化）时整体重建快照
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.services.history_store import HistoryStore, build_index_row
+
+
+# 支持的排序字段：排序键函数与默认方向（时间默认倒序，标题默认正序），键的最后一项为 id 保证唯一
+SORT_KEYS: Dict[str, Callable[[Dict], Tuple[str, str]]] = {
+    "created": lambda row: (row.get("created_at") or "", row["id"]),
+    "updated": lambda row: (row.get("updated_at") or "", row["id"]),
+    "title": lambda row: ((row.get("title") or "").lower(), row["id"])
+}
+DEFAULT_ORDERS = {"created": "desc", "updated": "desc", "title": "asc"}
+
+
+class _SortedRows:
+    """按排序键升序排列的索引行，倒序分页时从尾部切片"""
+
+    __slots__ = ("key_func", "keys", "rows")
+
+    def __init__(self, key_func: Callable[[Dict], Tuple[str, str]], rows: List[Dict]):
+        self.key_func = key_func
+        self.rows = rows
+        self.keys = [key_func(row) for row in rows]
+
+    @classmethod
+    def _from_parts(cls, key_func, keys: List[Tuple[str, str]], rows: List[Dict]) -> "_SortedRows":
+        instance = cls.__new__(cls)
+        instance.key_func, instance.keys, instance.rows = key_func, keys, rows
+        return instance
+
+    def page(self, offset: int, limit: int, descending: bool = True) -> List[Dict]:
+        if descending:
+            end = len(self.rows) - offset
+            return list(reversed(self.rows[max(0, end - limit):end])) if end > 0 and limit > 0 else []
+        return self.rows[offset:offset + limit] if limit > 0 else []
+
+    def page_after(self, key: Optional[Tuple[str, str]], limit: int,
+                   descending: bool = True) -> Tuple[List[Dict], bool]:
+        """
+        键集分页：取排在 key 之后的 limit 行，key 为 None 时从头开始
+
+        Returns:
+            (当前页, 之后是否还有记录)
+        """
+        if descending:
+            end = len(self.rows) if key is None else bisect_left(self.keys, key)
+            start = max(0, end - limit)
+            return list(reversed(self.rows[start:end])), start > 0
+        start = 0 if key is None else bisect_right(self.keys, key)
+        end = start + limit
+        return self.rows[start:end], end < len(self.rows)
+
+    def inserted(self, row: Dict) -> "_SortedRows":
+        key = self.key_func(row)
+        pos = bisect_left(self.keys, key)
+        return self._from_parts(
+            self.key_func, self.keys[:pos] + [key] + self.keys[pos:], self.rows[:pos] + [row] + self.rows[pos:]
+        )
+
+    def removed(self, row: Dict) -> "_SortedRows":
+        pos = bisect_left(self.keys, self.key_func(row))
+        return self._from_parts(
+            self.key_func, self.keys[:pos] + self.keys[pos + 1:], self.rows[:pos] + self.rows[pos + 1:]
+        )
+
+
+def _project(rows: List[Dict], fields: Optional[Sequence[str]]) -> List[Dict]:
+    """复制索引行（可只保留指定字段），快照内部的行不会被调用方修改"""
+    if fields is None:
+        return [dict(row) for row in rows]
+    return [{field: row.get(field) for field in fields} for row in rows]
+
+
+class IndexSnapshot:
+    """
+    不可变的索引快照
+
+    每种排序都预先排好一份全部记录和按状态分组的记录；
+    更新方法返回新的快照，原快照不变，正在读取旧快照的请求不受影响。
+    返回给调用方的索引行都是副本。
+    """
+
+    __slots__ = ("_orders", "_by_id", "_status_count")
+
+    def __init__(self, orders: Dict[Tuple[str, Optional[str]], _SortedRows],
+                 by_id: Dict[str, Dict], status_count: Dict[str, int]):
+        # (排序字段, 状态) -> 有序行，状态为 None 表示全部记录
+        self._orders = orders
+        self._by_id = by_id
+        self._status_count = status_count
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict]) -> "IndexSnapshot":
+        """
+        从存储的全部索引行构建快照
+
+        Args:
+            rows: 索引行
+
+        Returns:
+            IndexSnapshot: 新快照
+        """
+        by_id = {row["id"]: dict(row) for row in rows}
+
+        grouped: Dict[Optional[str], List[Dict]] = {None: list(by_id.values())}
+        for row in by_id.values():
+            grouped.setdefault(row.get("status", "draft"), []).append(row)
+
+        orders = {}
+        for sort, key_func in SORT_KEYS.items():
+            for status, group in grouped.items():
+                orders[(sort, status)] = _SortedRows(key_func, sorted(group, key=key_func))
+
+        status_count = {status: len(group) for status, group in grouped.items() if status is not None}
+        return cls(orders, by_id, status_count)
+
+    def _rows(self, sort: str, status: Optional[str]) -> Optional[_SortedRows]:
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}（可选 {' / '.join(SORT_KEYS)}）")
+        return self._orders.get((sort, status or None))
+
+    def page(self, offset: int, limit: int, status: Optional[str] = None, sort: str = "created",
+             descending: bool = True, fields: Optional[Sequence[str]] = None) -> Tuple[List[Dict], int]:
+        """按偏移量分页，返回 (当前页, 总数)"""
+        rows = self._rows(sort, status)
+        if rows is None:
+            return [], 0
+        return _project(rows.page(offset, limit, descending), fields), len(rows.rows)
+
+    def page_after(self, key: Optional[Tuple[str, str]], limit: int, status: Optional[str] = None,
+                   sort: str = "created", descending: bool = True,
+                   fields: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Tuple[str, str]], int]:
+        """
+        键集分页，耗时与翻到第几页无关
+
+        Args:
+            key: 上一页最后一行的排序键，None 表示第一页
+            limit: 每页数量
+            status: 状态过滤
+            sort: 排序字段（created/updated/title）
+            descending: 是否倒序
+            fields: 只返回的字段，None 表示全部
+
+        Returns:
+            (当前页, 下一页的起始键（没有更多时为 None）, 总数)
+        """
+        rows = self._rows(sort, status)
+        if rows is None:
+            return [], None, 0
+        page, has_more = rows.page_after(key, limit, descending)
+        next_key = rows.key_func(page[-1]) if page and has_more else None
+        return _project(page, fields), next_key, len(rows.rows)
+
+    def created_between(self, start: Optional[str], end: Optional[str],
+                        status: Optional[str] = None) -> List[Dict]:
+        """
+        按创建时间范围取索引行（二分定位，按创建时间正序）
+
+        Args:
+            start: 起始时间（含），ISO 格式字符串，None 表示不限
+            end: 结束时间（不含），ISO 格式字符串，None 表示不限
+            status: 状态过滤
+
+        Returns:
+            List[Dict]: 索引行副本
+        """
+        rows = self._rows("created", status)
+        if rows is None:
+            return []
+        lo = bisect_left(rows.keys, (start, "")) if start else 0
+        hi = bisect_left(rows.keys, (end, "")) if end else len(rows.rows)
+        return _project(rows.rows[lo:hi], None)
+
+    def contains(self, record_id: str) -> bool:
+        return record_id in self._by_id
+
+    def status_count(self) -> Dict[str, int]:
+        return {status: count for status, count in self._status_count.items() if count}
+
+    def with_row(self, row: Dict) -> "IndexSnapshot":
+        """新增或替换一行后的新快照"""
+        snapshot = self.without(row["id"])
+        row = dict(row)
+        status = row.get("status", "draft")
+
+        orders = dict(snapshot._orders)
+        for sort, key_func in SORT_KEYS.items():
+            for group in (None, status):
+                current = orders.get((sort, group)) or _SortedRows(key_func, [])
+                orders[(sort, group)] = current.inserted(row)
+        by_id = dict(snapshot._by_id)
+        by_id[row["id"]] = row
+        status_count = dict(snapshot._status_count)
+        status_count[status] = status_count.get(status, 0) + 1
+        return IndexSnapshot(orders, by_id, status_count)
+
+    def without(self, record_id: str) -> "IndexSnapshot":
+        """移除一行后的新快照，记录不存在时返回自身"""
+        row = self._by_id.get(record_id)
+        if row is None:
+            return self
+        status = row.get("status", "draft")
+
+        orders = dict(self._orders)
+        for sort in SORT_KEYS:
+            for group in (None, status):
+                orders[(sort, group)] = orders[(sort, group)].removed(row)
+        by_id = dict(self._by_id)
+        del by_id[record_id]
+        status_count = dict(self._status_count)
+        status_count[status] -= 1
+        return IndexSnapshot(orders, by_id, status_count)
+
+
+class HistoryIndexCache:
+    """
+    带失效检测的索引快照缓存
+
+    读取时比较存储的 change_token（index.json 与日志的 inode/mtime/大小，或 SQLite 的版本号），
+    变化说明有其他进程写入，重新加载；本进程的写入通过 save/delete 完成并增量更新快照。
+    """
+
+    def __init__(self, store: HistoryStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._token: Any = None
+
+    def snapshot(self) -> IndexSnapshot:
+        """获取当前快照（存储被外部修改时先重建）"""
+        snapshot = self._snapshot
+        if snapshot is not None and self.store.change_token() == self._token:
+            return snapshot
+
+        with self._lock:
+            token = self.store.change_token()
+            if self._snapshot is None or token != self._token:
+                # 先取令牌再读数据：读取期间发生的写入会让下次检查再次重建
+                self._snapshot = IndexSnapshot.build(self.store.iter_index())
+                self._token = token
+            return self._snapshot
+
+    def _write(self, write: Callable[[], Any], update: Callable[[IndexSnapshot, Any], IndexSnapshot]) -> Any:
+        # 写会话内其他进程不能写入，前后两次读取的 change_token 之差只来自本次写入
+        with self._lock, self.store.write_session():
+            # 写入前快照已过期（有未感知的外部修改）时不能在其上增量更新，直接作废
+            fresh = self._snapshot is not None and self.store.change_token() == self._token
+            result = write()
+            if fresh:
+                self._snapshot = update(self._snapshot, result)
+                self._token = self.store.change_token()
+            else:
+                self._snapshot = None
+            return result
+
+    def save(self, record: Dict) -> None:
+        """
+        写入记录并更新快照
+
+        Args:
+            record: 完整记录
+        """
+        row = build_index_row(record)
+        self._write(lambda: self.store.save(record), lambda snapshot, _: snapshot.with_row(row))
+
+    def update(self, record_id: str, mutate: Callable[[Dict], None]) -> Optional[Dict]:
+        """
+        在写会话内读取、修改并写回记录，多个进程同时更新同一条记录不会互相覆盖
+
+        Args:
+            record_id: 记录 ID
+            mutate: 原地修改完整记录的函数
+
+        Returns:
+            修改后的记录，记录不存在时返回 None
+        """
+        def write() -> Optional[Dict]:
+            record = self.store.get(record_id)
+            if record is None:
+                return None
+            mutate(record)
+            self.store.save(record)
+            return record
+
+        return self._write(
+            write,
+            lambda snapshot, record: snapshot.with_row(build_index_row(record)) if record else snapshot
+        )
+
+    def delete(self, record_id: str) -> bool:
+        """
+        删除记录并更新快照
+
+        Args:
+            record_id: 记录 ID
+
+        Returns:
+            bool: 记录不存在时返回 False
+        """
+        return self._write(lambda: self.store.delete(record_id), lambda snapshot, _: snapshot.without(record_id))
+
+    def invalidate(self) -> None:
+        """丢弃快照，下次读取时重新加载（绕过缓存直接修改存储后调用）"""
+        with self._lock:
+            self._snapshot = None
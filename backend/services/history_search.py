@@ -0,0 +1,119 @@
+"""
+历史记录全文检索的分词
+
+SQLite FTS5 自带的 unicode61 分词器按空白和标点切词，连续的中文会被当成一个整词，
+无法按短语检索。这里在写入和查询前先在 Python 中分词，再把以空格分隔的词交给 FTS5：
+- 中文（CJK）连续片段切成重叠的二元组（bigram），片段末字额外保留为单字，
+  例如「秋季穿搭」→ 秋季 季穿 穿搭 搭
+- 其他文本按字母数字切词并转小写
+
+查询时关键词按同样方式切分，中文片段作为 FTS5 短语（二元组必须相邻），
+英文/数字词按前缀匹配，多个片段之间为 AND 关系。
+"""
+
+import re
+from typing import Dict, List, Optional
+
+# CJK 统一表意文字、扩展 A、兼容表意文字，以及日文假名、韩文音节
+_CJK_CHARS = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK_CHARS}]+|[^\W_{_CJK_CHARS}]+")
+_CJK_PATTERN = re.compile(rf"[{_CJK_CHARS}]")
+
+# FTS5 表中各列的 bm25 权重：标题命中最重要，其次是标签
+SEARCH_COLUMNS = ("title", "outline", "copywriting", "tags")
+SEARCH_WEIGHTS = (10.0, 2.0, 2.0, 5.0)
+
+
+def _cjk_bigrams(run: str) -> List[str]:
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def tokenize(text: str) -> str:
+    """
+    把文本切成 FTS5 写入用的词序列
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        str: 以空格分隔的词
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_PATTERN.findall(text or ""):
+        if _CJK_PATTERN.match(run):
+            tokens.extend(_cjk_bigrams(run))
+        else:
+            tokens.append(run.lower())
+    return " ".join(tokens)
+
+
+def build_match_query(keyword: str) -> Optional[str]:
+    """
+    把用户输入的关键词转换为 FTS5 MATCH 表达式
+
+    Args:
+        keyword: 搜索关键词
+
+    Returns:
+        MATCH 表达式，关键词中没有可检索的字符时返回 None
+    """
+    terms = []
+    for run in _TOKEN_PATTERN.findall(keyword or ""):
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                # 单字可能出现在任意二元组的首字或片段末字
+                terms.append(f'"{run}"*')
+            else:
+                terms.append('"' + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+        else:
+            terms.append(f'"{run.lower()}"*')
+    return " AND ".join(terms) if terms else None
+
+
+def build_search_document(record: Dict) -> Dict[str, str]:
+    """
+    从完整记录提取各检索列的文本
+
+    Args:
+        record: 完整记录
+
+    Returns:
+        Dict: {title, outline, copywriting, tags} 原始文本
+    """
+    outline = record.get("outline") or {}
+    pages = outline.get("pages") or []
+    if pages:
+        outline_text = "\n".join(str(page.get("content", "")) for page in pages if isinstance(page, dict))
+    else:
+        outline_text = str(outline.get("raw", ""))
+
+    content = record.get("content") or {}
+    titles = content.get("titles") or []
+    tags = content.get("tags") or []
+    return {
+        "title": " ".join([record.get("title", "")] + [str(t) for t in titles]),
+        "outline": outline_text,
+        "copywriting": str(content.get("copywriting", "")),
+        "tags": " ".join(str(tag) for tag in tags)
+    }
+
+
+def matches_keyword(document: Dict[str, str], keyword: str) -> int:
+    """
+    无全文索引时的子串匹配打分（JSON 存储后端使用）
+
+    Args:
+        document: build_search_document 的结果
+        keyword: 搜索关键词
+
+    Returns:
+        int: 匹配得分，0 表示不匹配
+    """
+    keyword_lower = keyword.lower()
+    score = 0
+    for column, weight in zip(SEARCH_COLUMNS, SEARCH_WEIGHTS):
+        if keyword_lower in document[column].lower():
+            score += int(weight)
+    return score
@@ -0,0 +1,721 @@
+"""
+历史记录存储后端
+
+HistoryService 只负责业务逻辑（标题截断、状态流转、图片同步），
+记录的持久化交给可替换的存储后端：
+- SQLiteHistoryStore（默认）：history/history.db，WAL 模式；索引字段为独立列并建索引，
+  完整记录以 JSON 存在 data 列，列表/搜索/统计都是带索引的 SQL 查询
+- JsonHistoryStore：旧版 index.json + <record_id>.json 文件存储，索引修改先追加到日志再定期合并
+
+SQLite 后端额外维护 FTS5 全文索引（records_fts），覆盖标题、大纲、文案和标签，
+与记录在同一事务中增量更新，检索结果按 bm25 相关度排序。
+
+首次使用 SQLite 后端时会把已有的 index.json 和 <record_id>.json 一次性迁移进数据库，
+旧文件保留不动，可作为备份。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from backend.services.history_search import (
+    SEARCH_COLUMNS,
+    SEARCH_WEIGHTS,
+    build_match_query,
+    build_search_document,
+    matches_keyword,
+    tokenize,
+)
+from backend.utils.atomic_file import atomic_write_json
+from backend.utils.file_lock import InterProcessLock
+
+logger = logging.getLogger(__name__)
+
+# 索引行字段（列表页展示用），与旧版 index.json 中的记录结构一致
+INDEX_FIELDS = ("id", "title", "created_at", "updated_at", "status", "thumbnail", "page_count", "task_id")
+
+
+def build_index_row(record: Dict) -> Dict:
+    """
+    从完整记录提取索引行
+
+    Args:
+        record: 完整记录
+
+    Returns:
+        Dict: 索引行（id/title/时间/状态/缩略图/页数/任务 ID）
+    """
+    return {
+        "id": record["id"],
+        "title": record.get("title", ""),
+        "created_at": record.get("created_at", ""),
+        "updated_at": record.get("updated_at", ""),
+        "status": record.get("status", "draft"),
+        "thumbnail": record.get("thumbnail"),
+        "page_count": len((record.get("outline") or {}).get("pages", [])),
+        "task_id": (record.get("images") or {}).get("task_id")
+    }
+
+
+class HistoryStore:
+    """存储后端接口"""
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        """获取完整记录，不存在返回 None"""
+        raise NotImplementedError
+
+    def exists(self, record_id: str) -> bool:
+        """记录是否存在"""
+        raise NotImplementedError
+
+    def save(self, record: Dict) -> None:
+        """新增或覆盖一条记录，同步更新索引"""
+        raise NotImplementedError
+
+    def delete(self, record_id: str) -> bool:
+        """删除记录，不存在返回 False"""
+        raise NotImplementedError
+
+    def list(self, offset: int, limit: int, status: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """按创建时间倒序分页获取索引行，返回 (当前页, 总数)"""
+        raise NotImplementedError
+
+    def search(self, keyword: str, offset: int, limit: int,
+               status: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """在标题、大纲、文案和标签中全文检索，按相关度排序分页，返回 (当前页, 总数)"""
+        raise NotImplementedError
+
+    def count_by_status(self) -> Dict[str, int]:
+        """各状态的记录数"""
+        raise NotImplementedError
+
+    def iter_index(self) -> Iterator[Dict]:
+        """按创建时间倒序遍历所有索引行"""
+        raise NotImplementedError
+
+    def find_by_task_id(self, task_id: str) -> Optional[str]:
+        """通过任务 ID 查找记录 ID（多条记录共用时取最新创建的），不存在返回 None"""
+        raise NotImplementedError
+
+    def get_task_index(self) -> Dict[str, str]:
+        """获取完整的 task_id -> record_id 反向索引"""
+        raise NotImplementedError
+
+    def rebuild_task_index(self) -> int:
+        """根据完整记录中的 images.task_id 重建反向索引，返回索引条数"""
+        raise NotImplementedError
+
+    def get_scan_checkpoints(self) -> Dict[str, str]:
+        """获取上次扫描时各任务目录的指纹"""
+        raise NotImplementedError
+
+    def change_token(self) -> Any:
+        """存储内容的变更标记，索引被（任意进程）修改后值会变化，用于内存快照失效检测"""
+        raise NotImplementedError
+
+    def write_session(self) -> ContextManager[None]:
+        """
+        跨进程的写会话（可重入）
+
+        会话内的读改写不会与其他进程/线程的写入交错，会话内读取的 change_token 只反映本会话的修改。
+        """
+        raise NotImplementedError
+
+    def save_scan_checkpoints(self, checkpoints: Dict[str, str]) -> None:
+        """整体替换任务目录指纹（已删除的目录随之清除）"""
+        raise NotImplementedError
+
+
+class JsonHistoryStore(HistoryStore):
+    """
+    旧版文件存储：index.json 保存索引，<record_id>.json 保存完整记录
+
+    index.json 中额外维护 tasks 字段（task_id -> record_id 反向索引），
+    旧版索引文件缺少该字段时按索引行中的 task_id 补建。
+
+    所有文件都以原子方式写入（临时文件 + fsync + os.replace），进程被杀不会留下截断的文件。
+    索引的修改不再每次重写整个 index.json，而是先追加到 index.journal（每行一条 save/delete 操作，
+    追加后 fsync）；读取索引时在 index.json 上重放日志，日志超过 JOURNAL_COMPACT_BYTES 时
+    合并回 index.json 并清空。启动时若日志非空（上次进程在合并前退出）先完成合并。
+    """
+
+    # 日志合并阈值
+    JOURNAL_COMPACT_BYTES = 256 * 1024
+
+    def __init__(self, history_dir: str):
+        self.history_dir = history_dir
+        self.index_file = os.path.join(history_dir, "index.json")
+        self.journal_file = os.path.join(history_dir, "index.journal")
+        self.checkpoint_file = os.path.join(history_dir, "scan_checkpoints.json")
+        # 索引读改写需要串行：批量扫描会并发更新记录，多个 worker 进程可能共享同一目录
+        self._lock = InterProcessLock(os.path.join(history_dir, ".history.lock"))
+        self._init_index()
+        self._recover()
+
+    def _init_index(self) -> None:
+        """索引文件不存在时创建空索引"""
+        with self._lock.exclusive():
+            if not os.path.exists(self.index_file):
+                atomic_write_json(self.index_file, {"records": []}, indent=2)
+
+    def _recover(self) -> None:
+        """启动恢复：重放上次未合并的日志；index.json 损坏时从记录文件重建"""
+        with self._lock.exclusive():
+            entries = self._read_journal()
+            if entries or self._read_index_file() is None:
+                self._save_index(self._load_index())
+                logger.info(f"历史记录索引已恢复（重放 {len(entries)} 条日志）")
+
+    def _read_index_file(self) -> Optional[Dict]:
+        """读取 index.json，文件损坏时返回 None"""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {"records": []}
+        except Exception as e:
+            logger.error(f"历史记录索引文件损坏: {e}")
+            return None
+        return index if isinstance(index, dict) else None
+
+    def _load_index(self) -> Dict:
+        # 读锁保证 index.json 与日志来自同一时刻（不会读到合并到一半的状态）
+        with self._lock.shared():
+            index = self._read_index_file()
+            if index is None:
+                # 不能当作空索引处理，否则所有历史记录都会"消失"
+                index = self._rebuild_index_from_records()
+            entries = self._read_journal()
+
+        index.setdefault("records", [])
+        if entries:
+            self._replay(index, entries)
+        elif "tasks" not in index:
+            index["tasks"] = self._build_task_map(index["records"])
+        return index
+
+    def _rebuild_index_from_records(self) -> Dict:
+        """扫描 <record_id>.json 重建索引（按创建时间倒序）"""
+        rows = []
+        for name in os.listdir(self.history_dir):
+            path = os.path.join(self.history_dir, name)
+            if not name.endswith(".json") or path in (self.index_file, self.checkpoint_file):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                rows.append(build_index_row(record))
+            except Exception:
+                continue
+        rows.sort(key=lambda row: row.get("created_at") or "", reverse=True)
+        logger.warning(f"已从记录文件重建历史记录索引: {len(rows)} 条")
+        return {"records": rows}
+
+    @classmethod
+    def _replay(cls, index: Dict, entries: List[Dict]) -> None:
+        """在索引上按顺序重放日志（操作都是幂等的，重复重放结果不变）"""
+        rows = {row["id"]: row for row in index["records"]}
+        added = []
+        for entry in entries:
+            if entry.get("op") == "save":
+                row = entry["row"]
+                if row["id"] not in rows:
+                    added.append(row["id"])
+                rows[row["id"]] = row
+            elif entry.get("op") == "delete":
+                rows.pop(entry.get("id"), None)
+
+        # 新记录排在最前（最新的在前），其余保持原顺序
+        order = dict.fromkeys(list(reversed(added)) + [row["id"] for row in index["records"]])
+        index["records"] = [rows[record_id] for record_id in order if record_id in rows]
+        index["tasks"] = cls._build_task_map(index["records"])
+
+    def _read_journal(self) -> List[Dict]:
+        try:
+            with open(self.journal_file, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # 追加过程中被中断的残行，对应的修改未生效
+                logger.warning("跳过不完整的历史记录索引日志条目")
+        return entries
+
+    def _append_journal(self, entry: Dict) -> None:
+        # 每条以换行开头：即使上一条写到一半被中断，新条目也会从新的一行开始
+        line = b"\n" + json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        with open(self.journal_file, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        if size >= self.JOURNAL_COMPACT_BYTES:
+            self._save_index(self._load_index())
+
+    @staticmethod
+    def _build_task_map(rows: List[Dict]) -> Dict[str, str]:
+        """索引行按创建时间倒序排列，同一任务取最新的记录"""
+        tasks: Dict[str, str] = {}
+        for row in rows:
+            if row.get("task_id"):
+                tasks.setdefault(row["task_id"], row["id"])
+        return tasks
+
+    def _save_index(self, index: Dict) -> None:
+        """原子写入完整索引并清空日志（index 须已包含日志中的全部修改）"""
+        atomic_write_json(self.index_file, index, indent=2)
+        # 在清空前崩溃也无妨：重放已合并的日志结果不变
+        with open(self.journal_file, "wb") as f:
+            os.fsync(f.fileno())
+
+    def _get_record_path(self, record_id: str) -> str:
+        return os.path.join(self.history_dir, f"{record_id}.json")
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        record_path = self._get_record_path(record_id)
+        if not os.path.exists(record_path):
+            return None
+        try:
+            with open(record_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def exists(self, record_id: str) -> bool:
+        return os.path.exists(self._get_record_path(record_id))
+
+    def save(self, record: Dict) -> None:
+        with self._lock.exclusive():
+            self._save_locked(record)
+
+    def _save_locked(self, record: Dict) -> None:
+        # 先写记录文件再记日志，索引中不会出现指向不存在文件的记录
+        atomic_write_json(self._get_record_path(record["id"]), record, indent=2)
+        self._append_journal({"op": "save", "row": build_index_row(record)})
+
+    def delete(self, record_id: str) -> bool:
+        with self._lock.exclusive():
+            return self._delete_locked(record_id)
+
+    def _delete_locked(self, record_id: str) -> bool:
+        try:
+            os.remove(self._get_record_path(record_id))
+        except Exception:
+            return False
+
+        self._append_journal({"op": "delete", "id": record_id})
+        return True
+
+    def list(self, offset: int, limit: int, status: Optional[str] = None) -> Tuple[List[Dict], int]:
+        records = self._load_index().get("records", [])
+        if status:
+            records = [r for r in records if r.get("status") == status]
+        return records[offset:offset + limit], len(records)
+
+    def search(self, keyword: str, offset: int, limit: int,
+               status: Optional[str] = None) -> Tuple[List[Dict], int]:
+        # 没有全文索引，逐条读取完整记录做子串匹配；同分时保持创建时间倒序
+        scored = []
+        for row in self._load_index().get("records", []):
+            if status and row.get("status") != status:
+                continue
+            record = self.get(row["id"]) or {"title": row.get("title", "")}
+            document = build_search_document(record)
+            score = matches_keyword(document, keyword)
+            if score:
+                scored.append((score, row))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [row for _, row in scored[offset:offset + limit]], len(scored)
+
+    def count_by_status(self) -> Dict[str, int]:
+        status_count: Dict[str, int] = {}
+        for record in self._load_index().get("records", []):
+            status = record.get("status", "draft")
+            status_count[status] = status_count.get(status, 0) + 1
+        return status_count
+
+    def iter_index(self) -> Iterator[Dict]:
+        return iter(self._load_index().get("records", []))
+
+    def find_by_task_id(self, task_id: str) -> Optional[str]:
+        return self._load_index()["tasks"].get(task_id)
+
+    def get_task_index(self) -> Dict[str, str]:
+        return dict(self._load_index()["tasks"])
+
+    def rebuild_task_index(self) -> int:
+        with self._lock.exclusive():
+            index = self._load_index()
+            for row in index["records"]:
+                record = self.get(row["id"])
+                if record is not None:
+                    row["task_id"] = (record.get("images") or {}).get("task_id")
+            index["tasks"] = self._build_task_map(index["records"])
+            self._save_index(index)
+        return len(index["tasks"])
+
+    def change_token(self) -> Any:
+        # 合并时 index.json 被原子替换（inode 变化），日志追加会改变 mtime/大小
+        token = []
+        for path in (self.index_file, self.journal_file):
+            try:
+                stat = os.stat(path)
+                token.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                token.append(None)
+        return tuple(token)
+
+    def write_session(self) -> ContextManager[None]:
+        return self._lock.exclusive()
+
+    def get_scan_checkpoints(self) -> Dict[str, str]:
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def save_scan_checkpoints(self, checkpoints: Dict[str, str]) -> None:
+        with self._lock.exclusive():
+            atomic_write_json(self.checkpoint_file, checkpoints)
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    SQLite 存储（WAL 模式）
+
+    每个线程使用独立连接；WAL 模式下读写互不阻塞，写入按行更新，不再随记录数线性增长。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL DEFAULT '',
+            updated_at TEXT NOT NULL DEFAULT '',
+            status TEXT NOT NULL DEFAULT 'draft',
+            thumbnail TEXT,
+            page_count INTEGER NOT NULL DEFAULT 0,
+            task_id TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_created ON records (created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_records_status_created ON records (status, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_records_task_id ON records (task_id, created_at DESC);
+        CREATE TABLE IF NOT EXISTS scan_checkpoints (
+            task_id TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5 (
+            title, outline, copywriting, tags,
+            tokenize = 'unicode61'
+        );
+    """
+
+    # 分词规则变化时递增，启动时会重建全文索引
+    FTS_VERSION = "1"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', '0')")
+            # 多个 worker 同时启动时只有第一个会重建
+            if self.get_meta("fts_version") != self.FTS_VERSION:
+                self.rebuild_search_index()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        写事务（同一线程内可嵌套，嵌套时并入外层事务）
+
+        使用 BEGIN IMMEDIATE 在事务开始时就取得写锁：多个进程同时写入时在 busy timeout 内排队，
+        避免默认的延迟事务在"先读后写"时升级写锁失败。
+        """
+        conn = self._connect()
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield conn
+            finally:
+                self._local.depth = depth
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._local.depth = 0
+
+    @staticmethod
+    def _bump_revision(conn: sqlite3.Connection) -> None:
+        """记录（索引行）被修改时递增版本号，作为 change_token"""
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision'")
+
+    @staticmethod
+    def _row_to_index(row: sqlite3.Row) -> Dict:
+        return {field: row[field] for field in INDEX_FIELDS}
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        row = self._connect().execute("SELECT data FROM records WHERE id = ?", (record_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def exists(self, record_id: str) -> bool:
+        return self._connect().execute("SELECT 1 FROM records WHERE id = ?", (record_id,)).fetchone() is not None
+
+    def save(self, record: Dict) -> None:
+        self.save_many([record])
+
+    def save_many(self, records: List[Dict]) -> None:
+        """在一个事务中批量写入记录，同步更新全文索引"""
+        columns = INDEX_FIELDS + ("data",)
+        # 用 UPSERT 而不是 INSERT OR REPLACE：更新时保留 rowid，全文索引行与记录按 rowid 对应
+        upsert_sql = (
+            f"INSERT INTO records ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (id) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        )
+
+        with self._transaction() as conn:
+            for record in records:
+                index_row = build_index_row(record)
+                conn.execute(
+                    upsert_sql,
+                    tuple(index_row[field] for field in INDEX_FIELDS) + (json.dumps(record, ensure_ascii=False),)
+                )
+                rowid = conn.execute("SELECT rowid FROM records WHERE id = ?", (record["id"],)).fetchone()[0]
+                self._index_document(conn, rowid, record)
+            self._bump_revision(conn)
+
+    @staticmethod
+    def _index_document(conn: sqlite3.Connection, rowid: int, record: Dict) -> None:
+        """写入（覆盖）一条记录的全文索引"""
+        document = build_search_document(record)
+        conn.execute("DELETE FROM records_fts WHERE rowid = ?", (rowid,))
+        conn.execute(
+            f"INSERT INTO records_fts (rowid, {', '.join(SEARCH_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' * len(SEARCH_COLUMNS))})",
+            (rowid,) + tuple(tokenize(document[column]) for column in SEARCH_COLUMNS)
+        )
+
+    def delete(self, record_id: str) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT rowid FROM records WHERE id = ?", (record_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM records_fts WHERE rowid = ?", (row[0],))
+            conn.execute("DELETE FROM records WHERE rowid = ?", (row[0],))
+            self._bump_revision(conn)
+        return True
+
+    def list(self, offset: int, limit: int, status: Optional[str] = None) -> Tuple[List[Dict], int]:
+        conn = self._connect()
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        total = conn.execute(f"SELECT COUNT(*) FROM records {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join(INDEX_FIELDS)} FROM records {where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            params + (limit, offset)
+        ).fetchall()
+        return [self._row_to_index(row) for row in rows], total
+
+    def search(self, keyword: str, offset: int, limit: int,
+               status: Optional[str] = None) -> Tuple[List[Dict], int]:
+        query = build_match_query(keyword)
+        if query is None:
+            return [], 0
+
+        conn = self._connect()
+        # CROSS JOIN 固定先查全文索引再按 rowid 回表，避免规划器改走状态索引逐行匹配
+        source = "records_fts CROSS JOIN records r ON r.rowid = records_fts.rowid"
+        where = "records_fts MATCH ?"
+        params: Tuple = (query,)
+        if status:
+            where += " AND r.status = ?"
+            params += (status,)
+            total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params).fetchone()[0]
+        else:
+            total = conn.execute("SELECT COUNT(*) FROM records_fts WHERE records_fts MATCH ?", params).fetchone()[0]
+
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        rows = conn.execute(
+            f"SELECT {', '.join('r.' + field for field in INDEX_FIELDS)} FROM {source} WHERE {where} "
+            f"ORDER BY bm25(records_fts, {weights}), r.created_at DESC LIMIT ? OFFSET ?",
+            params + (limit, offset)
+        ).fetchall()
+        return [self._row_to_index(row) for row in rows], total
+
+    def rebuild_search_index(self) -> int:
+        """
+        根据完整记录重建全文索引（首次升级或分词规则变化时执行）
+
+        Returns:
+            int: 索引的记录数
+        """
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT rowid, data FROM records").fetchall()
+            conn.execute("DELETE FROM records_fts")
+            for row in rows:
+                self._index_document(conn, row["rowid"], json.loads(row["data"]))
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_version', ?)", (self.FTS_VERSION,)
+            )
+        logger.info(f"已重建历史记录全文索引: {len(rows)} 条")
+        return len(rows)
+
+    def count_by_status(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM records GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def iter_index(self) -> Iterator[Dict]:
+        rows = self._connect().execute(
+            f"SELECT {', '.join(INDEX_FIELDS)} FROM records ORDER BY created_at DESC, id DESC"
+        ).fetchall()
+        return (self._row_to_index(row) for row in rows)
+
+    def find_by_task_id(self, task_id: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT id FROM records WHERE task_id = ? ORDER BY created_at DESC LIMIT 1",
+            (task_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_task_index(self) -> Dict[str, str]:
+        rows = self._connect().execute(
+            "SELECT task_id, id FROM records WHERE task_id IS NOT NULL ORDER BY created_at DESC"
+        ).fetchall()
+        tasks: Dict[str, str] = {}
+        for task_id, record_id in rows:
+            tasks.setdefault(task_id, record_id)
+        return tasks
+
+    def rebuild_task_index(self) -> int:
+        with self._transaction() as conn:
+            conn.execute("UPDATE records SET task_id = json_extract(data, '$.images.task_id')")
+            conn.execute("REINDEX idx_records_task_id")
+            self._bump_revision(conn)
+        return len(self.get_task_index())
+
+    def change_token(self) -> Any:
+        # 写会话内读取到的是本事务修改后的值，会话外为最新提交的值
+        return self.get_meta("revision")
+
+    def write_session(self) -> ContextManager[None]:
+        return self._transaction()
+
+    def get_scan_checkpoints(self) -> Dict[str, str]:
+        rows = self._connect().execute("SELECT task_id, fingerprint FROM scan_checkpoints").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def save_scan_checkpoints(self, checkpoints: Dict[str, str]) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM scan_checkpoints")
+            conn.executemany(
+                "INSERT INTO scan_checkpoints (task_id, fingerprint) VALUES (?, ?)",
+                checkpoints.items()
+            )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def migrate_json_history(history_dir: str, store: SQLiteHistoryStore) -> int:
+    """
+    把 index.json + <record_id>.json 迁移到 SQLite（只执行一次）
+
+    以索引文件为准逐条读取完整记录，缺失记录文件的索引项跳过；
+    迁移完成后在 meta 表中写入标记，旧文件保留不删除。
+
+    Args:
+        history_dir: 历史记录目录
+        store: 目标 SQLite 存储
+
+    Returns:
+        int: 迁移的记录数
+    """
+    # 整个迁移在一个写事务中完成：多个 worker 同时启动时只有第一个会迁移
+    with store.write_session():
+        if store.get_meta("json_migrated"):
+            return 0
+
+        migrated = 0
+        if os.path.exists(os.path.join(history_dir, "index.json")):
+            source = JsonHistoryStore(history_dir)
+            records = []
+            for row in source.iter_index():
+                record = source.get(row["id"])
+                if record is None:
+                    logger.warning(f"迁移历史记录时跳过缺失的记录文件: {row['id']}")
+                    continue
+                # 旧记录可能缺少时间字段，用索引中的值补齐
+                for field in ("created_at", "updated_at", "status", "title"):
+                    record.setdefault(field, row.get(field))
+                records.append(record)
+
+            store.save_many(records)
+            migrated = len(records)
+            logger.info(f"已将 {migrated} 条历史记录从 index.json 迁移到 SQLite")
+
+        store.set_meta("json_migrated", "1")
+    return migrated
+
+
+def create_history_store(backend: str, history_dir: str) -> HistoryStore:
+    """
+    创建存储后端
+
+    Args:
+        backend: sqlite 或 json
+        history_dir: 历史记录目录
+
+    Returns:
+        HistoryStore: 存储后端实例
+    """
+    if backend == "json":
+        return JsonHistoryStore(history_dir)
+    if backend != "sqlite":
+        raise ValueError(f"不支持的历史记录存储后端: {backend}（可选 sqlite / json）")
+
+    store = SQLiteHistoryStore(os.path.join(history_dir, "history.db"))
+    migrate_json_history(history_dir, store)
+    return store
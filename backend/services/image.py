@@ -1,57 +1,303 @@
 """图片生成服务"""
 import logging
+import multiprocessing
 import os
+import queue
 import uuid
-import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, Any, Generator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Deque, Dict, Any, Generator, Iterable, List, Optional, Tuple
 from backend.config import Config
-from backend.generators.factory import ImageGeneratorFactory
-from backend.utils.image_compressor import compress_image
+from backend.services.provider_pool import PoolMember, ProviderPool
+from backend.utils.atomic_file import atomic_write_bytes
+from backend.utils.config_registry import get_config_registry
+from backend.utils.image_compressor import (
+    compress_image,
+    encode_variants,
+    get_thumbnail_filename,
+    get_thumbnail_formats,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def get_image_version(filepath: str) -> str:
+    """
+    根据文件修改时间和大小生成版本号
+
+    同一文件名重新生成后版本号随之变化，用作图片 URL 的缓存破坏参数和 ETag
+
+    Args:
+        filepath: 图片文件路径
+
+    Returns:
+        版本号（十六进制字符串）
+    """
+    stat = os.stat(filepath)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+class GenerationScheduler:
+    """
+    进程级图片生成调度器
+
+    所有任务的单图生成请求都经由这里派发：
+    - 全局并发上限：同一时刻在途的生成调用总数不超过 max_concurrent
+    - 服务商并发上限：每个服务商可单独限制在途数量（避免触发 429）
+    - 公平调度：按 task_id 轮转派发，大任务不会饿死小任务
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent,
+            thread_name_prefix="image-gen"
+        )
+        self._lock = threading.Lock()
+        # task_id -> 待派发队列，元素为 (provider, fn, args, kwargs, future)
+        self._queues: Dict[str, Deque[Tuple[str, Callable, tuple, dict, Future]]] = {}
+        # 轮转顺序（只包含有待派发请求的 task_id）
+        self._rotation: Deque[str] = deque()
+        self._provider_limits: Dict[str, int] = {}
+        self._in_flight = 0
+        self._in_flight_by_provider: Dict[str, int] = {}
+        self._in_flight_by_task: Dict[str, int] = {}
+
+    def set_provider_limit(self, provider: str, limit: Optional[int]) -> None:
+        """
+        设置服务商并发上限
+
+        Args:
+            provider: 服务商名称
+            limit: 并发上限（None 或 <=0 表示只受全局上限约束）
+        """
+        with self._lock:
+            if limit and limit > 0:
+                self._provider_limits[provider] = int(limit)
+            else:
+                self._provider_limits.pop(provider, None)
+            self._dispatch_locked()
+
+    def submit(self, task_id: str, provider: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        提交一个生成请求
+
+        Args:
+            task_id: 所属任务 ID（用于公平轮转）
+            provider: 服务商名称（用于服务商并发限制）
+            fn: 实际执行的函数
+
+        Returns:
+            Future: 函数执行结果
+        """
+        future: Future = Future()
+        with self._lock:
+            task_queue = self._queues.get(task_id)
+            if task_queue is None:
+                task_queue = deque()
+                self._queues[task_id] = task_queue
+                self._rotation.append(task_id)
+            task_queue.append((provider, fn, args, kwargs, future))
+            self._dispatch_locked()
+        return future
+
+    def _provider_available(self, provider: str) -> bool:
+        limit = self._provider_limits.get(provider)
+        if limit is None:
+            return True
+        return self._in_flight_by_provider.get(provider, 0) < limit
+
+    def _dispatch_locked(self) -> None:
+        """在持锁状态下，按轮转顺序派发尽可能多的请求"""
+        while self._in_flight < self.max_concurrent and self._rotation:
+            job = None
+            for _ in range(len(self._rotation)):
+                task_id = self._rotation[0]
+                self._rotation.rotate(-1)
+                task_queue = self._queues[task_id]
+                if self._provider_available(task_queue[0][0]):
+                    job = (task_id, task_queue.popleft())
+                    if not task_queue:
+                        del self._queues[task_id]
+                        self._rotation.remove(task_id)
+                    break
+
+            if job is None:
+                # 剩余请求所属的服务商都已满载
+                return
+
+            task_id, (provider, fn, args, kwargs, future) = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self._in_flight += 1
+            self._in_flight_by_provider[provider] = self._in_flight_by_provider.get(provider, 0) + 1
+            self._in_flight_by_task[task_id] = self._in_flight_by_task.get(task_id, 0) + 1
+            self._executor.submit(self._run, task_id, provider, fn, args, kwargs, future)
+
+    def _run(self, task_id: str, provider: str, fn: Callable, args: tuple, kwargs: dict, future: Future) -> None:
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._in_flight_by_provider[provider] -= 1
+                if self._in_flight_by_provider[provider] <= 0:
+                    del self._in_flight_by_provider[provider]
+                self._in_flight_by_task[task_id] -= 1
+                if self._in_flight_by_task[task_id] <= 0:
+                    del self._in_flight_by_task[task_id]
+                self._dispatch_locked()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取调度器运行状态（用于容量评估）
+
+        Returns:
+            Dict: 包含排队数、在途数以及按服务商/任务拆分的统计
+        """
+        with self._lock:
+            queued_by_task = {task_id: len(q) for task_id, q in self._queues.items()}
+            queued_by_provider: Dict[str, int] = {}
+            for task_queue in self._queues.values():
+                for provider, *_ in task_queue:
+                    queued_by_provider[provider] = queued_by_provider.get(provider, 0) + 1
+
+            return {
+                "max_concurrent": self.max_concurrent,
+                "queue_depth": sum(queued_by_task.values()),
+                "in_flight": self._in_flight,
+                "provider_limits": dict(self._provider_limits),
+                "queued_by_provider": queued_by_provider,
+                "in_flight_by_provider": dict(self._in_flight_by_provider),
+                "queued_by_task": queued_by_task,
+                "in_flight_by_task": dict(self._in_flight_by_task),
+            }
+
+
+class ImageTask:
+    """
+    单个图片生成任务的上下文
+
+    生成流水线中所有与任务相关的数据（输出目录、封面参考图、大纲、用户参考图等）
+    都通过该对象显式传递，ImageService 自身不保存任何"当前任务"状态，
+    从而可以在同一进程内安全地并行执行多个任务。
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        task_dir: str,
+        pages: Optional[List[Dict]] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ):
+        self.task_id = task_id
+        self.task_dir = task_dir
+        self.pages = pages or []
+        self.full_outline = full_outline
+        self.user_images = user_images
+        self.user_topic = user_topic
+        self.cover_image: Optional[bytes] = None
+        self.generated: Dict[int, str] = {}
+        self.failed: Dict[int, str] = {}
+        # index -> 编码阶段的 Future，结果见 encode_variants
+        self._encodes: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def add_encode(self, index: int, future: Future) -> None:
+        """登记页面的编码任务"""
+        with self._lock:
+            self._encodes[index] = future
+
+    def get_reference(self, index: int) -> Optional[bytes]:
+        """获取页面的参考图版本（等待编码完成）"""
+        with self._lock:
+            future = self._encodes.get(index)
+        if future is None:
+            return None
+        return future.result()["reference"]
+
+    def wait_encoding(self, index: Optional[int] = None) -> None:
+        """等待编码任务完成（index 为 None 时等待全部）"""
+        with self._lock:
+            if index is None:
+                futures = list(self._encodes.values())
+            else:
+                futures = [self._encodes[index]] if index in self._encodes else []
+        wait(futures)
+
+    def mark_generated(self, index: int, filename: str) -> None:
+        """记录页面生成成功"""
+        with self._lock:
+            self.generated[index] = filename
+            self.failed.pop(index, None)
+
+    def mark_failed(self, index: int, error: str) -> None:
+        """记录页面生成失败"""
+        with self._lock:
+            self.failed[index] = error
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取可序列化的任务状态（不包含图片数据）"""
+        with self._lock:
+            return {
+                "generated": dict(self.generated),
+                "failed": dict(self.failed),
+                "has_cover": self.cover_image is not None
+            }
+
+
 class ImageService:
     """图片生成服务类"""
 
     # 并发配置
     MAX_CONCURRENT = 15  # 最大并发数
     AUTO_RETRY_COUNT = 1  # 不自动重试，超时后让用户手动重试
+    ENCODE_WORKERS = 4  # 缩略图/参考图编码进程数上限
 
     def __init__(self, provider_name: str = None):
         """
         初始化图片生成服务
 
         Args:
-            provider_name: 服务商名称，如果为None则使用配置文件中的激活服务商
+            provider_name: 服务商名称，如果为None则使用配置文件中的激活服务商与服务商池（provider_pool）
         """
         logger.debug("初始化 ImageService...")
 
-        # 获取服务商配置
+        # 创建服务商 / API Key 池：每个成员有自己的生成器与限流器（rate_limit: 次/分钟）
+        # 未指定服务商时按配置文件中的 provider_pool 组成池
+        self.provider_pool = ProviderPool(Config.get_image_provider_pool(provider_name))
+        if len(self.provider_pool.members) > 1:
+            logger.info(f"图片服务商池: {[member.name for member in self.provider_pool.members]}")
+
+        # 获取服务商配置：激活服务商的配置决定任务级行为（提示词模板、短 prompt、流水线模式）
         if provider_name is None:
             provider_name = Config.get_active_image_provider()
 
         logger.info(f"使用图片服务商: {provider_name}")
         provider_config = Config.get_image_provider_config(provider_name)
-
-        # 创建生成器实例
         provider_type = provider_config.get('type', provider_name)
-        logger.debug(f"创建生成器: type={provider_type}")
-        self.generator = ImageGeneratorFactory.create(provider_type, provider_config)
 
-        # 保存配置信息
+        # 保存配置信息（配置快照用于判断 image_providers.yaml 是否变化）
         self.provider_name = provider_name
         self.provider_config = provider_config
+        self.providers_snapshot = Config.load_image_providers_config()
+
+        # 按服务商池注册并发上限（各成员 max_concurrent 之和，未配置时只受全局上限约束）
+        self.scheduler = get_generation_scheduler()
+        self.scheduler.set_provider_limit(self.provider_pool.name, self.provider_pool.concurrency_limit)
 
         # 检查是否启用短 prompt 模式
         self.use_short_prompt = provider_config.get('short_prompt', False)
 
-        # 加载提示词模板
-        self.prompt_template = self._load_prompt_template()
-        self.prompt_template_short = self._load_prompt_template(short=True)
-
         # 历史记录根目录
         self.history_root_dir = os.path.join(
             os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
@@ -59,16 +305,14 @@ class ImageService:
         )
         os.makedirs(self.history_root_dir, exist_ok=True)
 
-        # 当前任务的输出目录（每个任务一个子文件夹）
-        self.current_task_dir = None
-
-        # 存储任务状态（用于重试）
-        self._task_states: Dict[str, Dict] = {}
+        # 存储任务上下文（用于重试），多个请求线程会并发访问
+        self._task_states: Dict[str, ImageTask] = {}
+        self._task_states_lock = threading.Lock()
 
         logger.info(f"ImageService 初始化完成: provider={provider_name}, type={provider_type}")
 
     def _load_prompt_template(self, short: bool = False) -> str:
-        """加载 Prompt 模板"""
+        """加载 Prompt 模板（注册表缓存，文件修改后自动重新读取）"""
         filename = "image_prompt_short.txt" if short else "image_prompt.txt"
         prompt_path = os.path.join(
             os.path.dirname(os.path.dirname(__file__)),
@@ -78,62 +322,148 @@ class ImageService:
         if not os.path.exists(prompt_path):
             # 如果短模板不存在，返回空字符串
             return ""
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return get_config_registry().read_text(prompt_path)
+
+    @property
+    def prompt_template(self) -> str:
+        return self._load_prompt_template()
+
+    @property
+    def prompt_template_short(self) -> str:
+        return self._load_prompt_template(short=True)
 
-    def _save_image(self, image_data: bytes, filename: str, task_dir: str = None) -> str:
+    def _get_task_dir(self, task_id: str) -> str:
+        """获取（并创建）任务专属目录"""
+        task_dir = os.path.join(self.history_root_dir, task_id)
+        os.makedirs(task_dir, exist_ok=True)
+        return task_dir
+
+    def _save_image(self, image_data: bytes, filename: str, task: ImageTask, index: int) -> str:
         """
-        保存图片到本地，同时生成缩略图
+        保存图片到本地，缩略图和参考图交给编码进程池异步生成
+
+        生成线程只负责写入原图，CPU 密集的解码/压缩在进程池中完成，
+        结果缓存在任务上下文中，缩略图在编码完成后落盘。
 
         Args:
             image_data: 图片二进制数据
             filename: 文件名
-            task_dir: 任务目录（如果为None则使用当前任务目录）
+            task: 任务上下文
+            index: 页面索引
 
         Returns:
             保存的文件路径
         """
-        if task_dir is None:
-            task_dir = self.current_task_dir
-
-        if task_dir is None:
+        if not task.task_dir:
             raise ValueError("任务目录未设置")
 
         # 保存原图
-        filepath = os.path.join(task_dir, filename)
-        with open(filepath, "wb") as f:
-            f.write(image_data)
-
-        # 生成缩略图（50KB左右）
-        thumbnail_data = compress_image(image_data, max_size_kb=50)
-        thumbnail_filename = f"thumb_{filename}"
-        thumbnail_path = os.path.join(task_dir, thumbnail_filename)
-        with open(thumbnail_path, "wb") as f:
-            f.write(thumbnail_data)
+        filepath = os.path.join(task.task_dir, filename)
+        atomic_write_bytes(filepath, image_data)
+
+        # 生成缩略图（50KB左右）、参考图（200KB以内）以及多尺寸 WebP/AVIF 缩略图
+        future = submit_encode(
+            encode_variants,
+            image_data,
+            thumbnail_formats=get_thumbnail_formats(Config.THUMBNAIL_AVIF)
+        )
+        future.add_done_callback(lambda f: self._write_thumbnails(f, task.task_dir, filename))
+        task.add_encode(index, future)
 
         return filepath
 
+    def _encoded_reference(self, task: ImageTask, index: int, filename: str) -> Optional[bytes]:
+        """
+        获取页面编码阶段产出的参考图
+
+        编码失败时改为读取原图重新压缩，仍失败则返回 None（后续页面不带参考图继续生成），
+        不让编码错误中断整个生成流程。
+        """
+        try:
+            return task.get_reference(index)
+        except Exception as e:
+            logger.warning(f"参考图编码失败，改为直接压缩原图: {task.task_id}/{filename}, {e}")
+        try:
+            with open(os.path.join(task.task_dir, filename), "rb") as f:
+                return compress_image(f.read(), max_size_kb=200)
+        except Exception as e:
+            logger.error(f"参考图压缩失败，后续页面不使用封面参考图: {task.task_id}/{filename}, {e}")
+            return None
+
+    def _image_url(self, task_id: str, filename: str) -> str:
+        """构建带版本号的图片 URL，重新生成后 URL 改变，其余页面继续命中浏览器缓存"""
+        version = get_image_version(os.path.join(self._get_task_dir(task_id), filename))
+        return f"/api/images/{task_id}/{filename}?v={version}"
+
+    def _write_thumbnails(self, future: Future, task_dir: str, filename: str) -> None:
+        """编码完成回调：缩略图落盘"""
+        try:
+            variants = future.result()
+            atomic_write_bytes(os.path.join(task_dir, f"thumb_{filename}"), variants["thumbnail"])
+            for (width, fmt), data in variants["sized"].items():
+                atomic_write_bytes(os.path.join(task_dir, get_thumbnail_filename(filename, width, fmt)), data)
+        except Exception as e:
+            logger.error(f"缩略图生成失败: {task_dir}/{filename}, {e}")
+
+    def _call_generator(
+        self,
+        prompt: str,
+        task: ImageTask,
+        reference_image: Optional[bytes],
+        member: PoolMember
+    ) -> bytes:
+        """按池成员的服务商类型调用其生成器"""
+        provider_config = member.config
+        if provider_config.get('type') == 'google_genai':
+            logger.debug(f"  使用 Google GenAI 生成器")
+            return member.generator.generate_image(
+                prompt=prompt,
+                aspect_ratio=provider_config.get('default_aspect_ratio', '3:4'),
+                temperature=provider_config.get('temperature', 1.0),
+                model=provider_config.get('model', 'gemini-3-pro-image-preview'),
+                reference_image=reference_image,
+            )
+        elif provider_config.get('type') == 'image_api':
+            logger.debug(f"  使用 Image API 生成器")
+            # Image API 支持多张参考图片
+            # 组合参考图片：用户上传的图片 + 封面图
+            reference_images = []
+            if task.user_images:
+                reference_images.extend(task.user_images)
+            if reference_image:
+                reference_images.append(reference_image)
+
+            return member.generator.generate_image(
+                prompt=prompt,
+                aspect_ratio=provider_config.get('default_aspect_ratio', '3:4'),
+                temperature=provider_config.get('temperature', 1.0),
+                model=provider_config.get('model', 'nano-banana-2'),
+                reference_images=reference_images if reference_images else None,
+            )
+        else:
+            logger.debug(f"  使用 OpenAI 兼容生成器")
+            return member.generator.generate_image(
+                prompt=prompt,
+                size=provider_config.get('default_size', '1024x1024'),
+                model=provider_config.get('model'),
+                quality=provider_config.get('quality', 'standard'),
+            )
+
     def _generate_single_image(
         self,
         page: Dict,
-        task_id: str,
+        task: ImageTask,
         reference_image: Optional[bytes] = None,
-        retry_count: int = 0,
-        full_outline: str = "",
-        user_images: Optional[List[bytes]] = None,
-        user_topic: str = ""
+        retry_count: int = 0
     ) -> Tuple[int, bool, Optional[str], Optional[str]]:
         """
         生成单张图片（带自动重试）
 
         Args:
             page: 页面数据
-            task_id: 任务ID
+            task: 任务上下文（输出目录、大纲、用户参考图等）
             reference_image: 参考图片（封面图）
             retry_count: 当前重试次数
-            full_outline: 完整的大纲文本
-            user_images: 用户上传的参考图片列表
-            user_topic: 用户原始输入
 
         Returns:
             (index, success, filename, error_message)
@@ -143,7 +473,7 @@ class ImageService:
         page_content = page["content"]
 
         try:
-            logger.debug(f"生成图片 [{index}]: type={page_type}")
+            logger.debug(f"生成图片 [{task.task_id}/{index}]: type={page_type}")
 
             # 根据配置选择模板（短 prompt 或完整 prompt）
             if self.use_short_prompt and self.prompt_template_short:
@@ -158,76 +488,199 @@ class ImageService:
                 prompt = self.prompt_template.format(
                     page_content=page_content,
                     page_type=page_type,
-                    full_outline=full_outline,
-                    user_topic=user_topic if user_topic else "未提供"
+                    full_outline=task.full_outline,
+                    user_topic=task.user_topic if task.user_topic else "未提供"
                 )
 
-            # 调用生成器生成图片
-            if self.provider_config.get('type') == 'google_genai':
-                logger.debug(f"  使用 Google GenAI 生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'gemini-3-pro-image-preview'),
-                    reference_image=reference_image,
-                )
-            elif self.provider_config.get('type') == 'image_api':
-                logger.debug(f"  使用 Image API 生成器")
-                # Image API 支持多张参考图片
-                # 组合参考图片：用户上传的图片 + 封面图
-                reference_images = []
-                if user_images:
-                    reference_images.extend(user_images)
-                if reference_image:
-                    reference_images.append(reference_image)
-
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'nano-banana-2'),
-                    reference_images=reference_images if reference_images else None,
-                )
-            else:
-                logger.debug(f"  使用 OpenAI 兼容生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    size=self.provider_config.get('default_size', '1024x1024'),
-                    model=self.provider_config.get('model'),
-                    quality=self.provider_config.get('quality', 'standard'),
-                )
+            # 由服务商池选择成员生成（经由成员的限流器排队，成员不健康时转移到其他成员）
+            image_data = self.provider_pool.call(
+                lambda member: self._call_generator(prompt, task, reference_image, member)
+            )
 
-            # 保存图片（使用当前任务目录）
+            # 保存图片（使用任务自己的目录）
             filename = f"{index}.png"
-            self._save_image(image_data, filename, self.current_task_dir)
-            logger.info(f"✅ 图片 [{index}] 生成成功: {filename}")
+            self._save_image(image_data, filename, task, index)
+            logger.info(f"✅ 图片 [{task.task_id}/{index}] 生成成功: {filename}")
 
             return (index, True, filename, None)
 
         except Exception as e:
             error_msg = str(e)
-            logger.error(f"❌ 图片 [{index}] 生成失败: {error_msg[:200]}")
+            logger.error(f"❌ 图片 [{task.task_id}/{index}] 生成失败: {error_msg[:200]}")
             return (index, False, None, error_msg)
 
+    def _submit_page(
+        self,
+        page: Dict,
+        task: ImageTask,
+        reference_image: Optional[bytes] = None
+    ) -> Future:
+        """将单页生成请求提交给全局调度器"""
+        return self.scheduler.submit(
+            task.task_id,
+            self.provider_pool.name,
+            self._generate_single_image,
+            page,
+            task,
+            reference_image
+        )
+
+    def _use_pipeline(self, pipeline: Optional[bool]) -> bool:
+        """是否启用封面流水线模式（请求参数优先，其次服务商配置）"""
+        if pipeline is None:
+            return bool(self.provider_config.get('pipeline_cover', False))
+        return bool(pipeline)
+
+    def _needs_cover_reference(self) -> bool:
+        """
+        内容页是否依赖封面参考图
+
+        - OpenAI 兼容生成器不接收参考图；池中任一成员接收参考图就需要等待封面
+        - 短 prompt 模式下内容页只按页面内容独立生成
+        """
+        if self.use_short_prompt and self.prompt_template_short:
+            return False
+        return any(
+            member.config.get('type') in ('google_genai', 'image_api')
+            for member in self.provider_pool.members
+        )
+
+    def _dispatch_content_pages(
+        self,
+        pages: List[Dict],
+        task: ImageTask,
+        reference_image: Optional[bytes],
+        pending: Dict[Future, Tuple[Dict, str]],
+        total: int,
+        completed: int
+    ) -> Generator[Dict[str, Any], None, None]:
+        """派发内容页并产出对应的进度事件"""
+        yield {
+            "event": "progress",
+            "data": {
+                "status": "batch_start",
+                "message": f"开始并发生成 {len(pages)} 页内容...",
+                "current": completed,
+                "total": total,
+                "phase": "content"
+            }
+        }
+
+        # 交给全局调度器派发，并发受全局/服务商上限约束
+        for page in pages:
+            pending[self._submit_page(page, task, reference_image)] = (page, "content")
+
+        # 发送每个页面的进度
+        for page in pages:
+            yield {
+                "event": "progress",
+                "data": {
+                    "index": page["index"],
+                    "status": "generating",
+                    "current": completed + 1,
+                    "total": total,
+                    "phase": "content"
+                }
+            }
+
+    def _collect_page_result(
+        self,
+        future: Future,
+        page: Dict,
+        task: ImageTask,
+        phase: str
+    ) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        收集单页生成结果，更新任务状态
+
+        Returns:
+            (filename, event)，失败时 filename 为 None
+        """
+        try:
+            index, success, filename, error = future.result()
+        except Exception as e:
+            index, success, filename, error = page["index"], False, None, str(e)
+
+        if success:
+            task.mark_generated(index, filename)
+            return filename, {
+                "event": "complete",
+                "data": {
+                    "index": index,
+                    "status": "done",
+                    "image_url": self._image_url(task.task_id, filename),
+                    "phase": phase
+                }
+            }
+
+        task.mark_failed(index, error)
+        return None, {
+            "event": "error",
+            "data": {
+                "index": index,
+                "status": "error",
+                "message": error,
+                "retryable": True,
+                "phase": phase
+            }
+        }
+
+    def _create_task(
+        self,
+        task_id: str,
+        pages: List[Dict],
+        full_outline: str,
+        user_images: Optional[List[bytes]],
+        user_topic: str
+    ) -> ImageTask:
+        """创建任务目录和任务上下文，并登记到任务状态（用于重试）"""
+        # 创建任务专属目录
+        task_dir = self._get_task_dir(task_id)
+        logger.debug(f"任务目录: {task_dir}")
+
+        # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
+        compressed_user_images = None
+        if user_images:
+            compressed_user_images = [
+                future.result() for future in [submit_encode(compress_image, img, 200) for img in user_images]
+            ]
+
+        # 初始化任务上下文
+        task = ImageTask(
+            task_id,
+            task_dir,
+            pages=pages,
+            full_outline=full_outline,
+            user_images=compressed_user_images,
+            user_topic=user_topic
+        )
+        with self._task_states_lock:
+            self._task_states[task_id] = task
+        return task
+
     def generate_images(
         self,
         pages: list,
         task_id: str = None,
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
-        user_topic: str = ""
+        user_topic: str = "",
+        pipeline: Optional[bool] = None
     ) -> Generator[Dict[str, Any], None, None]:
         """
         生成图片（生成器，支持 SSE 流式返回）
         优化版本：先生成封面，然后并发生成其他页面
 
+        流水线模式下，不需要封面参考图的页面会与封面同时开始生成，
+        需要参考图的页面在封面生成完成后立即派发。
+
         Args:
             pages: 页面列表
             task_id: 任务 ID（可选）
             full_outline: 完整的大纲文本（用于保持风格一致）
             user_images: 用户上传的参考图片列表（可选）
             user_topic: 用户原始输入（用于保持意图一致）
+            pipeline: 是否启用流水线模式（None 表示使用服务商配置 pipeline_cover）
 
         Yields:
             进度事件字典
@@ -237,31 +690,11 @@ class ImageService:
 
         logger.info(f"开始图片生成任务: task_id={task_id}, pages={len(pages)}")
 
-        # 创建任务专属目录
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
-        logger.debug(f"任务目录: {self.current_task_dir}")
-
         total = len(pages)
         generated_images = []
         failed_pages = []
-        cover_image_data = None
 
-        # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
-        compressed_user_images = None
-        if user_images:
-            compressed_user_images = [compress_image(img, max_size_kb=200) for img in user_images]
-
-        # 初始化任务状态
-        self._task_states[task_id] = {
-            "pages": pages,
-            "generated": {},
-            "failed": {},
-            "cover_image": None,
-            "full_outline": full_outline,
-            "user_images": compressed_user_images,
-            "user_topic": user_topic
-        }
+        task = self._create_task(task_id, pages, full_outline, user_images, user_topic)
 
         # ==================== 第一阶段：生成封面 ====================
         cover_page = None
@@ -278,6 +711,15 @@ class ImageService:
             cover_page = pages[0]
             other_pages = pages[1:]
 
+        # 流水线模式下，不依赖封面参考图的页面与封面同时派发
+        if self._use_pipeline(pipeline) and not self._needs_cover_reference():
+            early_pages, late_pages = other_pages, []
+        else:
+            early_pages, late_pages = [], other_pages
+
+        # future -> (page, phase)
+        pending: Dict[Future, Tuple[Dict, str]] = {}
+
         if cover_page:
             # 发送封面生成进度
             yield {
@@ -293,143 +735,42 @@ class ImageService:
             }
 
             # 生成封面（使用用户上传的图片作为参考）
-            index, success, filename, error = self._generate_single_image(
-                cover_page, task_id, reference_image=None, full_outline=full_outline,
-                user_images=compressed_user_images, user_topic=user_topic
-            )
-
-            if success:
-                generated_images.append(filename)
-                self._task_states[task_id]["generated"][index] = filename
-
-                # 读取封面图片作为参考，并立即压缩到200KB以内
-                cover_path = os.path.join(self.current_task_dir, filename)
-                with open(cover_path, "rb") as f:
-                    cover_image_data = f.read()
-
-                # 压缩封面图（减少内存占用和后续传输开销）
-                cover_image_data = compress_image(cover_image_data, max_size_kb=200)
-                self._task_states[task_id]["cover_image"] = cover_image_data
-
-                yield {
-                    "event": "complete",
-                    "data": {
-                        "index": index,
-                        "status": "done",
-                        "image_url": f"/api/images/{task_id}/{filename}",
-                        "phase": "cover"
-                    }
-                }
-            else:
-                failed_pages.append(cover_page)
-                self._task_states[task_id]["failed"][index] = error
-
-                yield {
-                    "event": "error",
-                    "data": {
-                        "index": index,
-                        "status": "error",
-                        "message": error,
-                        "retryable": True,
-                        "phase": "cover"
-                    }
-                }
-
-        # ==================== 第二阶段：生成其他页面（始终并发） ====================
-        if other_pages:
-            content_workers = max(1, len(other_pages))
-            yield {
-                "event": "progress",
-                "data": {
-                    "status": "batch_start",
-                    "message": f"开始并发生成 {len(other_pages)} 页内容（线程数={content_workers}）...",
-                    "current": len(generated_images),
-                    "total": total,
-                    "phase": "content"
-                }
-            }
-
-            # 按页面数开线程池：有多少页就多少线程
-            with ThreadPoolExecutor(max_workers=content_workers) as executor:
-                # 提交所有任务
-                future_to_page = {
-                    executor.submit(
-                        self._generate_single_image,
-                        page,
-                        task_id,
-                        cover_image_data,  # 使用封面作为参考
-                        0,  # retry_count
-                        full_outline,  # 传入完整大纲
-                        compressed_user_images,  # 用户上传的参考图片（已压缩）
-                        user_topic  # 用户原始输入
-                    ): page
-                    for page in other_pages
-                }
-
-                # 发送每个页面的进度
-                for page in other_pages:
-                    yield {
-                        "event": "progress",
-                        "data": {
-                            "index": page["index"],
-                            "status": "generating",
-                            "current": len(generated_images) + 1,
-                            "total": total,
-                            "phase": "content"
-                        }
-                    }
-
-                # 收集结果
-                for future in as_completed(future_to_page):
-                    page = future_to_page[future]
-                    try:
-                        index, success, filename, error = future.result()
-
-                        if success:
-                            generated_images.append(filename)
-                            self._task_states[task_id]["generated"][index] = filename
-
-                            yield {
-                                "event": "complete",
-                                "data": {
-                                    "index": index,
-                                    "status": "done",
-                                    "image_url": f"/api/images/{task_id}/{filename}",
-                                    "phase": "content"
-                                }
-                            }
-                        else:
-                            failed_pages.append(page)
-                            self._task_states[task_id]["failed"][index] = error
-
-                            yield {
-                                "event": "error",
-                                "data": {
-                                    "index": index,
-                                    "status": "error",
-                                    "message": error,
-                                    "retryable": True,
-                                    "phase": "content"
-                                }
-                            }
-
-                    except Exception as e:
-                        failed_pages.append(page)
-                        error_msg = str(e)
-                        self._task_states[task_id]["failed"][page["index"]] = error_msg
-
-                        yield {
-                            "event": "error",
-                            "data": {
-                                "index": page["index"],
-                                "status": "error",
-                                "message": error_msg,
-                                "retryable": True,
-                                "phase": "content"
-                            }
-                        }
+            pending[self._submit_page(cover_page, task)] = (cover_page, "cover")
+
+        # ==================== 第二阶段：生成其他页面（始终并发，流水线模式下与封面并行） ====================
+        if early_pages:
+            for event in self._dispatch_content_pages(early_pages, task, None, pending, total, len(generated_images)):
+                yield event
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page, phase = pending.pop(future)
+                filename, event = self._collect_page_result(future, page, task, phase)
+
+                if filename:
+                    generated_images.append(filename)
+                else:
+                    failed_pages.append(page)
+
+                if phase == "cover" and filename:
+                    # 使用编码阶段产出的参考图版本（200KB以内），无需重新读盘压缩
+                    task.cover_image = self._encoded_reference(task, page["index"], filename)
+
+                yield event
+
+                # 封面落地后立即派发依赖封面参考图的页面
+                if phase == "cover" and late_pages:
+                    for progress in self._dispatch_content_pages(
+                        late_pages, task, task.cover_image, pending, total, len(generated_images)
+                    ):
+                        yield progress
+                    late_pages = []
 
         # ==================== 完成 ====================
+        # 确保缩略图全部落盘后再结束
+        task.wait_encoding()
+
         yield {
             "event": "finish",
             "data": {
@@ -443,6 +784,205 @@ class ImageService:
             }
         }
 
+    def generate_images_streaming(
+        self,
+        outline_events: Iterable[Dict[str, Any]],
+        task_id: str = None,
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        边生成大纲边生成图片（主题到图片的端到端流水线）
+
+        消费 OutlineService.generate_outline_stream 的事件：每写完一页立即交给调度器生成，
+        封面在大模型还在撰写后续页面时就开始渲染。第一页作为封面；
+        需要封面参考图的页面在封面完成后派发，其余页面收到即派发。
+        大纲尚未写完时，页面提示词中的完整大纲为已生成的部分（生成开始时读取最新文本）。
+
+        Args:
+            outline_events: 大纲流式事件（token/page/done/error）
+            task_id: 任务 ID（可选）
+            user_images: 用户上传的参考图片列表（可选）
+            user_topic: 用户原始输入（用于保持意图一致）
+
+        Yields:
+            进度事件字典：大纲事件加 outline_ 前缀转发（outline_token/outline_page/outline_done/outline_error），
+            图片事件与 generate_images 相同（progress/complete/error/finish）
+        """
+        if task_id is None:
+            task_id = f"task_{uuid.uuid4().hex[:8]}"
+
+        logger.info(f"开始流水线任务（大纲 + 图片）: task_id={task_id}")
+        task = self._create_task(task_id, [], "", user_images, user_topic)
+
+        # 大纲事件与图片完成通知汇入同一个队列，按到达顺序处理
+        events: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+
+        # 客户端断开（生成器被关闭）后通知读线程停止，不再继续消耗大模型的 token
+        stop_reading = threading.Event()
+
+        def read_outline() -> None:
+            try:
+                for event in outline_events:
+                    if stop_reading.is_set():
+                        break
+                    events.put(("outline", event))
+            except Exception as e:
+                events.put(("outline", {"event": "error", "data": {"success": False, "error": str(e)}}))
+            finally:
+                # 关闭大纲生成器，连带关闭上游的流式响应
+                close = getattr(outline_events, "close", None)
+                if close is not None:
+                    try:
+                        close()
+                    except Exception as e:
+                        logger.warning(f"关闭大纲流失败: task_id={task_id}, {e}")
+                events.put(("outline_end", None))
+
+        threading.Thread(target=read_outline, name=f"outline-{task_id}", daemon=True).start()
+
+        try:
+            outline_text = ""
+            pages: List[Dict] = []
+            cover_page: Optional[Dict] = None
+            cover_finished = False
+            waiting_pages: List[Dict] = []  # 等待封面参考图的页面
+            pending: Dict[Future, Tuple[Dict, str]] = {}
+            outline_open = True
+            generated_images = []
+            failed_pages = []
+
+            def submit(page: Dict, phase: str, reference_image: Optional[bytes] = None) -> Dict[str, Any]:
+                future = self._submit_page(page, task, reference_image)
+                pending[future] = (page, phase)
+                future.add_done_callback(lambda f: events.put(("image", f)))
+                data = {
+                    "index": page["index"],
+                    "status": "generating",
+                    "current": len(generated_images) + 1,
+                    "total": len(pages),
+                    "phase": phase
+                }
+                if phase == "cover":
+                    data["message"] = "正在生成封面..."
+                return {"event": "progress", "data": data}
+
+            while outline_open or pending:
+                kind, item = events.get()
+
+                if kind == "outline_end":
+                    outline_open = False
+                    continue
+
+                if kind == "outline":
+                    yield {"event": f"outline_{item['event']}", "data": item["data"]}
+
+                    if item["event"] == "token":
+                        outline_text += item["data"]["text"]
+                        task.full_outline = outline_text
+                    elif item["event"] == "page":
+                        page = item["data"]
+                        pages.append(page)
+                        task.pages = list(pages)
+                        if cover_page is None:
+                            cover_page = page
+                            yield submit(page, "cover")
+                        elif cover_finished or not self._needs_cover_reference():
+                            yield submit(page, "content", task.cover_image)
+                        else:
+                            waiting_pages.append(page)
+                    elif item["event"] == "done":
+                        task.full_outline = item["data"].get("outline", outline_text)
+                    continue
+
+                # 图片生成完成
+                future = item
+                page, phase = pending.pop(future)
+                filename, event = self._collect_page_result(future, page, task, phase)
+
+                if filename:
+                    generated_images.append(filename)
+                else:
+                    failed_pages.append(page)
+
+                if phase == "cover":
+                    cover_finished = True
+                    if filename:
+                        # 使用编码阶段产出的参考图版本（200KB以内），无需重新读盘压缩
+                        task.cover_image = self._encoded_reference(task, page["index"], filename)
+
+                yield event
+
+                # 封面落地后立即派发等待参考图的页面
+                if phase == "cover":
+                    for waiting in waiting_pages:
+                        yield submit(waiting, "content", task.cover_image)
+                    waiting_pages = []
+
+            # ==================== 完成 ====================
+            # 确保缩略图全部落盘后再结束
+            task.wait_encoding()
+
+            yield {
+                "event": "finish",
+                "data": {
+                    "success": len(pages) > 0 and len(failed_pages) == 0,
+                    "task_id": task_id,
+                    "images": generated_images,
+                    "total": len(pages),
+                    "completed": len(generated_images),
+                    "failed": len(failed_pages),
+                    "failed_indices": [p["index"] for p in failed_pages]
+                }
+            }
+        finally:
+            if outline_open:
+                logger.info(f"流水线任务提前结束，停止读取大纲流: task_id={task_id}")
+            stop_reading.set()
+
+    def _get_or_restore_task(
+        self,
+        task_id: str,
+        full_outline: str = "",
+        user_topic: str = ""
+    ) -> ImageTask:
+        """
+        获取任务上下文；服务重启等导致内存中没有时，基于传入参数重建一个
+
+        Args:
+            task_id: 任务ID
+            full_outline: 完整大纲文本（从前端传入）
+            user_topic: 用户原始输入（从前端传入）
+
+        Returns:
+            任务上下文
+        """
+        with self._task_states_lock:
+            task = self._task_states.get(task_id)
+            if task is None:
+                task = ImageTask(task_id, self._get_task_dir(task_id))
+                self._task_states[task_id] = task
+
+        # 传入的上下文优先（用户可能修改了大纲）
+        if full_outline:
+            task.full_outline = full_outline
+        if user_topic:
+            task.user_topic = user_topic
+        return task
+
+    def _load_cover_reference(self, task: ImageTask) -> Optional[bytes]:
+        """获取封面参考图：优先使用内存中的，否则从文件系统加载"""
+        if task.cover_image is not None:
+            return task.cover_image
+
+        cover_path = os.path.join(task.task_dir, "0.png")
+        if os.path.exists(cover_path):
+            with open(cover_path, "rb") as f:
+                cover_data = f.read()
+            # 压缩封面图到 200KB（在编码进程池中执行）
+            task.cover_image = submit_encode(compress_image, cover_data, 200).result()
+        return task.cover_image
+
     def retry_single_image(
         self,
         task_id: str,
@@ -464,55 +1004,22 @@ class ImageService:
         Returns:
             生成结果
         """
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
-
-        reference_image = None
-        user_images = None
-
-        # 首先尝试从任务状态中获取上下文
-        if task_id in self._task_states:
-            task_state = self._task_states[task_id]
-            if use_reference:
-                reference_image = task_state.get("cover_image")
-            # 如果没有传入上下文，则使用任务状态中的
-            if not full_outline:
-                full_outline = task_state.get("full_outline", "")
-            if not user_topic:
-                user_topic = task_state.get("user_topic", "")
-            user_images = task_state.get("user_images")
-
-        # 如果任务状态中没有封面图，尝试从文件系统加载
-        if use_reference and reference_image is None:
-            cover_path = os.path.join(self.current_task_dir, "0.png")
-            if os.path.exists(cover_path):
-                with open(cover_path, "rb") as f:
-                    cover_data = f.read()
-                # 压缩封面图到 200KB
-                reference_image = compress_image(cover_data, max_size_kb=200)
-
-        index, success, filename, error = self._generate_single_image(
-            page,
-            task_id,
-            reference_image,
-            0,
-            full_outline,
-            user_images,
-            user_topic
-        )
+        task = self._get_or_restore_task(task_id, full_outline, user_topic)
+        reference_image = self._load_cover_reference(task) if use_reference else None
+
+        index, success, filename, error = self._submit_page(page, task, reference_image).result()
 
         if success:
-            if task_id in self._task_states:
-                self._task_states[task_id]["generated"][index] = filename
-                if index in self._task_states[task_id]["failed"]:
-                    del self._task_states[task_id]["failed"][index]
+            task.mark_generated(index, filename)
+            task.wait_encoding(index)
 
             return {
                 "success": True,
                 "index": index,
-                "image_url": f"/api/images/{task_id}/{filename}"
+                "image_url": self._image_url(task_id, filename)
             }
         else:
+            task.mark_failed(index, error)
             return {
                 "success": False,
                 "index": index,
@@ -535,10 +1042,10 @@ class ImageService:
         Yields:
             进度事件
         """
+        task = self._get_or_restore_task(task_id)
+
         # 获取参考图
-        reference_image = None
-        if task_id in self._task_states:
-            reference_image = self._task_states[task_id].get("cover_image")
+        reference_image = self._load_cover_reference(task)
 
         total = len(pages)
         success_count = 0
@@ -552,71 +1059,56 @@ class ImageService:
             }
         }
 
-        # 并发重试
-        # 从任务状态中获取完整大纲
-        full_outline = ""
-        if task_id in self._task_states:
-            full_outline = self._task_states[task_id].get("full_outline", "")
-
-        retry_workers = max(1, len(pages))
-        logger.info(f"批量重试并发线程数: {retry_workers}")
-        with ThreadPoolExecutor(max_workers=retry_workers) as executor:
-            future_to_page = {
-                executor.submit(
-                    self._generate_single_image,
-                    page,
-                    task_id,
-                    reference_image,
-                    0,  # retry_count
-                    full_outline  # 传入完整大纲
-                ): page
-                for page in pages
-            }
+        # 并发重试：交给全局调度器派发
+        future_to_page = {
+            self._submit_page(page, task, reference_image): page
+            for page in pages
+        }
 
-            for future in as_completed(future_to_page):
-                page = future_to_page[future]
-                try:
-                    index, success, filename, error = future.result()
-
-                    if success:
-                        success_count += 1
-                        if task_id in self._task_states:
-                            self._task_states[task_id]["generated"][index] = filename
-                            if index in self._task_states[task_id]["failed"]:
-                                del self._task_states[task_id]["failed"][index]
-
-                        yield {
-                            "event": "complete",
-                            "data": {
-                                "index": index,
-                                "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}"
-                            }
-                        }
-                    else:
-                        failed_count += 1
-                        yield {
-                            "event": "error",
-                            "data": {
-                                "index": index,
-                                "status": "error",
-                                "message": error,
-                                "retryable": True
-                            }
-                        }
+        for future in as_completed(future_to_page):
+            page = future_to_page[future]
+            try:
+                index, success, filename, error = future.result()
+
+                if success:
+                    success_count += 1
+                    task.mark_generated(index, filename)
 
-                except Exception as e:
+                    yield {
+                        "event": "complete",
+                        "data": {
+                            "index": index,
+                            "status": "done",
+                            "image_url": self._image_url(task_id, filename)
+                        }
+                    }
+                else:
                     failed_count += 1
+                    task.mark_failed(index, error)
                     yield {
                         "event": "error",
                         "data": {
-                            "index": page["index"],
+                            "index": index,
                             "status": "error",
-                            "message": str(e),
+                            "message": error,
                             "retryable": True
                         }
                     }
 
+            except Exception as e:
+                failed_count += 1
+                yield {
+                    "event": "error",
+                    "data": {
+                        "index": page["index"],
+                        "status": "error",
+                        "message": str(e),
+                        "retryable": True
+                    }
+                }
+
+        task.wait_encoding()
+
         yield {
             "event": "retry_finish",
             "data": {
@@ -668,25 +1160,127 @@ class ImageService:
         task_dir = os.path.join(self.history_root_dir, task_id)
         return os.path.join(task_dir, filename)
 
-    def get_task_state(self, task_id: str) -> Optional[Dict]:
-        """获取任务状态"""
-        return self._task_states.get(task_id)
+    def get_task_state(self, task_id: str) -> Optional[ImageTask]:
+        """获取任务上下文"""
+        with self._task_states_lock:
+            return self._task_states.get(task_id)
 
     def cleanup_task(self, task_id: str):
         """清理任务状态（释放内存）"""
-        if task_id in self._task_states:
-            del self._task_states[task_id]
+        with self._task_states_lock:
+            self._task_states.pop(task_id, None)
+
+
+# 全局调度器实例（跨 ImageService 实例共享，配置重载后仍然保留）
+_scheduler_instance = None
+_scheduler_lock = threading.Lock()
+
+def get_generation_scheduler() -> GenerationScheduler:
+    """获取进程级图片生成调度器"""
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        with _scheduler_lock:
+            if _scheduler_instance is None:
+                _scheduler_instance = GenerationScheduler(ImageService.MAX_CONCURRENT)
+    return _scheduler_instance
+
+
+# 全局编码进程池（缩略图/参考图生成，避免受 GIL 限制）
+_encode_executor = None
+
+
+def _encode_mp_context():
+    """
+    编码进程的启动方式
+
+    Flask 服务是多线程的，fork 会把其他线程持有的锁（logging 等）一起复制到子进程，可能导致死锁，
+    因此使用 forkserver（不支持时用 spawn）。
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def get_encode_executor() -> ProcessPoolExecutor:
+    """获取进程级图片编码进程池"""
+    global _encode_executor
+    if _encode_executor is None:
+        with _scheduler_lock:
+            if _encode_executor is None:
+                workers = max(1, min(ImageService.ENCODE_WORKERS, os.cpu_count() or 1))
+                _encode_executor = ProcessPoolExecutor(max_workers=workers, mp_context=_encode_mp_context())
+    return _encode_executor
+
+
+def _discard_encode_executor(executor: ProcessPoolExecutor) -> None:
+    """丢弃已损坏的进程池，下次获取时重建"""
+    global _encode_executor
+    with _scheduler_lock:
+        if _encode_executor is executor:
+            _encode_executor = None
+    executor.shutdown(wait=False)
+
+
+def submit_encode(fn: Callable, *args, **kwargs) -> Future:
+    """
+    提交编码任务到进程池
+
+    工作进程被杀（OOM 等）会让进程池永久处于 BrokenProcessPool 状态：此时重建进程池，
+    本次任务改为在当前线程中直接执行，已生成的图片不会因为编码环节而被判定为失败。
+
+    Args:
+        fn: 编码函数（需可被 pickle）
+
+    Returns:
+        Future: 编码结果
+    """
+    result: Future = Future()
+
+    def run_inline() -> None:
+        try:
+            result.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            result.set_exception(e)
+
+    executor = get_encode_executor()
+    try:
+        inner = executor.submit(fn, *args, **kwargs)
+    except (BrokenProcessPool, RuntimeError) as e:
+        logger.warning(f"图片编码进程池不可用，已重建，本次编码在当前线程执行: {e}")
+        _discard_encode_executor(executor)
+        run_inline()
+        return result
+
+    def on_done(future: Future) -> None:
+        try:
+            result.set_result(future.result())
+        except BrokenProcessPool as e:
+            logger.warning(f"图片编码进程池已损坏，已重建，本次编码在当前线程执行: {e}")
+            _discard_encode_executor(executor)
+            run_inline()
+        except BaseException as e:
+            result.set_exception(e)
+
+    inner.add_done_callback(on_done)
+    return result
 
 
 # 全局服务实例
 _service_instance = None
 
 def get_image_service() -> ImageService:
-    """获取全局图片生成服务实例"""
+    """获取全局图片生成服务实例（image_providers.yaml 变化后按新配置重建）"""
     global _service_instance
-    if _service_instance is None:
-        _service_instance = ImageService()
-    return _service_instance
+    service = _service_instance
+    if service is None:
+        service = _service_instance = ImageService()
+    elif service.providers_snapshot is not Config.load_image_providers_config():
+        logger.info("图片服务商配置已变化，重建 ImageService")
+        rebuilt = ImageService()
+        # 保留进行中任务的上下文，配置变化后仍可重试
+        with service._task_states_lock:
+            rebuilt._task_states.update(service._task_states)
+        service = _service_instance = rebuilt
+    return service
 
 def reset_image_service():
     """重置全局服务实例（配置更新后调用）"""
@@ -2,55 +2,85 @@ import logging
 import os
 import re
 import base64
-import yaml
-from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Generator, List, Any, Optional, Tuple
+from backend.config import Config
+from backend.utils.config_registry import get_config_registry
+from backend.utils.response_cache import get_response_cache, hash_bytes
 from backend.utils.text_client import get_text_chat_client
 
 logger = logging.getLogger(__name__)
 
+_PAGE_TAG = re.compile(r'<page>', flags=re.IGNORECASE)
+_PAGE_TYPES = {
+    "封面": "cover",
+    "内容": "content",
+    "总结": "summary",
+}
+
+
+def _build_page(index: int, page_text: str) -> Optional[Dict[str, Any]]:
+    """把一个页面块解析为页面数据，空块返回 None"""
+    page_text = page_text.strip()
+    if not page_text:
+        return None
+
+    page_type = "content"
+    type_match = re.match(r"\[(\S+)\]", page_text)
+    if type_match:
+        page_type = _PAGE_TYPES.get(type_match.group(1), "content")
+
+    return {
+        "index": index,
+        "type": page_type,
+        "content": page_text
+    }
+
+
+class OutlinePageParser:
+    """
+    增量解析流式输出的大纲
+
+    每收到下一个 <page> 标记，说明上一页已经写完，立即产出该页；
+    页面索引与 OutlineService._parse_outline 对完整文本的解析结果一致。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._segment_start = 0
+        self._segment_index = 0
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        """
+        追加一段新生成的文本
+
+        Args:
+            delta: 新文本
+
+        Returns:
+            List[Dict]: 本次新完成的页面
+        """
+        self.text += delta
+        pages = []
+        # 从当前页开头查找，标记被拆在两段增量之间时也能识别
+        while True:
+            match = _PAGE_TAG.search(self.text, self._segment_start)
+            if not match:
+                break
+            page = _build_page(self._segment_index, self.text[self._segment_start:match.start()])
+            if page:
+                pages.append(page)
+            self._segment_index += 1
+            self._segment_start = match.end()
+        return pages
+
 
 class OutlineService:
     def __init__(self):
         logger.debug("初始化 OutlineService...")
-        self.text_config = self._load_text_config()
+        self.text_config = Config.load_text_providers_config()
         self.client = self._get_client()
-        self.prompt_template = self._load_prompt_template()
         logger.info(f"OutlineService 初始化完成，使用服务商: {self.text_config.get('active_provider')}")
 
-    def _load_text_config(self) -> dict:
-        """加载文本生成配置"""
-        config_path = Path(__file__).parent.parent.parent / 'text_providers.yaml'
-        logger.debug(f"加载文本配置: {config_path}")
-
-        if config_path.exists():
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f) or {}
-                logger.debug(f"文本配置加载成功: active={config.get('active_provider')}")
-                return config
-            except yaml.YAMLError as e:
-                logger.error(f"文本配置 YAML 解析失败: {e}")
-                raise ValueError(
-                    f"文本配置文件格式错误: text_providers.yaml\n"
-                    f"YAML 解析错误: {e}\n"
-                    "解决方案：检查 YAML 缩进和语法"
-                )
-
-        logger.warning("text_providers.yaml 不存在，使用默认配置")
-        # 默认配置
-        return {
-            'active_provider': 'google_gemini',
-            'providers': {
-                'google_gemini': {
-                    'type': 'google_gemini',
-                    'model': 'gemini-2.0-flash-exp',
-                    'temperature': 1.0,
-                    'max_output_tokens': 8000
-                }
-            }
-        }
-
     def _get_client(self):
         """根据配置获取客户端"""
         active_provider = self.text_config.get('active_provider', 'google_gemini')
@@ -86,19 +116,20 @@ class OutlineService:
         logger.info(f"使用文本服务商: {active_provider} (type={provider_config.get('type')})")
         return get_text_chat_client(provider_config)
 
-    def _load_prompt_template(self) -> str:
+    @property
+    def prompt_template(self) -> str:
+        """大纲提示词模板（注册表缓存，文件修改后自动重新读取）"""
         prompt_path = os.path.join(
             os.path.dirname(os.path.dirname(__file__)),
             "prompts",
             "outline_prompt.txt"
         )
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return get_config_registry().read_text(prompt_path)
 
     def _parse_outline(self, outline_text: str) -> List[Dict[str, Any]]:
         # 按 <page> 分割页面（兼容旧的 --- 分隔符）
-        if '<page>' in outline_text:
-            pages_raw = re.split(r'<page>', outline_text, flags=re.IGNORECASE)
+        if _PAGE_TAG.search(outline_text):
+            pages_raw = _PAGE_TAG.split(outline_text)
         else:
             # 向后兼容：如果没有 <page> 则使用 ---
             pages_raw = outline_text.split("---")
@@ -106,29 +137,92 @@ class OutlineService:
         pages = []
 
         for index, page_text in enumerate(pages_raw):
-            page_text = page_text.strip()
-            if not page_text:
-                continue
-
-            page_type = "content"
-            type_match = re.match(r"\[(\S+)\]", page_text)
-            if type_match:
-                type_cn = type_match.group(1)
-                type_mapping = {
-                    "封面": "cover",
-                    "内容": "content",
-                    "总结": "summary",
-                }
-                page_type = type_mapping.get(type_cn, "content")
-
-            pages.append({
-                "index": index,
-                "type": page_type,
-                "content": page_text
-            })
+            page = _build_page(index, page_text)
+            if page:
+                pages.append(page)
 
         return pages
 
+    def _prepare_request(
+        self,
+        topic: str,
+        images: Optional[List[bytes]],
+        input_mode: str
+    ) -> Tuple[Dict[str, Any], Any, Optional[str]]:
+        """
+        构建文本生成参数与缓存键
+
+        Returns:
+            (generate_text 的参数, 响应缓存（未启用为 None）, 缓存键)
+        """
+        prompt = self.prompt_template.format(topic=topic)
+
+        if input_mode == 'free_text':
+            free_text_instruction = (
+                "用户输入的是完整文本素材（可能包含草稿、段落、语气要求、结构要求）。\n"
+                "请优先基于用户原文进行提炼、重组和扩写，不要把它仅当一个简短主题词。\n"
+                "保留用户给出的关键观点、语气和约束条件；信息不足时再做合理补充。"
+            )
+            prompt = f"{free_text_instruction}\n\n{prompt}"
+
+        if images and len(images) > 0:
+            prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
+            logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
+
+        # 从配置中获取模型参数
+        active_provider = self.text_config.get('active_provider', 'google_gemini')
+        providers = self.text_config.get('providers', {})
+        provider_config = providers.get(active_provider, {})
+
+        model = provider_config.get('model', 'gemini-2.0-flash-exp')
+        temperature = provider_config.get('temperature', 1.0)
+        max_output_tokens = provider_config.get('max_output_tokens', 8000)
+
+        # 相同服务商、参数和输入直接返回缓存结果
+        cache = get_response_cache(self.text_config)
+        cache_key = None
+        if cache:
+            cache_key = cache.make_key(
+                kind='outline',
+                provider=active_provider,
+                model=model,
+                temperature=temperature,
+                max_output_tokens=max_output_tokens,
+                template=hash_bytes(self.prompt_template.encode('utf-8')),
+                topic=topic,
+                input_mode=input_mode,
+                images=[hash_bytes(img) for img in images or []]
+            )
+
+        request = {
+            "prompt": prompt,
+            "model": model,
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "images": images
+        }
+        return request, cache, cache_key
+
+    def _build_result(self, outline_text: str, images: Optional[List[bytes]], cache, cache_key) -> Dict[str, Any]:
+        """解析完整大纲文本并写入缓存"""
+        logger.debug(f"API 返回文本长度: {len(outline_text)} 字符")
+        pages = self._parse_outline(outline_text)
+        logger.info(f"大纲解析完成，共 {len(pages)} 页")
+
+        result = {
+            "success": True,
+            "outline": outline_text,
+            "pages": pages,
+            "has_images": images is not None and len(images) > 0
+        }
+        if cache and pages:
+            try:
+                cache.set(cache_key, result)
+            except Exception as e:
+                # 缓存写入失败不影响本次结果
+                logger.warning(f"写入响应缓存失败: {e}")
+        return result
+
     def generate_outline(
         self,
         topic: str,
@@ -139,111 +233,155 @@ class OutlineService:
             logger.info(
                 f"开始生成大纲: mode={input_mode}, topic={topic[:50]}..., images={len(images) if images else 0}"
             )
-            prompt = self.prompt_template.format(topic=topic)
-
-            if input_mode == 'free_text':
-                free_text_instruction = (
-                    "用户输入的是完整文本素材（可能包含草稿、段落、语气要求、结构要求）。\n"
-                    "请优先基于用户原文进行提炼、重组和扩写，不要把它仅当一个简短主题词。\n"
-                    "保留用户给出的关键观点、语气和约束条件；信息不足时再做合理补充。"
-                )
-                prompt = f"{free_text_instruction}\n\n{prompt}"
-
-            if images and len(images) > 0:
-                prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
-                logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
-
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 8000)
-
-            logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
-            outline_text = self.client.generate_text(
-                prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
-                images=images
-            )
+            request, cache, cache_key = self._prepare_request(topic, images, input_mode)
 
-            logger.debug(f"API 返回文本长度: {len(outline_text)} 字符")
-            pages = self._parse_outline(outline_text)
-            logger.info(f"大纲解析完成，共 {len(pages)} 页")
+            if cache:
+                cached = cache.get(cache_key)
+                if cached:
+                    logger.info(f"大纲命中缓存，共 {len(cached.get('pages', []))} 页")
+                    return {**cached, "from_cache": True}
 
-            return {
-                "success": True,
-                "outline": outline_text,
-                "pages": pages,
-                "has_images": images is not None and len(images) > 0
-            }
+            logger.info(f"调用文本生成 API: model={request['model']}, temperature={request['temperature']}")
+            outline_text = self.client.generate_text(**request)
+
+            result = self._build_result(outline_text, images, cache, cache_key)
+            return {**result, "from_cache": False}
 
         except Exception as e:
             error_msg = str(e)
             logger.error(f"大纲生成失败: {error_msg}")
-
-            # 根据错误类型提供更详细的错误信息
-            if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
-                detailed_error = (
-                    f"API 认证失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查并更新 API Key"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                detailed_error = (
-                    f"模型访问失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 模型名称不正确\n"
-                    "2. 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查模型名称配置"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                detailed_error = (
-                    f"网络连接失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 网络连接不稳定\n"
-                    "2. API 服务暂时不可用\n"
-                    "3. Base URL 配置错误\n"
-                    "解决方案：检查网络连接，稍后重试"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                detailed_error = (
-                    f"API 配额限制。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API 调用次数超限\n"
-                    "2. 账户配额用尽\n"
-                    "解决方案：等待配额重置，或升级 API 套餐"
-                )
-            else:
-                detailed_error = (
-                    f"大纲生成失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. Text API 配置错误或密钥无效\n"
-                    "2. 网络连接问题\n"
-                    "3. 模型无法访问或不存在\n"
-                    "建议：检查配置文件 text_providers.yaml"
-                )
-
             return {
                 "success": False,
-                "error": detailed_error
+                "error": self._describe_error(error_msg)
             }
 
+    def generate_outline_stream(
+        self,
+        topic: str,
+        images: Optional[List[bytes]] = None,
+        input_mode: str = 'topic'
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        流式生成大纲
+
+        Args:
+            topic: 主题或完整文本素材
+            images: 参考图片（可选）
+            input_mode: 输入模式 topic/free_text
+
+        Yields:
+            Dict: {"event": 事件类型, "data": 事件数据}
+                - token: {"text"} 新生成的文本片段
+                - page: 单个页面（某页的 <page> 块写完即发送，前端可以先渲染前面的页）
+                - done: 与 generate_outline 相同的完整结果（pages 以此为准）
+                - error: {"success": False, "error"} 生成失败
+        """
+        try:
+            logger.info(
+                f"开始流式生成大纲: mode={input_mode}, topic={topic[:50]}..., images={len(images) if images else 0}"
+            )
+            request, cache, cache_key = self._prepare_request(topic, images, input_mode)
+
+            if cache:
+                cached = cache.get(cache_key)
+                if cached:
+                    logger.info(f"大纲命中缓存，共 {len(cached.get('pages', []))} 页")
+                    for page in cached.get('pages', []):
+                        yield {"event": "page", "data": page}
+                    yield {"event": "done", "data": {**cached, "from_cache": True}}
+                    return
+
+            logger.info(f"调用文本生成 API（流式）: model={request['model']}, temperature={request['temperature']}")
+            parser = OutlinePageParser()
+            emitted = set()
+            for delta in self.client.generate_text_stream(**request):
+                yield {"event": "token", "data": {"text": delta}}
+                for page in parser.feed(delta):
+                    emitted.add(page["index"])
+                    yield {"event": "page", "data": page}
+
+            result = self._build_result(parser.text, images, cache, cache_key)
+            # 最后一页（以及没有使用 <page> 分隔的旧格式）在全文解析后补发
+            for page in result["pages"]:
+                if page["index"] not in emitted:
+                    yield {"event": "page", "data": page}
+            yield {"event": "done", "data": {**result, "from_cache": False}}
+
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"大纲流式生成失败: {error_msg}")
+            yield {
+                "event": "error",
+                "data": {
+                    "success": False,
+                    "error": self._describe_error(error_msg)
+                }
+            }
+
+    @staticmethod
+    def _describe_error(error_msg: str) -> str:
+        """根据错误类型提供更详细的错误信息"""
+        if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
+            return (
+                f"API 认证失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 没有访问该模型的权限\n"
+                "解决方案：在系统设置页面检查并更新 API Key"
+            )
+        elif "model" in error_msg.lower() or "404" in error_msg:
+            return (
+                f"模型访问失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. 模型名称不正确\n"
+                "2. 没有访问该模型的权限\n"
+                "解决方案：在系统设置页面检查模型名称配置"
+            )
+        elif "timeout" in error_msg.lower() or "连接" in error_msg:
+            return (
+                f"网络连接失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. 网络连接不稳定\n"
+                "2. API 服务暂时不可用\n"
+                "3. Base URL 配置错误\n"
+                "解决方案：检查网络连接，稍后重试"
+            )
+        elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
+            return (
+                f"API 配额限制。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. API 调用次数超限\n"
+                "2. 账户配额用尽\n"
+                "解决方案：等待配额重置，或升级 API 套餐"
+            )
+        else:
+            return (
+                f"大纲生成失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. Text API 配置错误或密钥无效\n"
+                "2. 网络连接问题\n"
+                "3. 模型无法访问或不存在\n"
+                "建议：检查配置文件 text_providers.yaml"
+            )
+
+
+_service_instance: Optional[OutlineService] = None
+
 
 def get_outline_service() -> OutlineService:
     """
     获取大纲生成服务实例
-    每次调用都创建新实例以确保配置是最新的
+
+    复用同一实例（及其文本客户端），text_providers.yaml 变化后按新配置重建
     """
-    return OutlineService()
+    global _service_instance
+    service = _service_instance
+    if service is None or service.text_config is not Config.load_text_providers_config():
+        service = OutlineService()
+        _service_instance = service
+    return service
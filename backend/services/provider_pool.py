@@ -0,0 +1,253 @@
+"""
+图片服务商 / API Key 池
+
+单个 API Key 的配额决定了整体吞吐上限。image_providers.yaml 中可以为服务商配置多个 api_keys，
+或用 provider_pool 组合多个服务商（均可带权重），ProviderPool 把每一页的生成请求分摊到各成员：
+- 按权重分配：优先选择 (在途数 + 1) / 权重 最小的成员，在途相同时按累计请求数 / 权重轮转
+- 健康跟踪：返回 429 / 5xx / 网络错误的成员进入冷却（429 优先遵循 Retry-After），冷却期内不再派发
+- 失败转移：单页请求因上述错误失败时立即换一个成员重试，任务中途某个 Key 失效也不影响后续页面
+- 成员健康状态与用量按 (服务商, API Key 哈希) 在进程内共享，配置热加载重建 ImageService 后仍保留，
+  get_provider_pool_stats() 导出给监控面板
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+
+import requests
+
+from backend.generators.factory import ImageGeneratorFactory
+from backend.utils.rate_limiter import (
+    AdaptiveRateLimiter,
+    call_with_rate_limit,
+    get_rate_limiter,
+    is_rate_limit_error,
+    retry_after_from_error,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 服务端错误：生成器异常信息中的 5xx 状态码（"状态码: 503"、"503 UNAVAILABLE" 等）
+_SERVER_ERROR = re.compile(
+    r"状态码: ?5\d\d|服务器错误|\b5\d\d\b\s*(?:internal|unavailable|bad gateway|gateway|service|server)"
+    r"|server error|service unavailable",
+    re.IGNORECASE
+)
+_NETWORK_ERROR = re.compile(r"timed? ?out|timeout|connection (?:reset|refused|aborted|error)|超时", re.IGNORECASE)
+
+
+def classify_failure(error: Exception) -> Optional[str]:
+    """
+    判断错误是否说明成员本身不健康
+
+    Returns:
+        "rate_limited" / "server_error" / "network"；提示词被过滤等与成员无关的错误返回 None
+    """
+    if is_rate_limit_error(error):
+        return "rate_limited"
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return "network"
+    text = str(error)
+    if _SERVER_ERROR.search(text):
+        return "server_error"
+    if _NETWORK_ERROR.search(text):
+        return "network"
+    return None
+
+
+class MemberHealth:
+    """单个成员的健康状态与用量统计（进程内共享）"""
+
+    # 5xx / 网络错误的冷却时间：BASE_COOLDOWN × 2^(连续失败次数 - 1)，不超过 MAX_COOLDOWN
+    BASE_COOLDOWN = 5.0
+    MAX_COOLDOWN = 120.0
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.successes = 0
+        self.failures: Dict[str, int] = {}
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def succeed(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.successes += 1
+            self.consecutive_failures = 0
+
+    def fail(self, kind: Optional[str], error: Exception) -> float:
+        """
+        记录一次失败
+
+        Args:
+            kind: classify_failure 的结果，None 表示与成员健康无关
+            error: 异常
+
+        Returns:
+            float: 成员进入冷却的秒数（0 表示未进入冷却）
+        """
+        with self._lock:
+            self.in_flight -= 1
+            key = kind or "other"
+            self.failures[key] = self.failures.get(key, 0) + 1
+            self.last_error = str(error)[:200]
+            if kind is None:
+                return 0.0
+
+            self.consecutive_failures += 1
+            cooldown = retry_after_from_error(error) if kind == "rate_limited" else None
+            if cooldown is None:
+                cooldown = min(self.MAX_COOLDOWN, self.BASE_COOLDOWN * 2 ** (self.consecutive_failures - 1))
+            self.unhealthy_until = max(self.unhealthy_until, time.monotonic() + cooldown)
+            return cooldown
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "healthy": self.available(now),
+                "unhealthy_seconds": round(max(0.0, self.unhealthy_until - now), 2),
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": dict(self.failures),
+                "last_error": self.last_error,
+            }
+
+
+_health: Dict[str, MemberHealth] = {}
+_health_lock = threading.Lock()
+# 选择成员与增加在途数需要原子完成，否则并发请求会同时选中同一个成员
+_choose_lock = threading.Lock()
+
+
+def _get_member_health(name: str) -> MemberHealth:
+    with _health_lock:
+        health = _health.get(name)
+        if health is None:
+            health = _health[name] = MemberHealth(name)
+        return health
+
+
+def get_provider_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有成员的健康状态与用量 {成员名称: 状态}"""
+    with _health_lock:
+        members = list(_health.values())
+    return {health.name: health.get_stats() for health in members}
+
+
+class PoolMember:
+    """池中的一个 (服务商, API Key)"""
+
+    def __init__(self, provider: str, weight: float, config: Dict[str, Any]):
+        self.provider = provider
+        self.weight = weight
+        self.config = config
+        key_hash = hashlib.sha256((config.get('api_key') or "").encode("utf-8")).hexdigest()[:8]
+        self.name = f"{provider}#{key_hash}"
+        self.max_concurrent = config.get('max_concurrent') or None
+        self.generator = ImageGeneratorFactory.create(config.get('type', provider), config)
+        self.rate_limiter: AdaptiveRateLimiter = get_rate_limiter(
+            f"image:{provider}", config.get('api_key'), config.get('rate_limit')
+        )
+        self.health = _get_member_health(self.name)
+
+    def load_key(self):
+        """排序键：未满载优先，其次 (在途数 + 1) / 权重，再按累计请求数 / 权重轮转"""
+        in_flight = self.health.in_flight
+        saturated = self.max_concurrent is not None and in_flight >= self.max_concurrent
+        return (saturated, (in_flight + 1) / self.weight, self.health.requests / self.weight)
+
+
+class ProviderPool:
+    """按权重与健康状态分摊请求的成员池"""
+
+    def __init__(self, members: Iterable[Dict[str, Any]]):
+        """
+        Args:
+            members: Config.get_image_provider_pool() 的返回值
+        """
+        self.members: List[PoolMember] = []
+        for member in members:
+            pool_member = PoolMember(member["provider"], member["weight"], member["config"])
+            # 同一服务商重复配置的同一个 Key 只保留一个成员
+            if all(existing.name != pool_member.name for existing in self.members):
+                self.members.append(pool_member)
+
+    @property
+    def name(self) -> str:
+        """池的标识（成员名称组合），作为调度器中的并发上限分组"""
+        return "+".join(member.name for member in self.members)
+
+    @property
+    def concurrency_limit(self) -> Optional[int]:
+        """所有成员都配置了 max_concurrent 时为其总和，否则为 None（只受全局上限约束）"""
+        limits = [member.max_concurrent for member in self.members]
+        if any(limit is None for limit in limits):
+            return None
+        return sum(limits)
+
+    def _choose(self, exclude: Set[str]) -> Optional[PoolMember]:
+        """选择一个成员并计入在途数；所有候选都在冷却时选最快恢复的那个"""
+        with _choose_lock:
+            now = time.monotonic()
+            candidates = [member for member in self.members if member.name not in exclude]
+            if not candidates:
+                return None
+            healthy = [
+                member for member in candidates
+                if member.health.available(now) and member.rate_limiter.cooldown_remaining() <= 0
+            ]
+            if healthy:
+                member = min(healthy, key=PoolMember.load_key)
+            else:
+                member = min(candidates, key=lambda m: m.health.unhealthy_until)
+            member.health.begin()
+            return member
+
+    def call(self, func: Callable[[PoolMember], T]) -> T:
+        """
+        选择成员执行请求，成员不健康（429 / 5xx / 网络错误）时转移到其他成员
+
+        只有一个成员时遇到 429 在其限流器中排队重试；多个成员时直接换成员。
+
+        Args:
+            func: 接收成员、发起请求的函数
+
+        Returns:
+            func 的返回值
+        """
+        max_retries = 3 if len(self.members) == 1 else 1
+        tried: Set[str] = set()
+        while True:
+            member = self._choose(tried)
+            try:
+                result = call_with_rate_limit(member.rate_limiter, lambda: func(member), max_retries=max_retries)
+            except Exception as e:
+                kind = classify_failure(e)
+                cooldown = member.health.fail(kind, e)
+                tried.add(member.name)
+                if kind is None or len(tried) >= len(self.members):
+                    raise
+                logger.warning(
+                    f"[负载均衡] {member.name} 请求失败（{kind}），冷却 {cooldown:.0f} 秒，切换到其他成员"
+                )
+                continue
+            member.health.succeed()
+            return result
@@ -7,10 +7,9 @@
 import json
 import logging
 import os
-import yaml
-from pathlib import Path
 from typing import Dict, Any, Optional, List
 
+from backend.config import Config
 from backend.utils.text_client import get_text_chat_client
 from backend.utils.title_utils import truncate_title
 
@@ -69,33 +68,9 @@ class RefineService:
 """
 
     def __init__(self):
-        self.text_config = self._load_text_config()
+        self.text_config = Config.load_text_providers_config()
         self.client = self._get_client()
 
-    def _load_text_config(self) -> dict:
-        """加载文本生成配置"""
-        config_path = Path(__file__).parent.parent.parent / 'text_providers.yaml'
-
-        if config_path.exists():
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f) or {}
-                return config
-            except yaml.YAMLError as e:
-                logger.error(f"文本配置 YAML 解析失败: {e}")
-
-        return {
-            'active_provider': 'google_gemini',
-            'providers': {
-                'google_gemini': {
-                    'type': 'google_gemini',
-                    'model': 'gemini-2.0-flash-exp',
-                    'temperature': 1.0,
-                    'max_output_tokens': 8000
-                }
-            }
-        }
-
     def _get_client(self):
         """获取文本生成客户端"""
         active_provider = self.text_config.get('active_provider', 'google_gemini')
@@ -270,6 +245,18 @@ class RefineService:
         return {'optimized_title': '', 'optimized_content': response_text, 'tags': []}
 
 
+_service_instance: Optional[RefineService] = None
+
+
 def get_refine_service() -> RefineService:
-    """获取调优服务实例"""
-    return RefineService()
+    """
+    获取调优服务实例
+
+    复用同一实例（及其文本客户端），text_providers.yaml 变化后按新配置重建
+    """
+    global _service_instance
+    service = _service_instance
+    if service is None or service.text_config is not Config.load_text_providers_config():
+        service = RefineService()
+        _service_instance = service
+    return service
@@ -360,7 +360,8 @@ class XiaohongshuPublisher:
 
         value = str(raw_path).strip()
         parsed = urlparse(value)
-        candidate_str = parsed.path if parsed.scheme in ("http", "https") else value
+        # 图片 URL 可能带 ?v= 版本号等查询参数
+        candidate_str = parsed.path if parsed.scheme in ("http", "https") or parsed.query else value
         candidate_str = candidate_str.replace("\\", "/")
 
         candidates: List[Path] = []
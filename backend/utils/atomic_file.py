@@ -0,0 +1,69 @@
+"""
+原子文件写入
+
+直接以 "w" 模式打开目标文件写入时，进程在写入中途被杀（容器缩容、OOM）会留下被截断的文件。
+这里先写入同目录下的临时文件并 fsync，再用 os.replace 原子替换目标文件，最后 fsync 所在目录，
+保证目标文件要么是旧内容、要么是完整的新内容，并且替换在断电后依然有效。
+"""
+import json
+import os
+import tempfile
+from typing import Any
+
+
+def _fsync_dir(dir_path: str) -> None:
+    """fsync 目录，使 rename 持久化（Windows 不支持打开目录，忽略）"""
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """
+    原子写入二进制文件
+
+    Args:
+        path: 目标文件路径
+        data: 文件内容
+    """
+    dir_path = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    # 临时文件以目标文件名开头、.tmp 结尾：按扩展名筛选图片/记录的代码会忽略它，缩略图的临时文件仍以 thumb_ 开头
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp 创建的文件权限为 0600，保持与普通写入一致
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(dir_path)
+
+
+def atomic_write_json(path: str, data: Any, indent: Any = None) -> None:
+    """
+    原子写入 JSON 文件（UTF-8，保留中文）
+
+    Args:
+        path: 目标文件路径
+        data: 可 JSON 序列化的数据
+        indent: 缩进，同 json.dump
+    """
+    atomic_write_bytes(path, json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8"))
@@ -0,0 +1,192 @@
+"""
+配置与提示词模板注册表
+
+大纲、文案、调优、创意风暴等服务原先每个请求都重新打开并 yaml.safe_load text_providers.yaml、
+重新读取提示词模板。ConfigRegistry 把解析结果缓存在进程内：
+- 每个文件只在内容变化（mtime/大小/inode 变化）时重新解析，
+  检查间隔 CHECK_INTERVAL 内直接返回缓存，请求路径上没有磁盘 I/O
+- YAML 配置以只读快照（MappingProxyType / tuple）返回，快照对象不变即说明配置未变，
+  服务单例据此判断是否需要按新配置重建
+- 配置文件被改坏（如编辑器写到一半）时继续使用上一次解析成功的快照
+- 设置页保存配置后调用 invalidate()，下一次读取立即生效，无需等待检查间隔
+"""
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# 文件签名：(mtime_ns, size, inode)，文件不存在时为 None
+_Signature = Optional[Tuple[int, int, int]]
+
+
+def freeze(value: Any) -> Any:
+    """把解析结果递归转换为只读结构（dict -> MappingProxyType，list -> tuple）"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """freeze 的逆操作，得到可修改、可 JSON 序列化的普通 dict / list（如对外返回的服务商配置）"""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class _Entry:
+    __slots__ = ("signature", "value", "checked_at")
+
+    def __init__(self, signature: _Signature, value: Any, checked_at: float):
+        self.signature = signature
+        self.value = value
+        self.checked_at = checked_at
+
+
+class ConfigRegistry:
+    """按文件缓存解析结果，文件变化时自动重新加载"""
+
+    # 两次检查文件是否变化的最小间隔（秒）
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+
+    @staticmethod
+    def _signature(path: str) -> _Signature:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _get(self, kind: str, path: str, parse: Callable[[str], Any], missing: Callable[[], Any]) -> Any:
+        key = (kind, os.path.abspath(path))
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.checked_at < self.CHECK_INTERVAL:
+            return entry.value
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.checked_at < self.CHECK_INTERVAL:
+                return entry.value
+
+            signature = self._signature(path)
+            if entry is not None and signature == entry.signature:
+                entry.checked_at = now
+                return entry.value
+
+            if signature is None:
+                value = missing()
+            else:
+                try:
+                    value = parse(path)
+                except Exception:
+                    if entry is None or entry.signature is None:
+                        raise
+                    # 文件被改坏时沿用上一次成功解析的结果，修好后自动恢复
+                    logger.exception(f"重新加载失败，继续使用上一次的内容: {path}")
+                    entry.checked_at = now
+                    return entry.value
+                logger.info(f"已加载: {path}")
+
+            self._entries[key] = _Entry(signature, value, now)
+            return value
+
+    def load_yaml(self, path: str, default: Optional[Dict] = None) -> MappingProxyType:
+        """
+        读取 YAML 配置的只读快照
+
+        Args:
+            path: 配置文件路径
+            default: 文件不存在时使用的默认配置
+
+        Returns:
+            MappingProxyType: 只读配置，内容未变化时返回同一个对象
+
+        Raises:
+            ValueError: YAML 格式错误（且没有可沿用的旧快照）
+        """
+        def parse(file_path: str) -> MappingProxyType:
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    return freeze(yaml.safe_load(f) or {})
+            except yaml.YAMLError as e:
+                logger.error(f"配置文件 YAML 格式错误: {file_path}: {e}")
+                raise ValueError(
+                    f"配置文件格式错误: {os.path.basename(file_path)}\n"
+                    f"YAML 解析错误: {e}\n"
+                    "解决方案：\n"
+                    "1. 检查 YAML 缩进是否正确（使用空格，不要用Tab）\n"
+                    "2. 检查引号是否配对\n"
+                    "3. 使用在线 YAML 验证器检查格式"
+                )
+
+        def missing() -> MappingProxyType:
+            logger.warning(f"配置文件不存在: {path}，使用默认配置")
+            return freeze(default or {})
+
+        return self._get("yaml", path, parse, missing)
+
+    def read_text(self, path: str) -> str:
+        """
+        读取文本文件（提示词模板等），内容变化时自动重新读取
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            str: 文件内容
+
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        def parse(file_path: str) -> str:
+            with open(file_path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        def missing() -> str:
+            raise FileNotFoundError(path)
+
+        return self._get("text", path, parse, missing)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """
+        丢弃缓存，下次读取时重新检查文件
+
+        Args:
+            path: 文件路径，None 表示全部
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            path = os.path.abspath(path)
+            for key in [key for key in self._entries if key[1] == path]:
+                del self._entries[key]
+
+
+_registry_instance: Optional[ConfigRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_config_registry() -> ConfigRegistry:
+    """获取进程级配置注册表"""
+    global _registry_instance
+    if _registry_instance is None:
+        with _registry_lock:
+            if _registry_instance is None:
+                _registry_instance = ConfigRegistry()
+    return _registry_instance
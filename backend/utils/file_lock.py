@@ -0,0 +1,77 @@
+"""
+跨进程文件锁
+
+多个 gunicorn worker 共享同一个 history/ 目录时，线程锁只能串行化本进程内的读改写。
+InterProcessLock 在线程锁之外再对锁文件加 fcntl.flock：
+- exclusive()：写锁，同一时刻只有一个进程（一个线程）持有
+- shared()：读锁，可与其他读者并存，与写锁互斥（读者不会看到写到一半的索引和日志）
+
+同一线程内可重入：持有写锁时再次获取写锁或读锁直接通过。
+不支持 fcntl 的平台（Windows）退化为进程内的线程锁，此时只能单进程运行。
+"""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class InterProcessLock:
+    """基于 flock 的读写锁（写锁同线程可重入）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._local = threading.local()
+
+    def _depth(self) -> int:
+        return getattr(self._local, "depth", 0)
+
+    def _flock(self, operation: int) -> int:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    @staticmethod
+    def _release(fd: int) -> None:
+        # 关闭文件描述符即释放 flock
+        os.close(fd)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """获取写锁"""
+        with self._thread_lock:
+            fd = None
+            if self._depth() == 0 and fcntl is not None:
+                fd = self._flock(fcntl.LOCK_EX)
+            self._local.depth = self._depth() + 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+                if fd is not None:
+                    self._release(fd)
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        """获取读锁（当前线程已持有写锁时直接通过；持有读锁期间不能再获取写锁）"""
+        if self._depth() > 0:
+            yield
+            return
+        if fcntl is None:
+            with self._thread_lock:
+                yield
+            return
+        fd = self._flock(fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            self._release(fd)
@@ -1,25 +1,42 @@
 """Google GenAI 客户端封装"""
+import logging
 import time
 import random
 from functools import wraps
+from typing import Iterator
 from google import genai
 from google.genai import types
 
 # 导入统一的错误解析函数
 from ..generators.google_genai import parse_genai_error
+from .rate_limiter import call_with_rate_limit, get_rate_limiter, is_rate_limit_error
+
+logger = logging.getLogger(__name__)
 
 
 def retry_on_429(max_retries=3, base_delay=2):
-    """429 错误自动重试装饰器（带智能错误解析）"""
+    """
+    自动重试装饰器（带智能错误解析）
+
+    429 / 配额限制交给 call_with_rate_limit：经由客户端共享的限流器降低速率、按 retryDelay 冷却，请求重新排队；
+    其他可重试错误在当前线程中退避后重试。
+    """
     def decorator(func):
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            last_error = None
+        def wrapper(self, *args, **kwargs):
             for attempt in range(max_retries):
                 try:
-                    return func(*args, **kwargs)
+                    return call_with_rate_limit(
+                        self.rate_limiter,
+                        lambda: func(self, *args, **kwargs),
+                        max_retries=max_retries,
+                        base_delay=base_delay
+                    )
                 except Exception as e:
-                    last_error = e
+                    # 限流重试次数已在限流器中耗尽
+                    if is_rate_limit_error(e):
+                        raise Exception(parse_genai_error(e))
+
                     error_str = str(e).lower()
 
                     # 不可重试的错误类型
@@ -30,33 +47,13 @@ def retry_on_429(max_retries=3, base_delay=2):
                         "invalid_argument",  # 参数错误
                         "safety", "blocked", "filter",  # 安全过滤
                     ]
-
-                    should_retry = True
-                    for keyword in non_retryable:
-                        if keyword in error_str:
-                            should_retry = False
-                            break
-
-                    if not should_retry:
-                        # 直接抛出，不重试
+                    if any(keyword in error_str for keyword in non_retryable) or attempt >= max_retries - 1:
+                        # 不可重试或重试次数耗尽
                         raise Exception(parse_genai_error(e))
 
-                    # 可重试的错误
-                    if attempt < max_retries - 1:
-                        if "429" in error_str or "resource_exhausted" in error_str:
-                            wait_time = (base_delay ** attempt) + random.uniform(0, 1)
-                            print(f"[重试] 遇到资源限制，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
-                        else:
-                            wait_time = min(2 ** attempt, 10) + random.uniform(0, 1)
-                            print(f"[重试] 请求失败，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-
-                    # 重试次数耗尽
-                    raise Exception(parse_genai_error(e))
-
-            # 理论上不会到这里，但保险起见
-            raise Exception(parse_genai_error(last_error))
+                    wait_time = min(2 ** attempt, 10) + random.uniform(0, 1)
+                    logger.warning(f"[重试] 请求失败，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
+                    time.sleep(wait_time)
         return wrapper
     return decorator
 
@@ -64,7 +61,7 @@ def retry_on_429(max_retries=3, base_delay=2):
 class GenAIClient:
     """GenAI 客户端封装类（已弃用，请使用 GoogleGenAIGenerator）"""
 
-    def __init__(self, api_key: str = None, base_url: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None, rate_limit: float = None):
         self.api_key = api_key
         if not self.api_key:
             raise ValueError(
@@ -88,6 +85,11 @@ class GenAIClient:
 
         self.client = genai.Client(**client_kwargs)
 
+        # 同一服务商与 API Key 的所有客户端共享限流器（rate_limit: 次/分钟）
+        self.rate_limiter = get_rate_limiter(
+            f"text:{base_url or 'https://generativelanguage.googleapis.com'}", self.api_key, rate_limit
+        )
+
         # 默认安全设置：全部关闭
         self.default_safety_settings = [
             types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
@@ -96,35 +98,16 @@ class GenAIClient:
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
         ]
 
-    @retry_on_429(max_retries=3, base_delay=2)
-    def generate_text(
+    def _build_text_request(
         self,
         prompt: str,
-        model: str = "gemini-3-pro-preview",
-        temperature: float = 1.0,
-        max_output_tokens: int = 8000,
-        use_search: bool = False,
-        use_thinking: bool = False,
-        images: list = None,
-        system_prompt: str = None,
-        **kwargs
-    ) -> str:
-        """
-        生成文本
-
-        Args:
-            prompt: 提示词
-            model: 模型名称
-            temperature: 温度
-            max_output_tokens: 最大输出 token
-            use_search: 是否使用搜索
-            use_thinking: 是否启用思考模式
-            images: 图片列表（暂不支持）
-            system_prompt: 系统提示词（暂不支持）
-
-        Returns:
-            生成的文本
-        """
+        temperature: float,
+        max_output_tokens: int,
+        use_search: bool,
+        use_thinking: bool,
+        images: list
+    ):
+        """构建文本生成的 contents 与 config"""
         parts = [types.Part(text=prompt)]
 
         if images:
@@ -159,7 +142,46 @@ class GenAIClient:
         if use_thinking:
             config_kwargs["thinking_config"] = types.ThinkingConfig(thinking_level="HIGH")
 
-        generate_content_config = types.GenerateContentConfig(**config_kwargs)
+        return contents, types.GenerateContentConfig(**config_kwargs)
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
+            return ""
+        return chunk.text or ""
+
+    @retry_on_429(max_retries=3, base_delay=2)
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> str:
+        """
+        生成文本
+
+        Args:
+            prompt: 提示词
+            model: 模型名称
+            temperature: 温度
+            max_output_tokens: 最大输出 token
+            use_search: 是否使用搜索
+            use_thinking: 是否启用思考模式
+            images: 图片列表（暂不支持）
+            system_prompt: 系统提示词（暂不支持）
+
+        Returns:
+            生成的文本
+        """
+        contents, generate_content_config = self._build_text_request(
+            prompt, temperature, max_output_tokens, use_search, use_thinking, images
+        )
 
         result = ""
         for chunk in self.client.models.generate_content_stream(
@@ -167,12 +189,58 @@ class GenAIClient:
             contents=contents,
             config=generate_content_config,
         ):
-            if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
-                continue
-            result += chunk.text
+            result += self._chunk_text(chunk)
 
         return result
 
+    @retry_on_429(max_retries=3, base_delay=2)
+    def _open_text_stream(self, model: str, contents, config):
+        """发起流式请求并取到第一个数据块，收到第一个 token 前的错误（含 429）会重试"""
+        stream = iter(self.client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        ))
+        first = next(stream, None)
+        return first, stream
+
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本，参数同 generate_text
+
+        Yields:
+            str: 新生成的文本片段
+        """
+        contents, generate_content_config = self._build_text_request(
+            prompt, temperature, max_output_tokens, use_search, use_thinking, images
+        )
+        first, stream = self._open_text_stream(model, contents, generate_content_config)
+        if first is None:
+            return
+
+        text = self._chunk_text(first)
+        if text:
+            yield text
+        try:
+            for chunk in stream:
+                text = self._chunk_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            # 已经输出了部分内容，不能再重试
+            raise Exception(parse_genai_error(e))
+
     @retry_on_429(max_retries=5, base_delay=3)  # 图片生成重试更多次
     def generate_image(
         self,
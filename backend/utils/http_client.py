@@ -0,0 +1,193 @@
+"""
+共享 HTTP 连接池
+
+所有服务商客户端（图片生成器、文本客户端）都经由这里发请求：
+- 按 base_url 的 scheme + host + port 复用 requests.Session，同一服务商的请求共享 keep-alive 连接，
+  避免每一页、每一次文本调用都重新进行 TCP + TLS 握手
+- 连接池大小与图片生成并发上限一致，并发生图时每个在途请求都能拿到一条空闲连接
+- 统一的连接/读取超时
+- 统计每个服务商的请求数与新建连接数，用于观察连接复用情况
+- Session 数量有上限，超出时关闭最久未使用的（图片下载地址可能分布在不断变化的 CDN 域名上）
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+TimeoutType = Union[None, float, Tuple[float, float]]
+
+
+class HttpSessionPool:
+    """
+    按 base_url 分组的 Session 连接池
+
+    requests.Session 的连接复用由 urllib3 连接池完成，多线程并发请求是安全的
+    （本项目的服务商请求不依赖 Cookie）。
+    """
+
+    # 最多保留的 Session 数，超出时按最近使用顺序淘汰
+    MAX_SESSIONS = 32
+
+    def __init__(
+        self,
+        pool_size: int,
+        connect_timeout: float,
+        read_timeout: float,
+        max_sessions: int = MAX_SESSIONS
+    ):
+        self.pool_size = max(1, pool_size)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_sessions = max(1, max_sessions)
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, requests.Session]" = OrderedDict()
+        self._request_counts: Dict[str, int] = {}
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        """提取 scheme://host[:port] 作为连接池的键"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            pool_block=False
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get_session(self, url: str) -> requests.Session:
+        """
+        获取 url 所属服务商的共享 Session
+
+        Args:
+            url: 请求地址或 base_url
+
+        Returns:
+            该 scheme + host + port 对应的 Session
+        """
+        return self._acquire(self._origin(url), count=False)
+
+    def _acquire(self, origin: str, count: bool) -> requests.Session:
+        """获取（必要时创建）origin 的 Session 并标记为最近使用，超出上限时关闭最久未使用的 Session"""
+        evicted = []
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                session = self._create_session()
+                self._sessions[origin] = session
+                self._request_counts[origin] = 0
+                logger.debug(f"创建 HTTP 连接池: {origin} (pool_size={self.pool_size})")
+                while len(self._sessions) > self.max_sessions:
+                    oldest, oldest_session = self._sessions.popitem(last=False)
+                    self._request_counts.pop(oldest, None)
+                    evicted.append((oldest, oldest_session))
+            else:
+                self._sessions.move_to_end(origin)
+            if count:
+                self._request_counts[origin] += 1
+
+        # 在锁外关闭：已取出连接的在途请求不受影响，连接归还时随连接池一起关闭
+        for oldest, oldest_session in evicted:
+            logger.debug(f"关闭最久未使用的 HTTP 连接池: {oldest}")
+            oldest_session.close()
+        return session
+
+    def _resolve_timeout(self, timeout: TimeoutType) -> Tuple[float, float]:
+        """单个数值视为读取超时，连接超时使用全局配置"""
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, tuple):
+            return timeout
+        return (self.connect_timeout, timeout)
+
+    def request(self, method: str, url: str, timeout: TimeoutType = None, **kwargs) -> requests.Response:
+        """
+        通过共享连接池发送请求，参数同 requests.request
+
+        Args:
+            method: HTTP 方法
+            url: 请求地址
+            timeout: 读取超时秒数或 (连接超时, 读取超时)，默认使用全局配置
+
+        Returns:
+            requests.Response
+        """
+        session = self._acquire(self._origin(url), count=True)
+        return session.request(method, url, timeout=self._resolve_timeout(timeout), **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取连接复用统计
+
+        Returns:
+            {origin: {requests, connections, reused, reuse_ratio}}，
+            connections 为累计新建的连接数，reused 为复用已有连接完成的请求数
+        """
+        with self._lock:
+            sessions = dict(self._sessions)
+            request_counts = dict(self._request_counts)
+
+        stats = {}
+        for origin, session in sessions.items():
+            connections = 0
+            adapter = session.get_adapter(origin + "/")
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+
+            total = request_counts.get(origin, 0)
+            reused = max(0, total - connections)
+            stats[origin] = {
+                "requests": total,
+                "connections": connections,
+                "reused": reused,
+                "reuse_ratio": round(reused / total, 3) if total else 0.0
+            }
+        return stats
+
+    def close(self) -> None:
+        """关闭所有 Session 及其连接"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._request_counts.clear()
+        for session in sessions:
+            session.close()
+
+
+_pool_instance: Optional[HttpSessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_http_pool() -> HttpSessionPool:
+    """获取进程级共享 HTTP 连接池"""
+    global _pool_instance
+    if _pool_instance is None:
+        from backend.config import Config
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = HttpSessionPool(
+                    pool_size=Config.HTTP_POOL_SIZE,
+                    connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+                    read_timeout=Config.HTTP_READ_TIMEOUT
+                )
+    return _pool_instance
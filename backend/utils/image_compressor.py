@@ -1,7 +1,69 @@
 """图片压缩工具"""
 import io
-from PIL import Image
-from typing import Optional
+from PIL import Image, features
+from typing import Dict, Iterable, Optional, Tuple
+
+# 多尺寸缩略图宽度：grid 用于历史记录网格，preview 用于预览
+THUMBNAIL_WIDTHS = {
+    "grid": 360,
+    "preview": 1080,
+}
+
+# 缩略图格式 -> (PIL 格式名, MIME 类型, 编码参数)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", "image/avif", {"quality": 60, "speed": 8}),
+}
+
+
+def _open_rgb(image_data: bytes, max_dimension: int) -> Image.Image:
+    """解码图片并转换为 RGB（透明背景填白）"""
+    img = Image.open(io.BytesIO(image_data))
+    img.draft('RGB', (max_dimension, max_dimension))
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    """以指定质量编码为 JPEG"""
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+
+def _bisect_quality(
+    img: Image.Image,
+    max_size_bytes: int,
+    low: int,
+    high: int,
+    tolerance: int = 3
+) -> Optional[bytes]:
+    """
+    二分查找 [low, high] 内满足大小限制的最高质量
+
+    找到可用质量后，区间收窄到 tolerance 以内即停止（旧实现的质量步长为 5）。
+
+    Returns:
+        满足限制的最高质量编码结果；区间内都不满足时返回 None
+    """
+    best = None
+    while low <= high:
+        mid = (low + high) // 2
+        data = _encode_jpeg(img, mid)
+        if len(data) <= max_size_bytes:
+            best, low = data, mid + 1
+        else:
+            high = mid - 1
+        if best is not None and high - low < tolerance:
+            break
+    return best
 
 
 def compress_image(
@@ -14,6 +76,9 @@ def compress_image(
     """
     压缩图片到指定大小以内
 
+    先尝试起始质量；超限时在 [quality_min, quality_start] 区间二分查找最高可用质量。
+    最低质量仍超限时，根据最低质量编码的每像素字节数估算目标尺寸，一次缩放到位。
+
     Args:
         image_data: 原始图片数据
         max_size_kb: 最大文件大小（KB）
@@ -31,52 +96,49 @@ def compress_image(
         return image_data
 
     try:
-        # 打开图片
-        img = Image.open(io.BytesIO(image_data))
-
-        # 转换为 RGB（处理 RGBA 等格式）
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # 如果图片尺寸过大，先缩小
+        # 打开图片并转换为 RGB（JPEG 源图可在解码阶段直接按比例缩小）
+        img = _open_rgb(image_data, max_dimension)
+
+        # 如果图片尺寸过大，先缩小（reducing_gap 先用 reduce 做整数倍快速缩小）
         width, height = img.size
         if width > max_dimension or height > max_dimension:
             ratio = min(max_dimension / width, max_dimension / height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # 逐步降低质量直到满足大小要求
-        quality = quality_start
-        compressed_data = None
-
-        while quality >= quality_min:
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=quality, optimize=True)
-            compressed_data = output.getvalue()
-
-            if len(compressed_data) <= max_size_bytes:
-                break
+            img = img.resize(
+                (int(width * ratio), int(height * ratio)),
+                Image.Resampling.LANCZOS,
+                reducing_gap=3.0
+            )
 
-            quality -= 5
+        compressed_data = _encode_jpeg(img, quality_start)
 
-        # 如果还是太大，进一步缩小尺寸
         if len(compressed_data) > max_size_bytes:
-            width, height = img.size
-            while len(compressed_data) > max_size_bytes and max(width, height) > 512:
-                width = int(width * 0.9)
-                height = int(height * 0.9)
-                img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
+            best = None
+            if len(compressed_data) > max_size_bytes * 4:
+                # 超出过多，最低质量大概率也不满足，先探测最低质量
+                min_data = _encode_jpeg(img, quality_min)
+                if len(min_data) <= max_size_bytes:
+                    best = _bisect_quality(img, max_size_bytes, quality_min + 1, quality_start - 1) or min_data
+            else:
+                best = _bisect_quality(img, max_size_bytes, quality_min, quality_start - 1)
+                if best is None:
+                    min_data = _encode_jpeg(img, quality_min)
 
-                output = io.BytesIO()
-                img_resized.save(output, format='JPEG', quality=quality_min, optimize=True)
-                compressed_data = output.getvalue()
+            if best is not None:
+                compressed_data = best
+            else:
+                # 最低质量仍超限：按每像素字节数估算目标像素数，一次缩放到位
+                compressed_data = min_data
+                source = img
+                while len(compressed_data) > max_size_bytes and max(img.size) > 512:
+                    width, height = img.size
+                    bytes_per_pixel = len(compressed_data) / (width * height)
+                    # 留 10% 余量，且每轮至少缩小 10%（与旧实现的步长一致）
+                    scale = min(0.9, ((max_size_bytes * 0.9) / bytes_per_pixel / (width * height)) ** 0.5)
+                    # 最长边不小于 512 像素
+                    scale = max(scale, 512 / max(width, height))
+                    new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                    img = source.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+                    compressed_data = _encode_jpeg(img, quality_min)
 
         original_size_kb = len(image_data) / 1024
         compressed_size_kb = len(compressed_data) / 1024
@@ -103,3 +165,106 @@ def compress_images(images: list[bytes], max_size_kb: int = 200) -> list[bytes]:
         压缩后的图片数据列表
     """
     return [compress_image(img, max_size_kb) for img in images]
+
+
+def get_thumbnail_formats(enable_avif: bool = False) -> Tuple[str, ...]:
+    """获取当前环境可用的缩略图格式（AVIF 需要显式启用且 Pillow 支持）"""
+    formats = []
+    if features.check('webp'):
+        formats.append("webp")
+    if enable_avif and features.check('avif'):
+        formats.append("avif")
+    return tuple(formats)
+
+
+def get_thumbnail_filename(filename: str, width: int, fmt: str) -> str:
+    """获取多尺寸缩略图文件名，如 0.png -> thumb_0_w360.webp"""
+    stem = filename.rsplit('.', 1)[0]
+    return f"thumb_{stem}_w{width}.{fmt}"
+
+
+def encode_thumbnails(
+    image_data: bytes,
+    widths: Iterable[int],
+    formats: Iterable[str]
+) -> Dict[Tuple[int, str], bytes]:
+    """
+    生成多尺寸、多格式缩略图（只解码一次，从大到小逐级缩放）
+
+    Args:
+        image_data: 原始图片数据
+        widths: 缩略图宽度列表（不会放大原图）
+        formats: 格式列表，见 THUMBNAIL_FORMATS
+
+    Returns:
+        {(width, format): 图片数据}
+    """
+    formats = list(formats)
+    widths = sorted(set(widths), reverse=True)
+    if not formats or not widths:
+        return {}
+
+    img = _open_rgb(image_data, widths[0])
+    results = {}
+    for width in widths:
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for fmt in formats:
+            pil_format, _, params = THUMBNAIL_FORMATS[fmt]
+            output = io.BytesIO()
+            img.save(output, format=pil_format, **params)
+            results[(width, fmt)] = output.getvalue()
+    return results
+
+
+def encode_variants(
+    image_data: bytes,
+    thumbnail_kb: int = 50,
+    reference_kb: int = 200,
+    thumbnail_formats: Iterable[str] = ()
+) -> Dict[str, object]:
+    """
+    一次性生成图片的派生版本（缩略图 + 参考图 + 多尺寸缩略图）
+
+    设计为在进程池中执行（模块级函数，可被 pickle），
+    避免在生成线程内做 CPU 密集的解码/编码。
+
+    Args:
+        image_data: 原始图片数据
+        thumbnail_kb: 缩略图目标大小（KB）
+        reference_kb: 参考图目标大小（KB）
+        thumbnail_formats: 多尺寸缩略图格式（如 webp/avif）
+
+    Returns:
+        Dict:
+            - thumbnail: JPEG 缩略图（兼容旧的 thumb_<n>.png）
+            - reference: 参考图
+            - sized: {(width, format): 数据}
+    """
+    reference_data = compress_image(image_data, max_size_kb=reference_kb)
+    # 从已缩小的参考图继续压缩缩略图，避免再次处理原图
+    thumbnail_data = compress_image(reference_data, max_size_kb=thumbnail_kb)
+    try:
+        sized = encode_thumbnails(image_data, THUMBNAIL_WIDTHS.values(), thumbnail_formats)
+    except Exception as e:
+        print(f"[图片压缩] 多尺寸缩略图生成失败: {e}")
+        sized = {}
+    return {
+        "thumbnail": thumbnail_data,
+        "reference": reference_data,
+        "sized": sized,
+    }
+
+
+def detect_mimetype(image_data: bytes, default: str = 'image/png') -> str:
+    """根据文件头识别图片 MIME 类型"""
+    if image_data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if image_data.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'image/webp'
+    if image_data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    return default
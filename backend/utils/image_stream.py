@@ -0,0 +1,139 @@
+"""
+服务商图片响应的流式解析
+
+生图接口通常把整张图片以 base64 形式放在 JSON 里（b64_json 字段或 data:image/...;base64, URL）。
+一次性 response.json() 会同时持有原始响应、解码后的字符串、JSON 对象中的字符串、
+正则/切片结果和解码后的图片，2K 图片每页要复制多份数 MB 的数据。
+
+这里按块读取响应：找到第一段 base64 图片数据后边读边解码，只保留解码后的图片字节；
+响应中没有内嵌图片（如返回图片 URL）时，响应体很小，退回到普通 JSON 解析。
+"""
+import base64
+import io
+import json
+import re
+from typing import Any, Iterator, Optional, Tuple
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+# b64_json 字段（值可能带 data URL 前缀）或任意位置的 data:image/...;base64, URL
+_PAYLOAD_START = re.compile(
+    rb'"b64_json"\s*:\s*"(?:data:image/[\w.+-]+;base64,)?|data:image/[\w.+-]+;base64,'
+)
+# base64 字符集之外的字符即为数据结束（引号、右括号、空白等）
+_PAYLOAD_END = re.compile(rb'[^A-Za-z0-9+/=]')
+# 跨块匹配起始标记时需要保留的尾部长度（大于最长的起始标记）
+_MARKER_OVERLAP = 64
+
+
+class _Base64StreamDecoder:
+    """增量 base64 解码，处理 JSON 转义（\\/ 与 \\n）和跨块边界"""
+
+    def __init__(self, out: io.BytesIO):
+        self._out = out
+        # 凑不满 4 个字符、暂不能解码的 base64 字符
+        self._pending = b''
+        # 上一块末尾被切断的转义符
+        self._escape = b''
+
+    def feed(self, data: bytes) -> int:
+        """
+        写入一段数据
+
+        Returns:
+            数据结束位置（相对 data），未结束返回 -1
+        """
+        offset = len(self._escape)
+        data = self._escape + data
+        self._escape = b''
+
+        end = -1
+        match = _PAYLOAD_END.search(data.replace(b'\\/', b'//').replace(b'\\n', b'nn').replace(b'\\r', b'rr'))
+        if match and match.start() == len(data) - 1 and data.endswith(b'\\'):
+            # 转义序列被切断，留到下一块再处理
+            self._escape, data = b'\\', data[:-1]
+        elif match:
+            end = max(0, match.start() - offset)
+            data = data[:match.start()]
+
+        cleaned = data.replace(b'\\/', b'/').replace(b'\\n', b'').replace(b'\\r', b'')
+        buffer = self._pending + cleaned
+        usable = len(buffer) // 4 * 4
+        if usable:
+            self._out.write(base64.b64decode(buffer[:usable]))
+        self._pending = buffer[usable:]
+        return end
+
+    def close(self) -> None:
+        pending = self._pending
+        if pending:
+            self._out.write(base64.b64decode(pending + b'=' * (-len(pending) % 4)))
+        self._pending = b''
+
+
+def _iter_chunks(response: requests.Response) -> Iterator[bytes]:
+    return response.iter_content(chunk_size=CHUNK_SIZE)
+
+
+def read_image_or_json(response: requests.Response) -> Tuple[Optional[bytes], Any]:
+    """
+    流式读取服务商响应，优先提取内嵌的 base64 图片
+
+    请求需以 stream=True 发出。
+
+    Args:
+        response: 状态码为 200 的响应
+
+    Returns:
+        (图片字节, None)：响应中内嵌了 base64 图片
+        (None, JSON 对象)：没有内嵌图片，按普通 JSON 解析（如返回图片 URL）
+
+    Raises:
+        ValueError: 图片数据不完整，或响应不是合法 JSON
+    """
+    chunks = _iter_chunks(response)
+    head = bytearray()
+    image = io.BytesIO()
+    decoder = None
+    search_from = 0
+
+    for chunk in chunks:
+        if decoder is None:
+            head.extend(chunk)
+            match = _PAYLOAD_START.search(head, search_from)
+            if not match:
+                search_from = max(0, len(head) - _MARKER_OVERLAP)
+                continue
+            if len(head) - match.end() < _MARKER_OVERLAP:
+                # 标记后的数据太少，可能切断了 b64_json 值里的 data URL 前缀，再读一块后重新匹配
+                search_from = match.start()
+                continue
+            decoder = _Base64StreamDecoder(image)
+            chunk = bytes(head[match.end():])
+            head.clear()
+
+        if decoder.feed(chunk) >= 0:
+            decoder.close()
+            # 读完剩余响应，连接才能放回连接池复用
+            for _ in chunks:
+                pass
+            break
+    else:
+        if decoder is not None:
+            raise ValueError("图片数据不完整：响应在 base64 数据结束前中断")
+        return None, json.loads(bytes(head))
+
+    image_data = image.getvalue()
+    if not image_data:
+        raise ValueError("API 返回的图片数据为空")
+    return image_data, None
+
+
+def read_body(response: requests.Response) -> bytes:
+    """流式读取响应体（用于图片 URL 下载），避免 response.content 拼接时的额外副本"""
+    output = io.BytesIO()
+    for chunk in _iter_chunks(response):
+        output.write(chunk)
+    return output.getvalue()
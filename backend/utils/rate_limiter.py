@@ -0,0 +1,388 @@
+"""
+服务商自适应限流
+
+原先 text_client / genai_client 的 retry_on_429 在触发 429 的线程里各自做指数退避：
+并发生图的十几个线程同时遇到 429、同时退避、又同时重试，持续撞限流。
+这里按 (服务商, API Key) 维护进程内共享的限流器：
+- 令牌桶控制派发速率，请求按到达顺序排队领取令牌，而不是各自 sleep 后一起重试
+- AIMD：遇到 429 速率减半，之后每次成功按固定步长回升，逼近服务商实际允许的速率；
+  同一批已派发请求返回的多个 429 只减速一次
+- 优先遵循 Retry-After / x-ratelimit-* 响应头给出的冷却时间，冷却期内整个队列暂停，
+  冷却结束时间附加随机抖动；没有响应头时按 base_delay 指数冷却
+- 未配置 rate_limit 时，从未遇到 429（或已较长时间没有遇到）不做任何节流
+- get_rate_limit_stats() 导出当前速率、排队数等状态，供监控面板使用
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Mapping, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# x-ratelimit-reset-* 等响应头中的时长，如 "1s"、"6m0s"、"120ms"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+# Gemini 错误详情中的建议等待时间：RetryInfo.retryDelay "27s" 或 "Please retry in 27.5s"
+_ERROR_RETRY_DELAY = re.compile(
+    r"(?:retry_?delay['\"]?\s*[:=]\s*['\"]?|retry in\s+)(\d+(?:\.\d+)?)\s*s", re.IGNORECASE
+)
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimitError(Exception):
+    """服务商返回 429（速率或配额限制）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if not parts:
+            return None
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    # 部分服务商的 reset 头是 Unix 时间戳
+    if seconds > 1e9:
+        return seconds - time.time()
+    return seconds
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    从响应头解析建议的等待秒数
+
+    依次识别 retry-after-ms、Retry-After（秒数或 HTTP 日期）、x-ratelimit-reset-requests / x-ratelimit-reset
+
+    Args:
+        headers: 响应头
+
+    Returns:
+        等待秒数，没有相关响应头时返回 None
+    """
+    if not headers:
+        return None
+    headers = {str(key).lower(): str(value) for key, value in headers.items()}
+
+    if "retry-after-ms" in headers:
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset"):
+        if name in headers:
+            seconds = _parse_duration(headers[name])
+            if seconds is not None:
+                return max(0.0, seconds)
+    return None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """是否为 429 / 配额限制错误"""
+    if isinstance(error, RateLimitError):
+        return True
+    error_str = str(error).lower()
+    return "429" in error_str or "resource_exhausted" in error_str or "rate limit" in error_str
+
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """从异常中取建议的等待秒数（RateLimitError.retry_after 或错误详情中的 retryDelay）"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    match = _ERROR_RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class AdaptiveRateLimiter:
+    """
+    单个 (服务商, API Key) 的令牌桶 + AIMD 限流器
+
+    速率单位为 次/秒；rate 为 None 表示尚未节流。
+    """
+
+    # 遇到 429 时速率乘以该系数
+    DECREASE_FACTOR = 0.5
+    # 每次成功速率增加 1 次/分钟
+    INCREASE_STEP = 1 / 60
+    # 速率下限：2 次/分钟
+    MIN_RATE = 2 / 60
+    # 没有 Retry-After 时的冷却上限（秒）
+    MAX_COOLDOWN = 60.0
+    # 冷却时间附加的随机抖动比例
+    JITTER = 0.2
+    # 首次遇到 429 时，按最近该时间窗口内的派发速率估算当前速率
+    WINDOW = 30.0
+    # 未配置 rate_limit 时，距上次减速超过该时间（秒）且请求成功则恢复为不节流
+    RECOVER_AFTER = 300.0
+
+    def __init__(self, name: str, rate_limit: Optional[float] = None, burst: float = 1.0):
+        """
+        Args:
+            name: 限流器名称（用于日志和监控）
+            rate_limit: 服务商配置的速率上限（次/分钟），None 表示不限
+            burst: 令牌桶容量
+        """
+        self.name = name
+        self.burst = max(1.0, burst)
+        self._cond = threading.Condition()
+        self._queue: Deque[object] = deque()
+        self._max_rate: Optional[float] = None
+        self._rate: Optional[float] = None
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._consecutive_limited = 0
+        self._recent: Deque[float] = deque(maxlen=1000)
+        self._requests = 0
+        self._rate_limited = 0
+        self._total_wait = 0.0
+        self.configure(rate_limit)
+
+    def configure(self, rate_limit: Optional[float]) -> None:
+        """
+        更新配置的速率上限（配置热加载时调用）
+
+        Args:
+            rate_limit: 次/分钟，None 或 <=0 表示不限
+        """
+        with self._cond:
+            max_rate = float(rate_limit) / 60 if rate_limit and float(rate_limit) > 0 else None
+            if max_rate == self._max_rate:
+                return
+            self._max_rate = max_rate
+            if max_rate is not None and (self._rate is None or self._rate > max_rate):
+                self._refill_locked(time.monotonic())
+                self._rate = max_rate
+            self._cond.notify_all()
+
+    def _refill_locked(self, now: float) -> None:
+        if self._rate is not None and now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = max(self._updated, now)
+
+    def _wait_time_locked(self, now: float) -> float:
+        wait = self._blocked_until - now
+        if self._rate is not None:
+            self._refill_locked(now)
+            wait = max(wait, (1 - self._tokens) / self._rate)
+        return wait
+
+    def acquire(self) -> float:
+        """
+        排队领取一次请求配额，冷却期或令牌不足时阻塞
+
+        Returns:
+            float: 派发时刻（time.monotonic），回报结果时传回
+        """
+        waiter = object()
+        start = time.monotonic()
+        with self._cond:
+            self._queue.append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._queue[0] is not waiter:
+                        self._cond.wait()
+                        continue
+                    wait = self._wait_time_locked(now)
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+
+                if self._rate is not None:
+                    self._tokens -= 1
+                self._requests += 1
+                self._total_wait += now - start
+                self._recent.append(now)
+                return now
+            finally:
+                self._queue.remove(waiter)
+                self._cond.notify_all()
+
+    def on_success(self) -> None:
+        """请求成功：加性增加速率"""
+        with self._cond:
+            self._consecutive_limited = 0
+            if self._rate is None:
+                return
+            now = time.monotonic()
+            if self._max_rate is None and now - self._last_decrease > self.RECOVER_AFTER:
+                self._rate = None
+                self._tokens = self.burst
+                return
+            self._refill_locked(now)
+            self._rate += self.INCREASE_STEP
+            if self._max_rate is not None:
+                self._rate = min(self._rate, self._max_rate)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None, dispatched_at: Optional[float] = None,
+                        base_delay: float = 2.0) -> float:
+        """
+        请求遇到 429：乘性降低速率，并让整个队列冷却
+
+        Args:
+            retry_after: 服务商建议的等待秒数
+            dispatched_at: 该请求的派发时刻（acquire 的返回值）
+            base_delay: 没有 retry_after 时的指数冷却底数
+
+        Returns:
+            float: 从现在起队列暂停的秒数
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._rate_limited += 1
+            self._consecutive_limited += 1
+
+            # 上次减速之前就已派发的请求返回的 429 不再重复减速
+            if dispatched_at is None or dispatched_at >= self._last_decrease:
+                self._refill_locked(now)
+                current = self._rate if self._rate is not None else self._observed_rate_locked(now)
+                self._rate = max(self.MIN_RATE, current * self.DECREASE_FACTOR)
+                self._tokens = min(self._tokens, 0.0)
+                self._last_decrease = now
+                logger.warning(f"[限流] {self.name} 触发 429，速率降至 {self._rate * 60:.1f} 次/分钟")
+
+            if retry_after is None:
+                retry_after = min(self.MAX_COOLDOWN, base_delay ** self._consecutive_limited)
+            blocked_until = now + retry_after + random.uniform(0, retry_after * self.JITTER)
+            # 冷却期间令牌照常补充（不超过桶容量），冷却结束后队首请求立即派发，其余按速率排队
+            self._blocked_until = max(self._blocked_until, blocked_until)
+            self._cond.notify_all()
+            return self._blocked_until - now
+
+    def observe_headers(self, headers: Optional[Mapping[str, str]]) -> None:
+        """
+        根据成功响应的 x-ratelimit-remaining-requests 提前暂停（额度用尽时等到重置）
+
+        Args:
+            headers: 响应头
+        """
+        if not headers:
+            return
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is None or remaining.strip() != "0":
+            return
+        reset = parse_retry_after({"x-ratelimit-reset-requests": headers.get("x-ratelimit-reset-requests", "1s")})
+        with self._cond:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + (reset or 0) + random.uniform(0, self.JITTER))
+            self._cond.notify_all()
+
+    def cooldown_remaining(self) -> float:
+        """距离冷却结束的秒数，不在冷却期时为 0"""
+        with self._cond:
+            return max(0.0, self._blocked_until - time.monotonic())
+
+    def _observed_rate_locked(self, now: float) -> float:
+        recent = [t for t in self._recent if t >= now - self.WINDOW]
+        if len(recent) < 2:
+            return self._max_rate or 1.0
+        return len(recent) / max(now - recent[0], 1.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取限流器状态
+
+        Returns:
+            Dict: rate_per_minute（None 表示未节流）、max_per_minute、queued、cooldown_seconds、
+                  requests、rate_limited、avg_wait_seconds
+        """
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "rate_per_minute": round(self._rate * 60, 2) if self._rate is not None else None,
+                "max_per_minute": round(self._max_rate * 60, 2) if self._max_rate is not None else None,
+                "queued": len(self._queue),
+                "cooldown_seconds": round(max(0.0, self._blocked_until - now), 2),
+                "requests": self._requests,
+                "rate_limited": self._rate_limited,
+                "avg_wait_seconds": round(self._total_wait / self._requests, 3) if self._requests else 0.0,
+            }
+
+
+def call_with_rate_limit(limiter: AdaptiveRateLimiter, func: Callable[[], T], max_retries: int = 3,
+                         base_delay: float = 2.0) -> T:
+    """
+    经由限流器执行请求，遇到 429 时回报限流器并重新排队
+
+    Args:
+        limiter: 限流器
+        func: 发起请求的函数
+        max_retries: 最多尝试次数
+        base_delay: 没有 Retry-After 时的指数冷却底数
+
+    Returns:
+        func 的返回值
+    """
+    for attempt in range(max_retries):
+        dispatched_at = limiter.acquire()
+        try:
+            result = func()
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            delay = limiter.on_rate_limited(retry_after_from_error(e), dispatched_at, base_delay)
+            if attempt >= max_retries - 1:
+                raise
+            logger.warning(f"[重试] {limiter.name} 遇到限流，排队等待 {delay:.1f} 秒后重试 (尝试 {attempt + 2}/{max_retries})")
+            continue
+        limiter.on_success()
+        return result
+    raise ValueError("max_retries 必须大于 0")
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(scope: str, api_key: Optional[str], rate_limit: Optional[float] = None) -> AdaptiveRateLimiter:
+    """
+    获取 (服务商, API Key) 对应的进程级限流器
+
+    Args:
+        scope: 服务商标识（如 "text:https://api.openai.com"、"image:my_provider"）
+        api_key: API Key（只以哈希形式出现在限流器名称中）
+        rate_limit: 配置的速率上限（次/分钟），None 表示不限
+
+    Returns:
+        AdaptiveRateLimiter: 同一服务商与 Key 共享同一个实例
+    """
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+    name = f"{scope}#{key_hash}"
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = AdaptiveRateLimiter(name, rate_limit)
+            return limiter
+    limiter.configure(rate_limit)
+    return limiter
+
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有限流器的状态 {名称: 状态}"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.get_stats() for limiter in limiters}
@@ -0,0 +1,172 @@
+"""
+文本生成响应缓存
+
+大纲、文案生成的结果按内容寻址缓存到 data/response_cache/ 下：
+缓存键由服务商、模型、采样参数、提示词模板哈希和用户输入共同决定，
+同一输入重复提交（返回上一步、前端重试等）直接命中缓存，不再消耗配额。
+
+默认关闭，在 text_providers.yaml 中开启：
+
+    response_cache:
+      enabled: true
+      ttl: 86400        # 过期时间（秒）
+      max_entries: 500  # 最多缓存条数，超出时淘汰最久未使用的条目
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from backend.utils.atomic_file import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+
+
+def hash_bytes(data: bytes) -> str:
+    """计算二进制内容（如参考图片）的哈希，用于组成缓存键"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResponseCache:
+    """磁盘响应缓存（TTL + LRU 淘汰）"""
+
+    def __init__(self, cache_dir: str, ttl: int = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        # key -> 最近访问时间，按访问顺序排列（最久未使用的在前）
+        self._index: Optional["OrderedDict[str, float]"] = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """
+        根据请求参数生成缓存键
+
+        Args:
+            **parts: 服务商、模型、温度、模板哈希、输入等，需可 JSON 序列化
+
+        Returns:
+            sha256 十六进制字符串
+        """
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index_locked(self) -> "OrderedDict[str, float]":
+        """首次访问时扫描缓存目录，按文件修改时间（即最近访问时间）重建 LRU 顺序"""
+        if self._index is None:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    try:
+                        entries.append((os.path.getmtime(os.path.join(self.cache_dir, name)), name[:-5]))
+                    except OSError:
+                        continue
+            entries.sort()
+            self._index = OrderedDict((key, mtime) for mtime, key in entries)
+        return self._index
+
+    def _remove_locked(self, key: str) -> None:
+        self._load_index_locked().pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的响应，未命中或已过期返回 None
+        """
+        with self._lock:
+            index = self._load_index_locked()
+            if key not in index:
+                return None
+
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove_locked(key)
+                return None
+
+            if time.time() - entry.get('created_at', 0) > self.ttl:
+                self._remove_locked(key)
+                return None
+
+            now = time.time()
+            os.utime(path, (now, now))
+            index[key] = now
+            index.move_to_end(key)
+            return entry.get('value')
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            value: 可 JSON 序列化的响应
+        """
+        with self._lock:
+            index = self._load_index_locked()
+            atomic_write_json(self._path(key), {'created_at': time.time(), 'value': value})
+
+            index[key] = time.time()
+            index.move_to_end(key)
+            while len(index) > self.max_entries:
+                oldest = next(iter(index))
+                self._remove_locked(oldest)
+
+    def clear(self) -> None:
+        """清空所有缓存"""
+        with self._lock:
+            for key in list(self._load_index_locked()):
+                self._remove_locked(key)
+
+
+_cache_instance: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache(text_config: Dict[str, Any]) -> Optional[ResponseCache]:
+    """
+    获取响应缓存实例
+
+    Args:
+        text_config: text_providers.yaml 配置
+
+    Returns:
+        未开启缓存时返回 None
+    """
+    global _cache_instance
+    cache_config = text_config.get('response_cache') or {}
+    if not cache_config.get('enabled'):
+        return None
+
+    with _cache_lock:
+        if _cache_instance is None:
+            cache_dir = Path(__file__).parent.parent.parent / 'data' / 'response_cache'
+            _cache_instance = ResponseCache(str(cache_dir))
+        # 配置可能在运行中被修改，每次按最新配置更新
+        _cache_instance.ttl = int(cache_config.get('ttl', DEFAULT_TTL))
+        _cache_instance.max_entries = max(1, int(cache_config.get('max_entries', DEFAULT_MAX_ENTRIES)))
+    return _cache_instance
@@ -1,37 +1,23 @@
 """Text API 客户端封装"""
-import time
-import random
+import json
 import base64
-import requests
 from functools import wraps
-from typing import List, Optional, Union
+from typing import Iterator, List, Optional, Union
 from .image_compressor import compress_image
+from .http_client import get_http_pool
+from .rate_limiter import RateLimitError, call_with_rate_limit, get_rate_limiter, parse_retry_after
 
 
 def retry_on_429(max_retries=3, base_delay=2):
-    """429 错误自动重试装饰器"""
+    """429 错误自动重试装饰器：请求经由客户端共享的限流器排队，限流时整个队列一起冷却"""
     def decorator(func):
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    error_str = str(e)
-                    if "429" in error_str or "rate" in error_str.lower():
-                        if attempt < max_retries - 1:
-                            wait_time = (base_delay ** attempt) + random.uniform(0, 1)
-                            print(f"[重试] 遇到限流，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
-                            time.sleep(wait_time)
-                            continue
-                    raise
-            raise Exception(
-                f"Text API 重试 {max_retries} 次后仍失败。\n"
-                "可能原因：\n"
-                "1. API持续限流或配额不足\n"
-                "2. 网络连接持续不稳定\n"
-                "3. API服务暂时不可用\n"
-                "建议：稍后再试，或联系API服务提供商"
+        def wrapper(self, *args, **kwargs):
+            return call_with_rate_limit(
+                self.rate_limiter,
+                lambda: func(self, *args, **kwargs),
+                max_retries=max_retries,
+                base_delay=base_delay
             )
         return wrapper
     return decorator
@@ -40,7 +26,8 @@ def retry_on_429(max_retries=3, base_delay=2):
 class TextChatClient:
     """Text API 客户端封装类"""
 
-    def __init__(self, api_key: str = None, base_url: str = None, endpoint_type: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None, endpoint_type: str = None,
+                 rate_limit: float = None):
         self.api_key = api_key
         if not self.api_key:
             raise ValueError(
@@ -57,6 +44,9 @@ class TextChatClient:
             endpoint = '/' + endpoint
         self.chat_endpoint = f"{self.base_url}{endpoint}"
 
+        # 同一服务商与 API Key 的所有客户端共享限流器（rate_limit: 次/分钟）
+        self.rate_limiter = get_rate_limiter(f"text:{self.base_url}", self.api_key, rate_limit)
+
     def _encode_image_to_base64(self, image_data: bytes) -> str:
         """将图片数据编码为 base64"""
         return base64.b64encode(image_data).decode('utf-8')
@@ -99,31 +89,17 @@ class TextChatClient:
 
         return content
 
-    @retry_on_429(max_retries=3, base_delay=2)
-    def generate_text(
+    def _build_payload(
         self,
         prompt: str,
-        model: str = "gemini-3-pro-preview",
-        temperature: float = 1.0,
-        max_output_tokens: int = 8000,
+        model: str,
+        temperature: float,
+        max_output_tokens: int,
         images: List[Union[bytes, str]] = None,
         system_prompt: str = None,
-        **kwargs
-    ) -> str:
-        """
-        生成文本（支持图片输入）
-
-        Args:
-            prompt: 提示词
-            model: 模型名称
-            temperature: 温度
-            max_output_tokens: 最大输出 token
-            images: 图片列表（可选）
-            system_prompt: 系统提示词（可选）
-
-        Returns:
-            生成的文本
-        """
+        stream: bool = False
+    ) -> dict:
+        """构建 chat/completions 请求体"""
         messages = []
 
         # 添加系统提示词
@@ -140,97 +116,134 @@ class TextChatClient:
             "content": content
         })
 
-        payload = {
+        return {
             "model": model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_output_tokens,
-            "stream": False
+            "stream": stream
         }
 
+    def _raise_for_status(self, response, model: str) -> None:
+        """请求失败时根据状态码抛出带解决方案的异常"""
+        if response.status_code == 200:
+            self.rate_limiter.observe_headers(response.headers)
+            return
+
+        error_detail = response.text[:500]
+        status_code = response.status_code
+
+        # 根据状态码给出更详细的错误信息
+        if status_code == 401:
+            raise Exception(
+                "❌ API Key 认证失败\n\n"
+                "【可能原因】\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 格式错误（复制时可能包含空格）\n"
+                "3. API Key 被禁用或删除\n\n"
+                "【解决方案】\n"
+                "1. 在系统设置页面检查 API Key 是否正确\n"
+                "2. 重新获取 API Key\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 403:
+            raise Exception(
+                "❌ 权限被拒绝\n\n"
+                "【可能原因】\n"
+                "1. API Key 没有访问该模型的权限\n"
+                "2. 账户配额已用尽\n"
+                "3. 区域限制\n\n"
+                "【解决方案】\n"
+                "1. 检查 API 权限配置\n"
+                "2. 尝试使用其他模型\n"
+                f"\n【原始错误】{error_detail[:200]}"
+            )
+        elif status_code == 404:
+            raise Exception(
+                "❌ 模型不存在或 API 端点错误\n\n"
+                "【可能原因】\n"
+                f"1. 模型 '{model}' 不存在或已下线\n"
+                "2. Base URL 配置错误\n\n"
+                "【解决方案】\n"
+                "1. 检查模型名称是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 429:
+            raise RateLimitError(
+                "⏳ API 配额或速率限制\n\n"
+                "【说明】\n"
+                "请求频率过高或配额已用尽。\n\n"
+                "【解决方案】\n"
+                "1. 稍后再试（等待 1-2 分钟）\n"
+                "2. 检查 API 配额使用情况\n"
+                "3. 考虑升级计划获取更多配额",
+                retry_after=parse_retry_after(response.headers)
+            )
+        elif status_code >= 500:
+            raise Exception(
+                f"⚠️ API 服务器错误 ({status_code})\n\n"
+                "【说明】\n"
+                "这是服务端的临时故障，与您的配置无关。\n\n"
+                "【解决方案】\n"
+                "1. 稍等几分钟后重试\n"
+                "2. 如果持续出现，检查服务商状态页"
+            )
+        else:
+            raise Exception(
+                f"❌ API 请求失败 (状态码: {status_code})\n\n"
+                f"【原始错误】\n{error_detail}\n\n"
+                f"【请求地址】{self.chat_endpoint}\n"
+                f"【模型】{model}\n\n"
+                "【通用解决方案】\n"
+                "1. 检查 API Key 是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                "3. 检查模型名称是否正确"
+            )
+
+    @retry_on_429(max_retries=3, base_delay=2)
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> str:
+        """
+        生成文本（支持图片输入）
+
+        Args:
+            prompt: 提示词
+            model: 模型名称
+            temperature: 温度
+            max_output_tokens: 最大输出 token
+            images: 图片列表（可选）
+            system_prompt: 系统提示词（可选）
+
+        Returns:
+            生成的文本
+        """
+        payload = self._build_payload(
+            prompt, model, temperature, max_output_tokens, images, system_prompt
+        )
+
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
 
-        response = requests.post(
+        response = get_http_pool().post(
             self.chat_endpoint,
             json=payload,
             headers=headers,
             timeout=300  # 5分钟超时
         )
 
-        if response.status_code != 200:
-            error_detail = response.text[:500]
-            status_code = response.status_code
-
-            # 根据状态码给出更详细的错误信息
-            if status_code == 401:
-                raise Exception(
-                    "❌ API Key 认证失败\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 格式错误（复制时可能包含空格）\n"
-                    "3. API Key 被禁用或删除\n\n"
-                    "【解决方案】\n"
-                    "1. 在系统设置页面检查 API Key 是否正确\n"
-                    "2. 重新获取 API Key\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 403:
-                raise Exception(
-                    "❌ 权限被拒绝\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 没有访问该模型的权限\n"
-                    "2. 账户配额已用尽\n"
-                    "3. 区域限制\n\n"
-                    "【解决方案】\n"
-                    "1. 检查 API 权限配置\n"
-                    "2. 尝试使用其他模型\n"
-                    f"\n【原始错误】{error_detail[:200]}"
-                )
-            elif status_code == 404:
-                raise Exception(
-                    "❌ 模型不存在或 API 端点错误\n\n"
-                    "【可能原因】\n"
-                    f"1. 模型 '{model}' 不存在或已下线\n"
-                    "2. Base URL 配置错误\n\n"
-                    "【解决方案】\n"
-                    "1. 检查模型名称是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 429:
-                raise Exception(
-                    "⏳ API 配额或速率限制\n\n"
-                    "【说明】\n"
-                    "请求频率过高或配额已用尽。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍后再试（等待 1-2 分钟）\n"
-                    "2. 检查 API 配额使用情况\n"
-                    "3. 考虑升级计划获取更多配额"
-                )
-            elif status_code >= 500:
-                raise Exception(
-                    f"⚠️ API 服务器错误 ({status_code})\n\n"
-                    "【说明】\n"
-                    "这是服务端的临时故障，与您的配置无关。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍等几分钟后重试\n"
-                    "2. 如果持续出现，检查服务商状态页"
-                )
-            else:
-                raise Exception(
-                    f"❌ API 请求失败 (状态码: {status_code})\n\n"
-                    f"【原始错误】\n{error_detail}\n\n"
-                    f"【请求地址】{self.chat_endpoint}\n"
-                    f"【模型】{model}\n\n"
-                    "【通用解决方案】\n"
-                    "1. 检查 API Key 是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    "3. 检查模型名称是否正确"
-                )
+        self._raise_for_status(response, model)
 
         result = response.json()
 
@@ -248,6 +261,72 @@ class TextChatClient:
                 "建议：检查API文档确认响应格式"
             )
 
+    @retry_on_429(max_retries=3, base_delay=2)
+    def _open_stream(self, payload: dict):
+        """发起流式请求，状态码异常（含 429）在收到第一个 token 前重试"""
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+        response = get_http_pool().post(
+            self.chat_endpoint,
+            json=payload,
+            headers=headers,
+            stream=True,
+            timeout=300  # 两个数据块之间的最长等待时间
+        )
+
+        try:
+            self._raise_for_status(response, payload["model"])
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（"stream": true，逐个返回增量文本）
+
+        参数同 generate_text。
+
+        Yields:
+            str: 新生成的文本片段
+        """
+        payload = self._build_payload(
+            prompt, model, temperature, max_output_tokens, images, system_prompt, stream=True
+        )
+        response = self._open_stream(payload)
+
+        try:
+            for line in response.iter_lines(decode_unicode=False):
+                # SSE 格式：data: {...}，以 data: [DONE] 结束；忽略空行和注释行
+                if not line or not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+
+                chunk = json.loads(data.decode("utf-8"))
+                if chunk.get("error"):
+                    raise Exception(f"Text API 流式响应错误: {str(chunk['error'])[:500]}")
+                for choice in chunk.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+        finally:
+            response.close()
+
 
 def get_text_chat_client(provider_config: dict):
     """
@@ -259,6 +338,7 @@ def get_text_chat_client(provider_config: dict):
             - api_key: API密钥
             - base_url: API基础URL（可选）
             - endpoint_type: 自定义端点路径（可选）
+            - rate_limit: 速率上限，次/分钟（可选）
 
     Returns:
         GenAIClient 或 TextChatClient
@@ -267,9 +347,12 @@ def get_text_chat_client(provider_config: dict):
     api_key = provider_config.get('api_key')
     base_url = provider_config.get('base_url')
     endpoint_type = provider_config.get('endpoint_type')
+    rate_limit = provider_config.get('rate_limit')
 
     if provider_type == 'google_gemini':
         from .genai_client import GenAIClient
-        return GenAIClient(api_key=api_key, base_url=base_url)
+        return GenAIClient(api_key=api_key, base_url=base_url, rate_limit=rate_limit)
     else:
-        return TextChatClient(api_key=api_key, base_url=base_url, endpoint_type=endpoint_type)
+        return TextChatClient(
+            api_key=api_key, base_url=base_url, endpoint_type=endpoint_type, rate_limit=rate_limit
+        )
@@ -0,0 +1,304 @@
+"""
+流式 ZIP 打包
+
+在内存中构建完整 ZIP 再 send_file，一篇 15 页的 2K 图文每个下载请求要占用数十 MB 内存，
+并且要等全部打包完才开始传输。这里让 zipfile 写入一个不可 seek 的缓冲区（条目使用数据描述符），
+逐块读取磁盘文件、边写边把缓冲区中的数据交给响应，内存占用与文件大小无关。
+
+PNG/JPEG 等已压缩的图片用 ZIP_STORED 直接存储，不再浪费 CPU 做几乎无效的 deflate；
+其他内容（如 JSON 清单）仍使用 ZIP_DEFLATED。
+
+打包大量文件时可以开启预读（read_ahead）：后台线程提前读取后续几个文件，
+每个文件最多缓存几块，网络盘/冷缓存上的读取延迟与输出重叠，内存占用仍有固定上限。
+
+需要 Content-Length 时用 pin_files 提前打开文件：大小与输出内容都来自同一个文件句柄，
+打包过程中图片被重新生成（原子替换为新文件）也不会让实际输出与预先计算的长度不一致。
+"""
+import os
+import queue
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple, Union
+
+CHUNK_SIZE = 64 * 1024
+
+# 已压缩格式，deflate 几乎不能再减小体积
+_COMPRESSED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".avif", ".gif", ".zip")
+
+# 不可 seek 输出时 zipfile 的各部分长度（非 ZIP64）：本地文件头、数据描述符、中央目录项、目录结束记录
+_LOCAL_HEADER_SIZE = 30
+_DATA_DESCRIPTOR_SIZE = 16
+_CENTRAL_HEADER_SIZE = 46
+_END_RECORD_SIZE = 22
+
+
+
+class PinnedFile:
+    """
+    已打开的磁盘文件，内容与大小固定为打开时的版本
+
+    图片都通过原子替换写入，替换后旧的文件句柄仍指向原来的内容；
+    大小取自打开后的 fstat，输出时最多读取这么多字节。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        stat = os.fstat(self._file.fileno())
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mode = stat.st_mode
+
+    def zip_info(self, arcname: str) -> zipfile.ZipInfo:
+        """同 ZipInfo.from_file，但使用打开时的文件属性"""
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime(self.mtime)[:6])
+        info.external_attr = (self.mode & 0xFFFF) << 16
+        info.file_size = self.size
+        return info
+
+    def read_chunks(self) -> Iterator[bytes]:
+        remaining = self.size
+        while remaining > 0:
+            chunk = self._file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"文件在打包过程中被截断: {self.path}")
+            remaining -= len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# 归档源：磁盘文件路径、已固定的文件，或内存中的小块数据
+ZipSource = Union[str, bytes, PinnedFile]
+
+
+class _ChunkSink:
+    """zipfile 的输出目标：不可 seek，写入的数据暂存，由生成器取走"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _read_chunks(source: Union[str, PinnedFile]) -> Iterator[bytes]:
+    if isinstance(source, PinnedFile):
+        yield from source.read_chunks()
+        return
+    with open(source, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class _ReadAhead:
+    """
+    有界并发的文件预读
+
+    最多同时读取 workers 个文件（当前文件及其后的文件），每个文件最多缓存 max_chunks 块，
+    缓存满时读线程阻塞等待消费。close() 通知读线程退出（客户端中途断开时由生成器关闭触发）。
+    """
+
+    _END = object()
+
+    def __init__(self, entries: Iterable[Tuple[str, "ZipSource"]], workers: int, max_chunks: int = 4):
+        self._entries = iter(entries)
+        self._workers = workers
+        self._max_chunks = max_chunks
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zip-read")
+        self._pending: Deque[Tuple[str, "ZipSource", Optional[queue.Queue]]] = deque()
+        self._in_flight = 0
+        self._closed = threading.Event()
+
+    def _put(self, chunks: queue.Queue, item) -> bool:
+        while not self._closed.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self, source: Union[str, PinnedFile], chunks: queue.Queue) -> None:
+        try:
+            for chunk in _read_chunks(source):
+                if not self._put(chunks, chunk):
+                    return
+        except Exception as e:
+            self._put(chunks, e)
+            return
+        self._put(chunks, self._END)
+
+    def _fill(self) -> None:
+        # 只在当前文件之后保持 workers 个文件在读，保证正在消费的文件一定有线程在读
+        while self._in_flight < self._workers:
+            try:
+                arcname, source = next(self._entries)
+            except StopIteration:
+                return
+            chunks = None
+            if not isinstance(source, bytes):
+                chunks = queue.Queue(maxsize=self._max_chunks)
+                self._executor.submit(self._read, source, chunks)
+                self._in_flight += 1
+            self._pending.append((arcname, source, chunks))
+
+    def _drain(self, chunks: queue.Queue) -> Iterator[bytes]:
+        try:
+            while True:
+                item = chunks.get()
+                if item is self._END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self._in_flight -= 1
+
+    def __iter__(self) -> Iterator[Tuple[str, "ZipSource", Optional[Iterator[bytes]]]]:
+        while True:
+            self._fill()
+            if not self._pending:
+                return
+            arcname, source, chunks = self._pending.popleft()
+            yield arcname, source, self._drain(chunks) if chunks is not None else None
+
+    def close(self) -> None:
+        self._closed.set()
+        self._executor.shutdown(wait=False)
+
+
+def compress_type_for(arcname: str) -> int:
+    """已压缩的图片直接存储，其余内容 deflate"""
+    return zipfile.ZIP_STORED if arcname.lower().endswith(_COMPRESSED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries: Iterable[Tuple[str, ZipSource]], read_ahead: int = 0) -> Iterator[bytes]:
+    """
+    流式生成 ZIP 归档
+
+    Args:
+        entries: (归档内文件名, 文件路径或数据) 序列，可以是惰性生成器
+        read_ahead: 并发预读的文件数，0 表示在当前线程中顺序读取
+
+    Yields:
+        bytes: ZIP 数据块（每块约 CHUNK_SIZE）
+    """
+    if read_ahead > 0:
+        reader = _ReadAhead(entries, read_ahead)
+        sources = iter(reader)
+    else:
+        reader = None
+        sources = ((arcname, source, None) for arcname, source in entries)
+
+    sink = _ChunkSink()
+    try:
+        with zipfile.ZipFile(sink, "w") as zf:
+            for arcname, source, chunks in sources:
+                if isinstance(source, bytes):
+                    info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                    info.compress_type = compress_type_for(arcname)
+                    zf.writestr(info, source)
+                else:
+                    if isinstance(source, PinnedFile):
+                        info = source.zip_info(arcname)
+                    else:
+                        info = zipfile.ZipInfo.from_file(source, arcname)
+                    info.compress_type = compress_type_for(arcname)
+                    with zf.open(info, "w") as dst:
+                        for chunk in chunks if chunks is not None else _read_chunks(source):
+                            dst.write(chunk)
+                            if len(sink) >= CHUNK_SIZE:
+                                yield sink.take()
+                if len(sink):
+                    yield sink.take()
+        # 中央目录
+        yield sink.take()
+    finally:
+        if reader is not None:
+            reader.close()
+
+
+def pin_files(entries: Iterable[Tuple[str, str]]) -> List[Tuple[str, PinnedFile]]:
+    """
+    提前打开要打包的文件，固定其内容与大小（已不存在的文件跳过）
+
+    调用方负责在输出结束后 close_pinned()。
+
+    Args:
+        entries: (归档内文件名, 文件路径) 序列
+
+    Returns:
+        (归档内文件名, PinnedFile) 列表
+    """
+    pinned = []
+    try:
+        for arcname, path in entries:
+            try:
+                pinned.append((arcname, PinnedFile(path)))
+            except FileNotFoundError:
+                continue
+    except Exception:
+        close_pinned(pinned)
+        raise
+    return pinned
+
+
+def close_pinned(entries: Iterable[Tuple[str, ZipSource]]) -> None:
+    """关闭 pin_files 打开的文件"""
+    for _, source in entries:
+        if isinstance(source, PinnedFile):
+            source.close()
+
+
+def stored_zip_size(entries: List[Tuple[str, Union[str, PinnedFile]]]) -> Optional[int]:
+    """
+    预先计算 stream_zip 输出的精确字节数，用于 Content-Length
+
+    只有所有条目都以 ZIP_STORED 存储（大小不随压缩变化）且不需要 ZIP64 时才能计算。
+    传入文件路径时大小在调用时读取，文件之后被改写会导致长度不一致，需要精确长度时应传入 pin_files 的结果。
+
+    Args:
+        entries: (归档内文件名, 文件路径或 PinnedFile) 列表
+
+    Returns:
+        归档大小，无法预先确定时返回 None
+    """
+    if len(entries) >= 0xFFFF:
+        return None
+
+    total = _END_RECORD_SIZE
+    for arcname, path in entries:
+        if compress_type_for(arcname) != zipfile.ZIP_STORED:
+            return None
+        size = path.size if isinstance(path, PinnedFile) else os.path.getsize(path)
+        # zipfile 在文件大小接近 4GB 时会为条目启用 ZIP64 扩展字段
+        if size * 1.05 > zipfile.ZIP64_LIMIT:
+            return None
+        name_length = len(arcname.encode("utf-8"))
+        total += _LOCAL_HEADER_SIZE + name_length + size + _DATA_DESCRIPTOR_SIZE
+        total += _CENTRAL_HEADER_SIZE + name_length
+
+    # 中央目录偏移超过 4GB 时同样需要 ZIP64
+    if total > zipfile.ZIP64_LIMIT:
+        return None
+    return total
@@ -12,6 +12,7 @@ export interface OutlineResponse {
   success: boolean
   outline?: string
   pages?: Page[]
+  from_cache?: boolean
   error?: string
 }
 
@@ -79,6 +80,200 @@ export async function generateOutline(
   return response.data
 }
 
+// 流式生成大纲（SSE）：逐字返回文本，每写完一页立即回调该页，最终返回完整结果
+export async function generateOutlineStream(
+  topic: string,
+  images: File[] | undefined,
+  inputMode: 'topic' | 'free_text',
+  callbacks: {
+    onToken?: (text: string) => void
+    onPage?: (page: Page) => void
+  } = {}
+): Promise<OutlineResponse & { has_images?: boolean }> {
+  let body: FormData | string
+  const headers: Record<string, string> = { 'Accept': 'text/event-stream' }
+
+  if (images && images.length > 0) {
+    const formData = new FormData()
+    formData.append('topic', topic)
+    formData.append('input_mode', inputMode)
+    images.forEach((file) => {
+      formData.append('images', file)
+    })
+    body = formData
+  } else {
+    headers['Content-Type'] = 'application/json'
+    body = JSON.stringify({ topic, input_mode: inputMode })
+  }
+
+  const response = await fetch(`${API_BASE_URL}/outline`, {
+    method: 'POST',
+    headers,
+    body
+  })
+
+  // 参数错误等情况后端直接返回 JSON
+  if (!(response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+    return await response.json()
+  }
+
+  const reader = response.body?.getReader()
+  if (!reader) {
+    throw new Error('无法读取响应流')
+  }
+
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result: OutlineResponse & { has_images?: boolean } = { success: false, error: '大纲生成未完成' }
+
+  while (true) {
+    const { done, value } = await reader.read()
+
+    if (done) break
+
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n\n')
+    buffer = lines.pop() || ''
+
+    for (const line of lines) {
+      if (!line.trim()) continue
+
+      const [eventLine, dataLine] = line.split('\n')
+      if (!eventLine || !dataLine) continue
+
+      const eventType = eventLine.replace('event: ', '').trim()
+      const eventData = dataLine.replace('data: ', '').trim()
+
+      try {
+        const data = JSON.parse(eventData)
+
+        switch (eventType) {
+          case 'token':
+            callbacks.onToken?.(data.text)
+            break
+          case 'page':
+            callbacks.onPage?.(data)
+            break
+          case 'done':
+          case 'error':
+            result = data
+            break
+        }
+      } catch (e) {
+        console.error('解析 SSE 数据失败:', e)
+      }
+    }
+  }
+
+  return result
+}
+
+// 从主题直接生成大纲和图片（SSE）：每写完一页立即开始生成该页图片
+export async function generateOutlineAndImages(
+  topic: string,
+  images: File[] | undefined,
+  inputMode: 'topic' | 'free_text',
+  taskId: string,
+  callbacks: {
+    onOutlinePage?: (page: Page) => void
+    onOutlineDone?: (result: OutlineResponse) => void
+    onProgress?: (event: ProgressEvent) => void
+    onComplete?: (event: ProgressEvent) => void
+    onError?: (event: ProgressEvent) => void
+  } = {}
+): Promise<{ success: boolean; task_id?: string; images?: string[]; failed_indices?: number[]; error?: string }> {
+  let body: FormData | string
+  const headers: Record<string, string> = {}
+
+  if (images && images.length > 0) {
+    const formData = new FormData()
+    formData.append('topic', topic)
+    formData.append('input_mode', inputMode)
+    formData.append('task_id', taskId)
+    images.forEach((file) => {
+      formData.append('images', file)
+    })
+    body = formData
+  } else {
+    headers['Content-Type'] = 'application/json'
+    body = JSON.stringify({ topic, input_mode: inputMode, task_id: taskId })
+  }
+
+  const response = await fetch(`${API_BASE_URL}/outline/pipeline`, {
+    method: 'POST',
+    headers,
+    body
+  })
+
+  if (!(response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+    return await response.json()
+  }
+
+  const reader = response.body?.getReader()
+  if (!reader) {
+    throw new Error('无法读取响应流')
+  }
+
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result: { success: boolean; error?: string } = { success: false, error: '生成未完成' }
+
+  while (true) {
+    const { done, value } = await reader.read()
+
+    if (done) break
+
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n\n')
+    buffer = lines.pop() || ''
+
+    for (const line of lines) {
+      if (!line.trim()) continue
+
+      const [eventLine, dataLine] = line.split('\n')
+      if (!eventLine || !dataLine) continue
+
+      const eventType = eventLine.replace('event: ', '').trim()
+      const eventData = dataLine.replace('data: ', '').trim()
+
+      try {
+        const data = JSON.parse(eventData)
+
+        switch (eventType) {
+          case 'outline_page':
+            callbacks.onOutlinePage?.(data)
+            break
+          case 'outline_done':
+            callbacks.onOutlineDone?.(data)
+            break
+          case 'outline_error':
+            result = data
+            break
+          case 'progress':
+            callbacks.onProgress?.(data)
+            break
+          case 'complete':
+            callbacks.onComplete?.(data)
+            break
+          case 'error':
+            callbacks.onError?.(data)
+            break
+          case 'finish':
+            // 大纲失败时没有任何页面，保留大纲的错误信息
+            if (data.total > 0 || !result.error) {
+              result = data
+            }
+            break
+        }
+      } catch (e) {
+        console.error('解析 SSE 数据失败:', e)
+      }
+    }
+  }
+
+  return result
+}
+
 // 获取图片 URL（新格式：task_id/filename）
 // thumbnail 参数：true=缩略图（默认），false=原图
 export function getImageUrl(taskId: string, filename: string, thumbnail: boolean = true): string {
@@ -429,6 +624,62 @@ export async function getHistoryList(
   }
 }
 
+/**
+ * 游标分页获取历史记录（用于无限滚动）
+ *
+ * 第一页不传 cursor，之后传上一页返回的 next_cursor；
+ * 后续页的状态过滤和排序以游标为准，翻到多深耗时都相同
+ *
+ * @param cursor - 上一页返回的 next_cursor，第一页传 null
+ * @param pageSize - 每页数量
+ * @param options - 状态过滤、排序字段/方向、只返回的字段（如 ['id', 'title', 'thumbnail', 'status']）
+ *
+ * @returns Promise 包含当前页记录和下一页游标
+ */
+export async function getHistoryListByCursor(
+  cursor: string | null,
+  pageSize: number = 20,
+  options: {
+    status?: string
+    sort?: 'created' | 'updated' | 'title'
+    order?: 'asc' | 'desc'
+    fields?: string[]
+  } = {}
+): Promise<{
+  success: boolean
+  records: Partial<HistoryRecord>[]
+  total: number
+  next_cursor: string | null
+  has_more: boolean
+  error?: string
+}> {
+  try {
+    const params: any = { cursor: cursor || '', page_size: pageSize }
+    if (options.status) params.status = options.status
+    if (options.sort) params.sort = options.sort
+    if (options.order) params.order = options.order
+    if (options.fields?.length) params.fields = options.fields.join(',')
+
+    const response = await axios.get(`${API_BASE_URL}/history`, {
+      params,
+      timeout: 10000 // 10秒超时
+    })
+    return response.data
+  } catch (error: any) {
+    let errorMessage = '未知错误，请稍后重试'
+    if (axios.isAxiosError(error)) {
+      if (error.code === 'ECONNABORTED') {
+        errorMessage = '请求超时，请检查网络连接'
+      } else if (!error.response) {
+        errorMessage = '网络连接失败，请检查网络设置'
+      } else {
+        errorMessage = error.response?.data?.error || error.message || '获取历史记录列表失败'
+      }
+    }
+    return { success: false, records: [], total: 0, next_cursor: null, has_more: false, error: errorMessage }
+  }
+}
+
 /**
  * 获取历史记录详情
  *
@@ -605,20 +856,35 @@ export async function deleteHistory(recordId: string): Promise<{
 /**
  * 搜索历史记录
  *
- * 根据关键词搜索历史记录标题
+ * 在标题、大纲、文案和标签中全文检索，结果按相关度排序
  *
  * @param keyword - 搜索关键词
+ * @param page - 页码，从 1 开始
+ * @param pageSize - 每页数量
+ * @param status - 可选的状态过滤
  *
- * @returns Promise 包含匹配的历史记录列表
+ * @returns Promise 包含当前页的匹配记录和分页信息
  */
-export async function searchHistory(keyword: string): Promise<{
+export async function searchHistory(
+  keyword: string,
+  page: number = 1,
+  pageSize: number = 20,
+  status?: string
+): Promise<{
   success: boolean
   records: HistoryRecord[]
+  total?: number
+  page?: number
+  page_size?: number
+  total_pages?: number
   error?: string
 }> {
   try {
+    const params: any = { keyword, page, page_size: pageSize }
+    if (status) params.status = status
+
     const response = await axios.get(`${API_BASE_URL}/history/search`, {
-      params: { keyword },
+      params,
       timeout: 10000 // 10秒超时
     })
     return response.data
@@ -770,18 +1036,75 @@ export async function generateImagesPost(
   }
 }
 
-// 扫描所有任务并同步图片列表
-export async function scanAllTasks(): Promise<{
+// 扫描所有任务并同步图片列表（SSE 流式返回，未变化的任务由后端跳过）
+export async function scanAllTasks(
+  onTask?: (result: any) => void
+): Promise<{
   success: boolean
   total_tasks?: number
   synced?: number
+  skipped?: number
   failed?: number
   orphan_tasks?: string[]
-  results?: any[]
   error?: string
 }> {
-  const response = await axios.post(`${API_BASE_URL}/history/scan-all`)
-  return response.data
+  const response = await fetch(`${API_BASE_URL}/history/scan-all`, {
+    method: 'POST',
+    headers: {
+      'Accept': 'text/event-stream',
+    }
+  })
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+
+  const reader = response.body?.getReader()
+  if (!reader) {
+    throw new Error('无法读取响应流')
+  }
+
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let summary: any = { success: false, error: '扫描未完成' }
+
+  while (true) {
+    const { done, value } = await reader.read()
+
+    if (done) break
+
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n\n')
+    buffer = lines.pop() || ''
+
+    for (const line of lines) {
+      if (!line.trim()) continue
+
+      const [eventLine, dataLine] = line.split('\n')
+      if (!eventLine || !dataLine) continue
+
+      const eventType = eventLine.replace('event: ', '').trim()
+      const eventData = dataLine.replace('data: ', '').trim()
+
+      try {
+        const data = JSON.parse(eventData)
+
+        switch (eventType) {
+          case 'task':
+            onTask?.(data)
+            break
+          case 'finish':
+          case 'error':
+            summary = data
+            break
+        }
+      } catch (e) {
+        console.error('解析 SSE 数据失败:', e)
+      }
+    }
+  }
+
+  return summary
 }
 
 // ==================== 配置管理 API ====================
@@ -840,6 +1163,7 @@ export interface ContentResponse {
   titles?: string[]
   copywriting?: string
   tags?: string[]
+  from_cache?: boolean
   error?: string
 }
 
@@ -330,9 +330,8 @@ export const useGeneratorStore = defineStore('generator', {
     updateImage(index: number, newUrl: string) {
       const image = this.images.find(img => img.index === index)
       if (image) {
-        // 添加时间戳避免缓存
-        const timestamp = Date.now()
-        image.url = `${newUrl}?t=${timestamp}`
+        // 后端返回的 URL 已带版本号，重新生成后自动绕过缓存
+        image.url = newUrl
         image.status = 'done'
         delete image.error
       }
@@ -0,0 +1,98 @@
+"""
+历史记录多进程并发测试
+
+模拟多个 gunicorn worker 共享同一个 history/ 目录，同时创建和更新记录，
+验证索引和记录文件中没有丢失任何写入
+"""
+import multiprocessing
+import sys
+from typing import Any, Dict
+
+import pytest
+
+from backend.services.history import HistoryService
+from backend.services.history_store import JsonHistoryStore
+
+PROCESS_COUNT = 4
+RECORDS_PER_PROCESS = 15
+
+
+def _shared_update(worker: int, n: int) -> Dict[str, Any]:
+    """每个进程只修改共享记录的一个字段，任何一次读改写被覆盖都会在最终结果中体现"""
+    return [
+        {"title": f"worker{worker}-shared-{n}"},
+        {"status": f"step{n}"},
+        {"thumbnail": f"{n}.png"},
+        {"images": {"task_id": "task_shared", "generated": [f"{n}.png"]}},
+    ][worker]
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="跨进程文件锁依赖 fcntl")
+
+
+def _worker(history_dir: str, backend: str, worker: int, shared_id: str, barrier) -> None:
+    service = HistoryService(history_dir, backend)
+    barrier.wait()
+
+    for n in range(RECORDS_PER_PROCESS):
+        record_id = service.create_record(
+            topic=f"worker{worker}-{n}",
+            outline={"raw": "", "pages": [{"index": 0, "content": "p0"}, {"index": 1, "content": "p1"}]},
+            task_id=f"task_{worker}_{n}"
+        )
+        assert service.update_record(record_id, status="generating")
+        assert service.update_record(
+            record_id,
+            images={"task_id": f"task_{worker}_{n}", "generated": ["0.png", "1.png"]},
+            status="completed",
+            thumbnail="0.png"
+        )
+        # 同时更新一条共享记录，制造同一记录上的读改写竞争
+        assert service.update_record(shared_id, **_shared_update(worker, n))
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_processes_do_not_lose_updates(temp_history_dir, backend, monkeypatch):
+    """多个进程同时创建/更新记录后，所有记录和最终状态都完整保留"""
+    # 调低日志合并阈值，让合并与其他进程的追加频繁交错
+    monkeypatch.setattr(JsonHistoryStore, "JOURNAL_COMPACT_BYTES", 4096)
+    parent = HistoryService(temp_history_dir, backend)
+    shared_id = parent.create_record(topic="shared", outline={"raw": "", "pages": []})
+    # 父进程先加载快照，之后的写入全部来自子进程，用于验证快照失效检测
+    assert parent.get_statistics()["total"] == 1
+
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(PROCESS_COUNT)
+    processes = [
+        ctx.Process(target=_worker, args=(temp_history_dir, backend, worker, shared_id, barrier))
+        for worker in range(PROCESS_COUNT)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(timeout=120)
+    assert all(p.exitcode == 0 for p in processes), [p.exitcode for p in processes]
+
+    expected = PROCESS_COUNT * RECORDS_PER_PROCESS
+    for service in (parent, HistoryService(temp_history_dir, backend)):
+        stats = service.get_statistics()
+        assert stats["total"] == expected + 1
+        assert stats["by_status"].get("completed") == expected
+        assert stats["by_status"].get(f"step{RECORDS_PER_PROCESS - 1}") == 1
+
+        listed = service.list_records(page=1, page_size=expected + 10)["records"]
+        titles = {r["title"] for r in listed}
+        assert {f"worker{w}-{n}" for w in range(PROCESS_COUNT) for n in range(RECORDS_PER_PROCESS)} <= titles
+
+        for row in listed:
+            if row["id"] == shared_id:
+                continue
+            record = service.get_record(row["id"])
+            assert record["status"] == "completed"
+            assert record["images"]["generated"] == ["0.png", "1.png"]
+            assert row["thumbnail"] == "0.png"
+
+        shared = service.get_record(shared_id)
+        for worker in range(PROCESS_COUNT):
+            for field, value in _shared_update(worker, RECORDS_PER_PROCESS - 1).items():
+                assert shared[field] == value, field
+        assert len(service.store.get_task_index()) == expected + 1
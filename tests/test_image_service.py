@@ -0,0 +1,323 @@
+"""
+图片生成服务测试
+
+使用桩生成器模拟服务商，验证多任务并发时的任务隔离与多 Key 失败转移
+"""
+import io
+import os
+import random
+import threading
+import time
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+from backend.config import Config
+from backend.generators.base import ImageGeneratorBase
+from backend.generators.factory import ImageGeneratorFactory
+from backend.services import image as image_module
+from backend.services.image import ImageService
+from backend.services.provider_pool import get_provider_pool_stats
+from backend.utils.rate_limiter import RateLimitError
+
+
+class StubGenerator(ImageGeneratorBase):
+    """桩生成器：把 prompt 中的用户主题写入 PNG 元数据，随机延迟模拟网络耗时"""
+
+    def validate_config(self) -> bool:
+        return True
+
+    def generate_image(self, prompt: str, **kwargs) -> bytes:
+        time.sleep(random.uniform(0, 0.02))
+        marker = next(
+            line for line in prompt.splitlines() if line.startswith("TOPIC:")
+        )
+        info = PngImagePlugin.PngInfo()
+        info.add_text("marker", marker)
+        output = io.BytesIO()
+        Image.new("RGB", (8, 8), (255, 255, 255)).save(output, format="PNG", pnginfo=info)
+        return output.getvalue()
+
+
+@pytest.fixture
+def stub_image_service(monkeypatch, temp_history_dir):
+    """基于桩生成器构建的 ImageService，输出目录指向临时目录"""
+    monkeypatch.setitem(ImageGeneratorFactory.GENERATORS, "stub", StubGenerator)
+    monkeypatch.setattr(Config, "get_active_image_provider", classmethod(lambda cls: "stub"))
+    monkeypatch.setattr(
+        Config,
+        "get_image_provider_config",
+        classmethod(lambda cls, name=None: {"type": "stub", "api_key": "test", "max_concurrent": 4})
+    )
+    monkeypatch.setattr(image_module, "_scheduler_instance", None)
+
+    service = ImageService()
+    service.history_root_dir = temp_history_dir
+    return service
+
+
+def _read_marker(filepath: str) -> str:
+    with Image.open(filepath) as img:
+        return img.text["marker"]
+
+
+def test_concurrent_tasks_do_not_share_output_dirs(stub_image_service, temp_history_dir):
+    """N 个任务同时生成，每个文件都只能落在自己的任务目录中"""
+    task_count = 8
+    page_count = 6
+    errors = []
+
+    def run_task(n: int):
+        task_id = f"task_stress_{n}"
+        pages = [
+            {"index": i, "type": "cover" if i == 0 else "content", "content": f"page {i}"}
+            for i in range(page_count)
+        ]
+        try:
+            events = list(stub_image_service.generate_images(
+                pages, task_id, full_outline="outline", user_topic=f"\nTOPIC:{task_id}"
+            ))
+            finish = events[-1]["data"]
+            assert finish["success"], finish
+            assert finish["completed"] == page_count
+        except Exception as e:  # 线程内异常带回主线程断言
+            errors.append(e)
+
+    threads = [threading.Thread(target=run_task, args=(n,)) for n in range(task_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors, errors
+
+    for n in range(task_count):
+        task_id = f"task_stress_{n}"
+        task_dir = os.path.join(temp_history_dir, task_id)
+        files = sorted(f for f in os.listdir(task_dir) if not f.startswith("thumb_"))
+        assert files == sorted(f"{i}.png" for i in range(page_count))
+        for filename in files:
+            assert _read_marker(os.path.join(task_dir, filename)) == f"TOPIC:{task_id}"
+
+        state = stub_image_service.get_task_state(task_id).get_state()
+        assert len(state["generated"]) == page_count
+        assert state["has_cover"]
+
+    stats = stub_image_service.scheduler.get_stats()
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_retry_uses_its_own_task_dir(stub_image_service, temp_history_dir):
+    """重试时不依赖服务实例上的"当前任务"目录"""
+    list(stub_image_service.generate_images(
+        [{"index": 0, "type": "cover", "content": "a"}], "task_a", user_topic="\nTOPIC:task_a"
+    ))
+    list(stub_image_service.generate_images(
+        [{"index": 0, "type": "cover", "content": "b"}], "task_b", user_topic="\nTOPIC:task_b"
+    ))
+
+    result = stub_image_service.retry_single_image(
+        "task_a", {"index": 1, "type": "content", "content": "retry"}
+    )
+
+    assert result["success"]
+    assert _read_marker(os.path.join(temp_history_dir, "task_a", "1.png")) == "TOPIC:task_a"
+    assert not os.path.exists(os.path.join(temp_history_dir, "task_b", "1.png"))
+
+
+def test_pipeline_dispatches_content_pages_with_cover(stub_image_service, monkeypatch):
+    """流水线模式下，不依赖参考图的内容页无需等待封面完成"""
+    content_started = threading.Event()
+    original = StubGenerator.generate_image
+
+    def generate_image(self, prompt: str, **kwargs) -> bytes:
+        if "cover page" in prompt:
+            # 封面必须等到内容页已开始生成才返回，串行模式下会超时
+            assert content_started.wait(timeout=5)
+        else:
+            content_started.set()
+        return original(self, prompt, **kwargs)
+
+    monkeypatch.setattr(StubGenerator, "generate_image", generate_image)
+
+    pages = [
+        {"index": 0, "type": "cover", "content": "cover page"},
+        {"index": 1, "type": "content", "content": "content page 1"},
+        {"index": 2, "type": "content", "content": "content page 2"},
+    ]
+    events = list(stub_image_service.generate_images(
+        pages, "task_pipeline", user_topic="\nTOPIC:task_pipeline", pipeline=True
+    ))
+
+    finish = events[-1]["data"]
+    assert finish["success"], finish
+    assert finish["completed"] == 3
+    assert stub_image_service.get_task_state("task_pipeline").cover_image is not None
+
+
+def test_streaming_pipeline_starts_cover_before_outline_finishes(stub_image_service, temp_history_dir):
+    """大纲还在生成后续页面时，封面已经生成完成"""
+    task_id = "task_streaming"
+    page_count = 5
+    cover_path = os.path.join(temp_history_dir, task_id, "0.png")
+    cover_ready_during_outline = []
+
+    def outline_events():
+        for i in range(page_count):
+            page = {"index": i, "type": "cover" if i == 0 else "content", "content": f"page {i}"}
+            yield {"event": "token", "data": {"text": f"<page>page {i}\n"}}
+            yield {"event": "page", "data": page}
+            if i == 0:
+                # 模拟大模型仍在撰写：封面图片落盘后才继续输出后续页面
+                deadline = time.time() + 5
+                while not os.path.exists(cover_path) and time.time() < deadline:
+                    time.sleep(0.01)
+                cover_ready_during_outline.append(os.path.exists(cover_path))
+        yield {"event": "done", "data": {"success": True, "outline": "outline", "pages": []}}
+
+    events = list(stub_image_service.generate_images_streaming(
+        outline_events(), task_id, user_topic=f"\nTOPIC:{task_id}"
+    ))
+    names = [(e["event"], e["data"].get("index")) for e in events]
+
+    assert cover_ready_during_outline == [True]
+    assert names.index(("progress", 0)) < names.index(("outline_page", 1))
+    finish = events[-1]["data"]
+    assert events[-1]["event"] == "finish"
+    assert finish["success"], finish
+    assert finish["completed"] == page_count
+    assert sorted(os.listdir(os.path.join(temp_history_dir, task_id))) >= [f"{i}.png" for i in range(page_count)]
+    for i in range(page_count):
+        assert _read_marker(os.path.join(temp_history_dir, task_id, f"{i}.png")) == f"TOPIC:{task_id}"
+
+
+def test_streaming_pipeline_stops_outline_when_client_disconnects(stub_image_service):
+    """客户端断开（生成器被关闭）后，读线程停止读取并关闭大纲流"""
+    outline_closed = threading.Event()
+    tokens_read = []
+
+    def outline_events():
+        try:
+            for i in range(1000):
+                tokens_read.append(i)
+                yield {"event": "token", "data": {"text": "x"}}
+                time.sleep(0.01)
+        finally:
+            outline_closed.set()
+
+    stream = stub_image_service.generate_images_streaming(outline_events(), "task_disconnect")
+    assert next(stream)["event"] == "outline_token"
+    stream.close()
+
+    assert outline_closed.wait(timeout=5)
+    assert len(tokens_read) < 1000
+
+
+def test_key_pool_fails_over_from_rate_limited_key(stub_image_service, monkeypatch, temp_history_dir):
+    """配置多个 API Key 时，返回 429 的 Key 进入冷却，页面转移到其他 Key 继续生成"""
+    monkeypatch.setattr(
+        Config,
+        "get_image_provider_config",
+        classmethod(lambda cls, name=None: {
+            "type": "stub", "api_keys": ["limited-key", "good-key"], "max_concurrent": 4
+        })
+    )
+    original = StubGenerator.generate_image
+
+    def generate_image(self, prompt: str, **kwargs) -> bytes:
+        if self.api_key == "limited-key":
+            raise RateLimitError("⏳ API 配额或速率限制", retry_after=30)
+        return original(self, prompt, **kwargs)
+
+    monkeypatch.setattr(StubGenerator, "generate_image", generate_image)
+
+    service = ImageService()
+    service.history_root_dir = temp_history_dir
+    members = {member.config["api_key"]: member for member in service.provider_pool.members}
+    assert sorted(members) == ["good-key", "limited-key"]
+
+    page_count = 6
+    pages = [
+        {"index": i, "type": "cover" if i == 0 else "content", "content": f"page {i}"}
+        for i in range(page_count)
+    ]
+    events = list(service.generate_images(pages, "task_pool", full_outline="outline", user_topic="\nTOPIC:pool"))
+
+    finish = events[-1]["data"]
+    assert finish["success"], finish
+    assert finish["completed"] == page_count
+    stats = get_provider_pool_stats()
+    limited = stats[members["limited-key"].name]
+    good = stats[members["good-key"].name]
+    # 429 之后受限的 Key 在冷却期内不再被选中
+    assert limited["failures"] == {"rate_limited": 1}
+    assert not limited["healthy"]
+    assert good["successes"] == page_count
+
+
+def test_provider_pool_fails_over_between_providers(stub_image_service, monkeypatch, temp_history_dir):
+    """配置 provider_pool 时池由多个服务商组成，返回 5xx 的服务商进入冷却，页面转移到另一个服务商"""
+    monkeypatch.setattr(
+        Config,
+        "load_image_providers_config",
+        classmethod(lambda cls: {"active_provider": "stub_a", "provider_pool": ["stub_a", "stub_b"]})
+    )
+    monkeypatch.setattr(
+        Config,
+        "get_image_provider_config",
+        classmethod(lambda cls, name=None: {"type": "stub", "api_key": f"{name}-key", "max_concurrent": 2})
+    )
+    original = StubGenerator.generate_image
+
+    def generate_image(self, prompt: str, **kwargs) -> bytes:
+        if self.api_key == "stub_a-key":
+            raise Exception("服务器错误，状态码: 503")
+        return original(self, prompt, **kwargs)
+
+    monkeypatch.setattr(StubGenerator, "generate_image", generate_image)
+
+    service = ImageService()
+    service.history_root_dir = temp_history_dir
+    members = {member.provider: member for member in service.provider_pool.members}
+    assert sorted(members) == ["stub_a", "stub_b"]
+    # 并发上限按整个池注册：两个服务商的 max_concurrent 之和
+    assert service.scheduler.get_stats()["provider_limits"][service.provider_pool.name] == 4
+
+    page_count = 6
+    pages = [
+        {"index": i, "type": "cover" if i == 0 else "content", "content": f"page {i}"}
+        for i in range(page_count)
+    ]
+    events = list(service.generate_images(pages, "task_providers", full_outline="outline", user_topic="\nTOPIC:p"))
+
+    finish = events[-1]["data"]
+    assert finish["success"], finish
+    assert finish["completed"] == page_count
+    stats = get_provider_pool_stats()
+    failing = stats[members["stub_a"].name]
+    assert failing["failures"] == {"server_error": 1}
+    assert not failing["healthy"]
+    assert stats[members["stub_b"].name]["successes"] == page_count
+
+
+def test_encode_pool_recovers_after_worker_killed(monkeypatch):
+    """编码工作进程被杀后进程池重建，编码结果仍然可用"""
+    import signal
+
+    from backend.utils.image_compressor import compress_image
+
+    monkeypatch.setattr(image_module, "_encode_executor", None)
+    output = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 100, 50)).save(output, format="PNG")
+    data = output.getvalue()
+
+    executor = image_module.get_encode_executor()
+    assert image_module.submit_encode(compress_image, data, 200).result(timeout=30)
+    for process in list(executor._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+
+    assert image_module.submit_encode(compress_image, data, 200).result(timeout=30)
+    assert image_module.get_encode_executor() is not executor
+    assert image_module.submit_encode(compress_image, data, 200).result(timeout=30)
+    image_module.get_encode_executor().shutdown()
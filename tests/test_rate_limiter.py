@@ -0,0 +1,62 @@
+"""
+服务商限流器测试
+
+并发请求同时遇到 429 时，应当只减速一次、按 Retry-After 整体冷却，之后按新的速率逐个派发，而不是一起重试
+"""
+import threading
+import time
+
+from backend.utils.rate_limiter import (
+    AdaptiveRateLimiter,
+    RateLimitError,
+    call_with_rate_limit,
+    parse_retry_after,
+)
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after({"Retry-After": "3"}) == 3
+    assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+    assert parse_retry_after({"x-ratelimit-reset-requests": "1m30s"}) == 90
+    assert parse_retry_after({"x-ratelimit-reset-requests": "120ms"}) == 0.12
+    assert parse_retry_after({"content-type": "application/json"}) is None
+
+
+def test_concurrent_429_backs_off_once_and_spreads_retries():
+    workers = 8
+    limiter = AdaptiveRateLimiter("test", rate_limit=2400)
+    first_wave = threading.Barrier(workers)
+    lock = threading.Lock()
+    calls = []
+
+    def request():
+        with lock:
+            calls.append(time.monotonic())
+            in_first_wave = len(calls) <= workers
+        if in_first_wave:
+            # 第一批请求全部在途后才一起返回 429
+            first_wave.wait()
+            raise RateLimitError("429", retry_after=0.2)
+        return "ok"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(call_with_rate_limit(limiter, request)))
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert results == ["ok"] * workers
+    stats = limiter.get_stats()
+    assert stats["rate_limited"] == workers
+    # 同一批请求的 429 只减速一次（2400 -> 1200），之后每次成功回升 1 次/分钟
+    assert stats["rate_per_minute"] == 1200 + workers
+
+    retries = calls[workers:]
+    # 重试在冷却结束后才开始，并按降低后的速率（每 0.05 秒一个）依次派发
+    assert retries[0] - calls[workers - 1] >= 0.2
+    gaps = [later - earlier for earlier, later in zip(retries, retries[1:])]
+    assert min(gaps) >= 0.04
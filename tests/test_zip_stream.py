@@ -0,0 +1,94 @@
+"""
+流式 ZIP 打包测试
+
+Content-Length 是根据 zipfile 的输出格式预先计算的，需要与实际输出逐字节一致
+"""
+import io
+import os
+import zipfile
+
+from backend.utils.atomic_file import atomic_write_bytes
+from backend.utils.zip_stream import close_pinned, pin_files, stored_zip_size, stream_zip
+
+
+def test_stream_zip_matches_precomputed_size(temp_history_dir):
+    """全部为已压缩图片时，预先计算的大小与实际输出一致，归档可正常解压"""
+    entries = []
+    for i, size in enumerate([0, 1, 70_000, 300_001]):
+        path = os.path.join(temp_history_dir, f"{i}.png")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        entries.append((f"page_{i + 1}.png", path))
+    entries.append(("第5页.jpg", entries[-1][1]))
+
+    chunks = list(stream_zip(entries))
+    data = b"".join(chunks)
+
+    assert len(data) == stored_zip_size(entries)
+    # 边读边输出：大文件被拆成多个数据块
+    assert len(chunks) > len(entries)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [name for name, _ in entries]
+        for name, path in entries:
+            assert zf.getinfo(name).compress_type == zipfile.ZIP_STORED
+            with open(path, "rb") as f:
+                assert zf.read(name) == f.read()
+
+
+def test_stream_zip_deflates_in_memory_entries(temp_history_dir):
+    """内存数据（如 JSON 清单）使用 deflate，此时无法预先计算大小"""
+    manifest = ("{\"title\": \"测试\"}" * 100).encode("utf-8")
+    entries = [("manifest.json", manifest)]
+
+    data = b"".join(stream_zip(entries))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.getinfo("manifest.json").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.read("manifest.json") == manifest
+    assert stored_zip_size([("manifest.json", os.devnull)]) is None
+
+
+def test_stream_zip_read_ahead_matches_sequential(temp_history_dir):
+    """并发预读与顺序读取生成的归档内容一致"""
+    entries = [("manifest.json", b"{}")]
+    for i in range(10):
+        path = os.path.join(temp_history_dir, f"{i}.png")
+        with open(path, "wb") as f:
+            f.write(os.urandom(100_000 + i))
+        entries.append((f"page_{i + 1}.png", path))
+
+    sequential = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(entries))))
+    prefetched = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(entries, read_ahead=3))))
+
+    assert prefetched.testzip() is None
+    assert prefetched.namelist() == sequential.namelist()
+    for name in sequential.namelist():
+        assert prefetched.read(name) == sequential.read(name)
+
+
+def test_pinned_files_match_size_after_rewrite(temp_history_dir):
+    """计算 Content-Length 之后图片被重新生成，输出仍是计算长度时的版本"""
+    entries = []
+    for i in range(3):
+        path = os.path.join(temp_history_dir, f"{i}.png")
+        with open(path, "wb") as f:
+            f.write(os.urandom(100_000))
+        entries.append((f"page_{i + 1}.png", path))
+    originals = {name: open(path, "rb").read() for name, path in entries}
+
+    pinned = pin_files(entries + [("missing.png", os.path.join(temp_history_dir, "missing.png"))])
+    content_length = stored_zip_size(pinned)
+    atomic_write_bytes(entries[1][1], os.urandom(250_000))
+    try:
+        data = b"".join(stream_zip(pinned))
+    finally:
+        close_pinned(pinned)
+
+    assert len(data) == content_length
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [name for name, _ in entries]
+        for name, content in originals.items():
+            assert zf.read(name) == content